@@ -0,0 +1,173 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2013-2014 Simon Jagoe
+# All rights reserved.
+#
+# This software may be modified and distributed under the terms
+# of the 3-clause BSD license.  See the LICENSE.txt file for details.
+from __future__ import absolute_import, unicode_literals
+
+import json
+import logging
+import os
+import sqlite3
+import tempfile
+
+from .timing_history import TimingHistory
+
+logger = logging.getLogger(__name__)
+
+_SQLITE_HEADER = b'SQLite format 3\x00'
+
+
+def _is_sqlite_database(path):
+    try:
+        with open(path, 'rb') as fh:
+            return fh.read(len(_SQLITE_HEADER)) == _SQLITE_HEADER
+    except (IOError, OSError):
+        return False
+
+
+class DurationHistory(object):
+    """A local store of the most recent durations of individual tests.
+
+    The history is keyed on the test id (``test.id()``) and holds up to
+    ``max_samples`` durations, in seconds, for each test.  It is used by
+    the parallel test runner to estimate how long each test will take.
+
+    The history is a small JSON file that the runner rewrites after each
+    run.  The durations may instead be read from a ``--timing-history``
+    database (see :meth:`~.from_timing_history`), which keeps every run
+    for reporting.
+
+    """
+
+    #: Version of the on-disk format.  Files written with a different
+    #: version are ignored.
+    FORMAT_VERSION = 1
+
+    def __init__(self, path=None, max_samples=5):
+        self.path = path
+        self.max_samples = max_samples
+        self._durations = {}
+
+    @classmethod
+    def load(cls, path, max_samples=5):
+        """Load a :class:`~.DurationHistory` from ``path``.
+
+        A missing or unreadable file results in an empty history that
+        will be written to ``path`` when saved.  If ``path`` is a
+        :class:`~haas.timing_history.TimingHistory` database, the history
+        is read with :meth:`~.from_timing_history`.
+
+        """
+        if _is_sqlite_database(path):
+            return cls.from_timing_history(path, max_samples=max_samples)
+        history = cls(path=path, max_samples=max_samples)
+        try:
+            with open(path) as fh:
+                data = json.load(fh)
+        except (IOError, OSError, ValueError) as exc:
+            logger.debug('Unable to read duration history %r: %s', path, exc)
+            return history
+        if not isinstance(data, dict) or \
+                data.get('version') != cls.FORMAT_VERSION:
+            logger.debug('Ignoring duration history %r with unknown format',
+                         path)
+            return history
+        for test_id, samples in data.get('durations', {}).items():
+            history._durations[test_id] = [
+                float(sample) for sample in samples][-max_samples:]
+        return history
+
+    @classmethod
+    def from_timing_history(cls, path, max_samples=5):
+        """Read the most recent successful durations of each test from
+        the :class:`~haas.timing_history.TimingHistory` database at
+        ``path``.
+
+        The database is opened read-only.  The history has no path, so
+        it is not saved: durations are added to the database by the
+        ``timing_history`` result handler.
+
+        """
+        history = cls(max_samples=max_samples)
+        try:
+            with TimingHistory(path, read_only=True) as timing_history:
+                durations = timing_history.recent_durations()
+        except (sqlite3.Error, ValueError) as exc:
+            logger.debug('Unable to read timing history %r: %s', path, exc)
+            return history
+        for test_id, samples in durations.items():
+            history._durations[test_id] = samples[-max_samples:]
+        return history
+
+    def save(self, path=None):
+        """Write the history to ``path`` (defaults to the path the
+        history was loaded from).
+
+        """
+        if path is None:
+            path = self.path
+        if path is None:
+            raise ValueError('No path to save duration history to')
+        data = {
+            'version': self.FORMAT_VERSION,
+            'durations': self._durations,
+        }
+        directory = os.path.dirname(os.path.abspath(path))
+        fd, temp_path = tempfile.mkstemp(
+            prefix='.haas-durations-', dir=directory)
+        try:
+            with os.fdopen(fd, 'w') as fh:
+                json.dump(data, fh, sort_keys=True)
+            if os.path.exists(path) and os.name == 'nt':  # pragma: no cover
+                os.remove(path)
+            os.rename(temp_path, path)
+        except Exception:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+
+    def __len__(self):
+        return len(self._durations)
+
+    def __contains__(self, test_id):
+        return test_id in self._durations
+
+    def record(self, test_id, duration):
+        """Record a new duration, in seconds, for the test ``test_id``.
+
+        """
+        samples = self._durations.setdefault(test_id, [])
+        samples.append(float(duration))
+        if len(samples) > self.max_samples:
+            del samples[:-self.max_samples]
+
+    def samples(self, test_id):
+        """Return the recorded durations of ``test_id``, oldest first.
+
+        """
+        return list(self._durations.get(test_id, ()))
+
+    def estimate(self, test_id):
+        """Return the expected duration of ``test_id`` in seconds, or
+        ``None`` if the test has no recorded durations.
+
+        """
+        samples = self._durations.get(test_id)
+        if not samples:
+            return None
+        return sum(samples) / len(samples)
+
+    def percentile(self, percent):
+        """Return the ``percent`` percentile of all recorded durations,
+        or ``None`` if there are none.
+
+        """
+        durations = sorted(
+            duration for samples in self._durations.values()
+            for duration in samples)
+        if not durations:
+            return None
+        index = int(round((len(durations) - 1) * percent / 100.0))
+        return durations[index]
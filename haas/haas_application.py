@@ -8,13 +8,17 @@ from __future__ import absolute_import, unicode_literals
 
 import argparse
 import os
+import sys
 
 import haas
 from .loader import Loader
 from .plugin_context import PluginContext
 from .plugin_manager import PluginManager
-from .result import ResultCollector
-from .utils import configure_logging
+from .resource_usage import ResourceMonitor
+from .result import CAPTURE_FD, CAPTURE_SYS, ResultCollector
+from .timing_history import (
+    BASELINE_RUNS, DEFAULT_TIMING_HISTORY, TimingHistory, print_history)
+from .utils import configure_logging, parse_size
 
 
 def create_argument_parser():
@@ -31,12 +35,49 @@ def create_argument_parser():
                            dest='verbosity', help='Quiet output')
     parser.add_argument('-f', '--failfast', action='store_true', default=False,
                         help='Stop on first fail or error')
+    parser.add_argument('--maxfail', type=int, default=None, metavar='N',
+                        help='Stop after N fails or errors')
+    parser.add_argument('--group-failures', action='store_true',
+                        default=False,
+                        help=('Report tests that fail with the same '
+                              'exception and innermost frames once, with '
+                              'the list of affected tests'))
+    parser.add_argument('--streaming', action='store_true', default=False,
+                        help=('Keep memory use flat on very large runs: '
+                              'results are counted and summarised instead '
+                              'of kept, and error reports are written to '
+                              'temporary files until the end of the run'))
     parser.add_argument('-c', '--catch', dest='catch_interrupt',
                         action='store_true', default=False,
                         help=('(Ignored) Catch ctrl-C and display results so '
                               'far'))
     parser.add_argument('-b', '--buffer', action='store_true', default=False,
                         help='Buffer stdout and stderr during tests')
+    parser.add_argument('--capture', choices=[CAPTURE_SYS, CAPTURE_FD],
+                        default=CAPTURE_SYS,
+                        help=('How --buffer captures output: by replacing '
+                              'sys.stdout and sys.stderr ({0!r}, the '
+                              'default), or by redirecting file descriptors '
+                              '1 and 2 to temporary files ({1!r}), which '
+                              'also captures the output of C extensions '
+                              'and subprocesses'.format(
+                                  CAPTURE_SYS, CAPTURE_FD)))
+    parser.add_argument('--capture-limit', type=parse_size, default=None,
+                        metavar='SIZE',
+                        help=('With --buffer, keep only the first and last '
+                              'SIZE / 2 characters of the output of each '
+                              'failing test, which may have a K, M or G '
+                              'suffix.  Defaults to no limit'))
+    parser.add_argument('--measure-resources', action='store_true',
+                        default=False,
+                        help=('Measure the CPU time of each test and how '
+                              'much it grows the peak resident memory of '
+                              'the process running it'))
+    parser.add_argument('--trace-allocations', action='store_true',
+                        default=False,
+                        help=('Also measure the peak memory allocated by '
+                              'each test with tracemalloc.  This slows '
+                              'tests down and implies --measure-resources'))
     parser.add_argument(
         'start', nargs='*', default=[os.getcwd()],
         help=('One or more directories or dotted package/module names from '
@@ -46,6 +87,22 @@ def create_argument_parser():
     parser.add_argument('-t', '--top-level-directory', default=None,
                         help=('Top level directory of project (defaults to '
                               'start directory)'))
+    history = parser.add_argument_group(
+        'timing history',
+        'List the slowest, most variable and fastest growing tests '
+        'recorded with --timing-history instead of running tests.')
+    history.add_argument('--show-history', nargs='?', default=None,
+                         const=DEFAULT_TIMING_HISTORY, metavar='DATABASE',
+                         help=('Show the timing history in DATABASE '
+                               '(default {0!r})'.format(
+                                   DEFAULT_TIMING_HISTORY)))
+    history.add_argument('--history-limit', type=int, default=10,
+                         metavar='N',
+                         help='The number of tests to list (default 10)')
+    history.add_argument('--history-runs', type=int, default=BASELINE_RUNS,
+                         metavar='N',
+                         help=('The number of most recent runs to consider '
+                               '(default {0})'.format(BASELINE_RUNS)))
     _add_log_level_option(parser)
     return parser
 
@@ -97,6 +154,8 @@ class HaasApplication(object):
         plugin_manager.add_plugin_arguments(self.parser)
 
         args = self.parser.parse_args(self.argv[1:])
+        if args.show_history is not None:
+            return self.show_history(args)
 
         environment_plugins = plugin_manager.get_enabled_hook_plugins(
             plugin_manager.ENVIRONMENT_HOOK, args)
@@ -123,11 +182,34 @@ class HaasApplication(object):
             result_handlers = plugin_manager.get_enabled_hook_plugins(
                 plugin_manager.RESULT_HANDLERS, args, test_count=test_count)
 
+            if args.measure_resources or args.trace_allocations:
+                resource_monitor = ResourceMonitor(
+                    trace_allocations=args.trace_allocations)
+            else:
+                resource_monitor = None
             result_collector = ResultCollector(
-                buffer=args.buffer, failfast=args.failfast)
+                buffer=args.buffer, failfast=args.failfast,
+                maxfail=args.maxfail, capture=args.capture,
+                capture_limit=args.capture_limit, streaming=args.streaming,
+                resource_monitor=resource_monitor)
 
             for result_handler in result_handlers:
                 result_collector.add_result_handler(result_handler)
 
             result = runner.run(result_collector, suite)
             return not result.wasSuccessful()
+
+    def show_history(self, args, stream=None):
+        """Print the timing history selected by ``--show-history``.
+
+        """
+        if stream is None:
+            stream = sys.stdout
+        database = args.show_history
+        if not os.path.exists(database):
+            stream.write('No timing history in {0!r}\n'.format(database))
+            return 1
+        with TimingHistory(database) as history:
+            print_history(history, stream, limit=args.history_limit,
+                          runs=args.history_runs)
+        return 0
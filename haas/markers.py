@@ -0,0 +1,115 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2013-2014 Simon Jagoe
+# All rights reserved.
+#
+# This software may be modified and distributed under the terms
+# of the 3-clause BSD license.  See the LICENSE.txt file for details.
+"""Markers that test classes use to tell haas how their tests may be run.
+
+Markers are inherited by subclasses.  :func:`~.resources` and
+:func:`~.cpu_slots` may also be applied to individual test methods.
+
+"""
+from __future__ import absolute_import, unicode_literals
+
+_THREAD_SAFE = '__haas_thread_safe__'
+_CONCURRENCY_SAFE = '__haas_concurrency_safe__'
+_RESOURCES = '__haas_resources__'
+_CPU_SLOTS = '__haas_cpu_slots__'
+
+
+def _mark(test_class, attribute):
+    setattr(test_class, attribute, True)
+    return test_class
+
+
+def _is_marked(test, attribute):
+    return getattr(test, attribute, False) is True
+
+
+def thread_safe(test_class):
+    """Class decorator marking the tests of ``test_class`` as safe to run
+    in a thread at the same time as other thread-safe tests.
+
+    """
+    return _mark(test_class, _THREAD_SAFE)
+
+
+def is_thread_safe(test):
+    """Return ``True`` if the class of ``test`` is marked with
+    :func:`~.thread_safe`.
+
+    """
+    return _is_marked(test, _THREAD_SAFE)
+
+
+def concurrency_safe(test_class):
+    """Class decorator marking the tests of an
+    ``IsolatedAsyncioTestCase`` subclass as safe to run on an event loop
+    shared with other concurrency-safe tests, at the same time as them.
+
+    """
+    return _mark(test_class, _CONCURRENCY_SAFE)
+
+
+def is_concurrency_safe(test):
+    """Return ``True`` if the class of ``test`` is marked with
+    :func:`~.concurrency_safe`.
+
+    """
+    return _is_marked(test, _CONCURRENCY_SAFE)
+
+
+def _test_method(test):
+    return getattr(test, getattr(test, '_testMethodName', ''), None)
+
+
+def resources(*names):
+    """Decorator declaring the named resources that the tests of a class,
+    or a single test method, use exclusively.  The parallel runner never
+    runs two tests that use the same resource at the same time.
+
+    """
+    def decorator(test_or_class):
+        declared = getattr(test_or_class, _RESOURCES, frozenset())
+        setattr(test_or_class, _RESOURCES, declared | frozenset(names))
+        return test_or_class
+    return decorator
+
+
+def get_resources(test):
+    """Return the resources used by ``test``, declared on its class or
+    its test method with :func:`~.resources`.
+
+    """
+    declared = getattr(test, _RESOURCES, frozenset())
+    method = _test_method(test)
+    if method is not None:
+        declared = declared | getattr(method, _RESOURCES, frozenset())
+    return declared
+
+
+def cpu_slots(count):
+    """Decorator declaring the number of CPU cores that the tests of a
+    class, or a single test method, keep busy.  The parallel runner
+    does not run more tests at the same time than it has processes for.
+
+    """
+    if count < 1:
+        raise ValueError('A test uses at least one CPU slot')
+
+    def decorator(test_or_class):
+        setattr(test_or_class, _CPU_SLOTS, count)
+        return test_or_class
+    return decorator
+
+
+def get_cpu_slots(test):
+    """Return the number of CPU slots used by ``test``, declared on its
+    test method or its class with :func:`~.cpu_slots`.  Defaults to 1.
+
+    """
+    method = _test_method(test)
+    if method is not None and hasattr(method, _CPU_SLOTS):
+        return getattr(method, _CPU_SLOTS)
+    return getattr(test, _CPU_SLOTS, 1)
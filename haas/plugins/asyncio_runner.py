@@ -0,0 +1,175 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2013-2014 Simon Jagoe
+# All rights reserved.
+#
+# This software may be modified and distributed under the terms
+# of the 3-clause BSD license.  See the LICENSE.txt file for details.
+from __future__ import absolute_import, unicode_literals
+
+import asyncio
+import concurrent.futures
+import contextvars
+from functools import partial
+import sys
+import threading
+import unittest
+
+from haas.markers import is_concurrency_safe
+from haas.result import _ContextLocalStream
+from .threaded_runner import ThreadedTestRunner, _default_thread_count
+
+_IsolatedAsyncioTestCase = getattr(unittest, 'IsolatedAsyncioTestCase', None)
+
+
+def _copy_task_result(future, task):
+    if task.cancelled():
+        future.cancel()
+    elif task.exception() is not None:
+        future.set_exception(task.exception())
+    else:
+        future.set_result(task.result())
+
+
+def _set_output_buffers(buffers):
+    for stream, buffer in buffers:
+        stream.set_buffer(buffer)
+
+
+class _SharedLoopRunner(object):
+    """Stands in for the ``asyncio.Runner`` of an
+    ``IsolatedAsyncioTestCase``, running the coroutines of the test on
+    an event loop shared with other tests.
+
+    """
+
+    def __init__(self, loop):
+        self._loop = loop
+
+    def get_loop(self):
+        asyncio.set_event_loop(self._loop)
+        return self._loop
+
+    def run(self, coro, context=None):
+        """Run ``coro`` as a task on the shared loop and wait for its
+        result.
+
+        """
+        if context is None:
+            context = contextvars.copy_context()
+        # Send the output of the task to the buffers of the test
+        buffers = [
+            (stream, stream.get_buffer())
+            for stream in (sys.stdout, sys.stderr)
+            if isinstance(stream, _ContextLocalStream)
+        ]
+        context.run(_set_output_buffers, buffers)
+
+        future = concurrent.futures.Future()
+
+        def start():
+            if not future.set_running_or_notify_cancel():
+                coro.close()
+                return
+            task = self._loop.create_task(coro, context=context)
+            task.add_done_callback(partial(_copy_task_result, future))
+        self._loop.call_soon_threadsafe(start)
+        return future.result()
+
+    def close(self):
+        pass
+
+
+def _no_op():
+    pass
+
+
+class AsyncioTestRunner(ThreadedTestRunner):
+    """Test runner that executes ``IsolatedAsyncioTestCase`` tests at the
+    same time on a single event loop.
+
+    Only tests of ``IsolatedAsyncioTestCase`` subclasses marked with
+    :func:`haas.markers.concurrency_safe` are run concurrently, at most
+    ``concurrency`` at a time.  The synchronous parts of each test
+    (``setUp``, ``tearDown`` and synchronous test methods) are run in a
+    thread of their own, and the output of each test is captured
+    separately.  All other tests are run one at a time once the
+    concurrency-safe tests have completed.
+
+    On versions of Python without ``asyncio.Runner`` (before 3.11), each
+    concurrency-safe test runs on its own event loop in its thread.
+
+    """
+
+    def __init__(self, concurrency=None, warnings=None):
+        super(AsyncioTestRunner, self).__init__(
+            thread_count=concurrency, warnings=warnings)
+        self._loop = None
+
+    @classmethod
+    def from_args(cls, args, arg_prefix):
+        """Create an :class:`~.AsyncioTestRunner` from command-line
+        arguments.
+
+        """
+        return cls(concurrency=args.async_concurrency)
+
+    @classmethod
+    def add_parser_arguments(self, parser, option_prefix, dest_prefix):
+        concurrency_help = (
+            'The maximum number of asynchronous tests to run at the same '
+            'time.  Defaults to {0}.'.format(_default_thread_count()))
+        parser.add_argument(
+            '--async-concurrency', help=concurrency_help, type=int,
+            default=None)
+
+    def _runs_concurrently(self, test_case):
+        return _IsolatedAsyncioTestCase is not None and \
+            isinstance(test_case, _IsolatedAsyncioTestCase) and \
+            is_concurrency_safe(test_case)
+
+    def _run_concurrent_test(self, result, test_case):
+        run_test = super(AsyncioTestRunner, self)._run_concurrent_test
+        if not hasattr(test_case, '_setupAsyncioRunner'):
+            return run_test(result, test_case)
+        test_case._asyncioRunner = _SharedLoopRunner(self._loop)
+        test_case._setupAsyncioRunner = _no_op
+        test_case._tearDownAsyncioRunner = _no_op
+        try:
+            return run_test(result, test_case)
+        finally:
+            del test_case._setupAsyncioRunner
+            del test_case._tearDownAsyncioRunner
+            test_case._asyncioRunner = None
+
+    def _start_loop(self):
+        loop = asyncio.new_event_loop()
+        thread = threading.Thread(
+            target=loop.run_forever, name='haas-event-loop')
+        thread.daemon = True
+        thread.start()
+        self._loop = loop
+        return thread
+
+    def _stop_loop(self, thread):
+        loop = self._loop
+        self._loop = None
+        loop.call_soon_threadsafe(loop.stop)
+        thread.join()
+        try:
+            # Cancel tasks left running by tests
+            tasks = asyncio.all_tasks(loop)
+            for task in tasks:
+                task.cancel()
+            if tasks:
+                loop.run_until_complete(
+                    asyncio.gather(*tasks, return_exceptions=True))
+            loop.run_until_complete(loop.shutdown_asyncgens())
+        finally:
+            loop.close()
+
+    def _run_tests(self, result, test):
+        thread = self._start_loop()
+        try:
+            super(AsyncioTestRunner, self)._run_tests(result, test)
+        finally:
+            self._stop_loop(thread)
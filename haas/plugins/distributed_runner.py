@@ -0,0 +1,502 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2013-2014 Simon Jagoe
+# All rights reserved.
+#
+# This software may be modified and distributed under the terms
+# of the 3-clause BSD license.  See the LICENSE.txt file for details.
+from __future__ import absolute_import, unicode_literals
+
+import argparse
+import logging
+import multiprocessing
+from multiprocessing.connection import Client, Listener
+import os
+import socket
+import sys
+import threading
+import time
+
+from six.moves import queue
+
+from haas.exceptions import PluginError
+from haas.result import CAPTURE_SYS
+from haas.result_codec import DEFAULT_RESULT_CODEC
+from haas.utils import configure_logging
+from .parallel_runner import ParallelTestRunner
+from .worker_pool import (
+    MAX_TASK_ATTEMPTS, PIPE_TRANSPORT, WorkerPool, _WorkerProcess,
+    _monotonic, _worker_main)
+
+try:
+    from multiprocessing import AuthenticationError
+except ImportError:  # pragma: no cover
+    from multiprocessing.connection import AuthenticationError
+
+logger = logging.getLogger(__name__)
+
+#: The port used when an address does not include one.
+DEFAULT_PORT = 7461
+
+#: The environment variable holding the shared authentication key, when
+#: no key file is given.
+AUTHKEY_ENVIRONMENT_VARIABLE = 'HAAS_AUTHKEY'
+
+#: An agent that sends nothing for this many heartbeat intervals is
+#: considered lost.
+HEARTBEAT_TIMEOUT_INTERVALS = 30
+
+#: The default number of seconds to wait for an agent to connect before
+#: the queued tests are reported as errors.
+DEFAULT_AGENT_TIMEOUT = 300.0
+
+
+def parse_address(address):
+    """Parse a ``HOST[:PORT]`` address into a ``(host, port)`` tuple.
+
+    """
+    host, port = address, DEFAULT_PORT
+    if ':' in address:
+        host, port = address.rsplit(':', 1)
+    try:
+        port = int(port)
+    except ValueError:
+        raise ValueError('Invalid port in address {0!r}'.format(address))
+    return host, port
+
+
+def load_authkey(authkey_file=None):
+    """Load the key that the coordinator and agents use to authenticate
+    each other, from ``authkey_file`` or from the ``HAAS_AUTHKEY``
+    environment variable.
+
+    """
+    if authkey_file is not None:
+        with open(authkey_file, 'rb') as fh:
+            authkey = fh.read().strip()
+    else:
+        authkey = os.environ.get(AUTHKEY_ENVIRONMENT_VARIABLE, '')
+        authkey = authkey.encode('utf-8')
+    if not authkey:
+        raise PluginError(
+            'The distributed runner requires an authentication key; use '
+            '--authkey-file or set {0}'.format(AUTHKEY_ENVIRONMENT_VARIABLE))
+    return authkey
+
+
+class _RemoteProcess(object):
+    """Stands in for the ``multiprocessing.Process`` of a worker running
+    in an agent connected over the network.
+
+    """
+
+    exitcode = None
+
+    def __init__(self, address):
+        self.address = address
+
+    def is_alive(self):
+        return True
+
+    def join(self, timeout=None):
+        pass
+
+
+class _AgentListener(threading.Thread):
+    """Accepts connections from agents, putting authenticated
+    connections on the ``connections`` queue.
+
+    """
+
+    def __init__(self, listener):
+        super(_AgentListener, self).__init__(name='haas-agent-listener')
+        self.daemon = True
+        self.connections = queue.Queue()
+        self._listener = listener
+        self._stopped = False
+
+    def run(self):
+        while not self._stopped:
+            try:
+                connection = self._listener.accept()
+            except AuthenticationError as exc:
+                logger.warning('Rejected agent: %s', exc)
+                continue
+            except (EOFError, IOError, OSError) as exc:
+                if not self._stopped:
+                    logger.warning('Failed to accept agent: %s', exc)
+                continue
+            if self._stopped:
+                connection.close()
+                break
+            self.connections.put(
+                (connection, self._listener.last_accepted))
+
+    def stop(self):
+        self._stopped = True
+        # Wake the thread from accept()
+        try:
+            socket.create_connection(self._listener.address, 1).close()
+        except (IOError, OSError):
+            pass
+        self.join(5)
+        self._listener.close()
+
+
+class RemoteWorkerPool(WorkerPool):
+    """A :class:`~haas.plugins.worker_pool.WorkerPool` whose workers are
+    agents (see :func:`~.agent_main`) that connect to it over TCP.
+
+    Each connection from an agent is a worker.  An agent that
+    disconnects, or sends nothing for ``HEARTBEAT_TIMEOUT_INTERVALS``
+    heartbeat intervals, is dropped and its unfinished tests are queued
+    again.  Unlike with local workers, the test that was running is
+    also queued again, as the loss of an agent may be unrelated to the
+    test; a test whose agent is lost ``MAX_TASK_ATTEMPTS`` times is
+    recorded as an error.
+
+    The ``initializer`` and the output capture and resource measurement
+    options are sent to each agent when it connects; the agent must be
+    able to import the ``initializer``.  If no agent is connected for
+    ``agent_timeout`` seconds, the queued tests are recorded as errors.
+
+    Parameters
+    ----------
+    address : tuple
+        The ``(host, port)`` address to listen on.
+    authkey : bytes
+        The key that agents must authenticate with.
+    process_count : int
+        The expected number of workers.
+    agent_timeout : float
+        How long to wait for an agent when none is connected, or
+        ``None`` to wait forever.
+
+    """
+
+    def __init__(self, address, authkey, process_count, initializer=None,
+                 test_timeout=None, heartbeat_interval=1.0,
+                 result_codec=DEFAULT_RESULT_CODEC, capture_limit=None,
+                 resource_monitor=None, capture=CAPTURE_SYS,
+                 agent_timeout=DEFAULT_AGENT_TIMEOUT):
+        super(RemoteWorkerPool, self).__init__(
+            process_count, initializer=initializer, test_timeout=test_timeout,
+            heartbeat_interval=heartbeat_interval, result_codec=result_codec,
+            capture_limit=capture_limit, resource_monitor=resource_monitor,
+            capture=capture)
+        self.address = address
+        self.authkey = authkey
+        self.agent_timeout = agent_timeout
+        #: The address the pool is listening on for agents, once started.
+        self.listening_address = None
+        self._listener = None
+        self._last_agent_seen = None
+
+    def start(self):
+        """Start listening for agents.
+
+        """
+        listener = Listener(self.address, authkey=self.authkey)
+        self.listening_address = listener.address
+        self._listener = _AgentListener(listener)
+        self._listener.start()
+        self._last_agent_seen = _monotonic()
+        logger.info('Waiting for agents on %s:%s', *listener.address)
+
+    def _maintain_workers(self):
+        if self._listener is None:
+            return
+        while True:
+            try:
+                connection, address = \
+                    self._listener.connections.get_nowait()
+            except queue.Empty:
+                break
+            settings = {
+                'initializer': self.initializer,
+                'heartbeat_interval': self.heartbeat_interval,
+                'result_codec': self.result_codec,
+                'capture_limit': self.capture_limit,
+                'resource_monitor': self.resource_monitor,
+                'capture': self.capture,
+            }
+            try:
+                connection.send(settings)
+            except (IOError, OSError):
+                connection.close()
+                continue
+            worker_id = self._next_worker_id
+            self._next_worker_id += 1
+            self._workers[worker_id] = _WorkerProcess(
+                worker_id, _RemoteProcess(address), connection, None)
+            logger.info('Agent worker %d connected from %s',
+                        worker_id, address)
+
+    def _kill(self, worker):
+        worker.connection.close()
+
+    def _remove_worker(self, worker):
+        del self._workers[worker.worker_id]
+        worker.connection.close()
+
+    def _describe_worker_exit(self, worker):
+        return 'lost its connection to the agent at {0}'.format(
+            worker.process.address)
+
+    def _handle_start_failure(self, worker):
+        self._remove_worker(worker)
+        if worker.start_failure is not None:
+            logger.warning('Agent worker %d initializer failed:\n%s',
+                           worker.worker_id, worker.start_failure)
+        else:
+            logger.warning(
+                'Agent worker %d disconnected before it was ready',
+                worker.worker_id)
+        return []
+
+    def _lose_worker(self, worker, message):
+        test_case = worker.current_test
+        if test_case is None or worker.test_completed:
+            return super(RemoteWorkerPool, self)._lose_worker(
+                worker, message)
+        task_id = worker.task[0]
+        attempts = self._task_attempts.pop(task_id, 0) + 1
+        if attempts >= MAX_TASK_ATTEMPTS:
+            return super(RemoteWorkerPool, self)._lose_worker(
+                worker, message)
+        self._pending.appendleft(self._new_task(
+            [test_case] + worker.remaining_tests, attempts))
+        self._task_requirements.pop(task_id, None)
+        worker.task = None
+        self._remove_worker(worker)
+        return []
+
+    def _check_timeouts(self):
+        results = super(RemoteWorkerPool, self)._check_timeouts()
+        timeout = self.heartbeat_interval * HEARTBEAT_TIMEOUT_INTERVALS
+        now = _monotonic()
+        for worker in list(self._workers.values()):
+            if now - worker.last_message > timeout:
+                reason = 'No heartbeat from agent for {0:.1f} seconds'.format(
+                    now - worker.last_message)
+                results.extend(self._kill_worker(worker, reason))
+        return results
+
+    def poll(self, timeout):
+        results = super(RemoteWorkerPool, self).poll(timeout)
+        results.extend(self._check_agent_timeout())
+        return results
+
+    def _check_agent_timeout(self):
+        now = _monotonic()
+        if self._workers or self._last_agent_seen is None:
+            self._last_agent_seen = now
+            return []
+        if self.agent_timeout is None or not self._pending or \
+                now - self._last_agent_seen < self.agent_timeout:
+            return []
+        logger.warning('No agent connected within %s seconds',
+                       self.agent_timeout)
+        message = ('No agent connected within {0} seconds; the test was '
+                   'not run.\n'.format(self.agent_timeout))
+        results = [
+            self._error_result(test_case, None, message)
+            for task_id, test_cases in self._pending
+            for test_case in test_cases]
+        self._pending.clear()
+        self._task_requirements.clear()
+        return results
+
+    def terminate(self, reason):
+        results = super(RemoteWorkerPool, self).terminate(reason)
+        self._stop_listener()
+        return results
+
+    def shutdown(self):
+        super(RemoteWorkerPool, self).shutdown()
+        self._stop_listener()
+
+    def _stop_listener(self):
+        if self._listener is not None:
+            self._listener.stop()
+            self._listener = None
+
+
+class DistributedTestRunner(ParallelTestRunner):
+    """Test runner that distributes tests to agents on other machines.
+
+    The runner acts as the coordinator: it holds the queue of tests and
+    listens for agents on ``bind_address``.  Each agent connects with
+    the shared ``authkey``, runs the tests it is sent and streams their
+    results back.  Agents must be able to import the tests, e.g. by
+    running from a checkout of the same project.
+
+    The scheduling and timeout options of the ``parallel`` runner apply;
+    ``--processes`` gives the expected number of agent workers and the
+    ``--process-init`` initializer is run by each agent worker.  The
+    options that manage local worker processes (``--process-max-tasks``,
+    ``--process-max-rss``, ``--pin-workers`` and ``--result-transport``)
+    are not supported.  If no
+    agent is connected for ``agent_timeout`` seconds, the tests that
+    have not been run are reported as errors.
+
+    """
+
+    def __init__(self, bind_address, authkey,
+                 agent_timeout=DEFAULT_AGENT_TIMEOUT, **kwargs):
+        super(DistributedTestRunner, self).__init__(**kwargs)
+        self.bind_address = bind_address
+        self.authkey = authkey
+        self.agent_timeout = agent_timeout
+
+    @classmethod
+    def from_args(cls, args, arg_prefix):
+        """Create a :class:`~.DistributedTestRunner` from command-line
+        arguments.
+
+        """
+        runner = ParallelTestRunner.from_args(args, arg_prefix)
+        unsupported = [
+            option for option, value, default in (
+                ('--process-max-tasks', runner.maxtasksperchild, None),
+                ('--process-max-rss', runner.process_max_rss, None),
+                ('--pin-workers', runner.pin_workers, False),
+                ('--result-transport', runner.result_transport,
+                 PIPE_TRANSPORT),
+            )
+            if value != default
+        ]
+        if unsupported:
+            raise PluginError(
+                'The distributed runner does not support {0}'.format(
+                    ', '.join(unsupported)))
+        return cls(
+            parse_address(args.bind_address),
+            load_authkey(args.authkey_file),
+            agent_timeout=args.agent_timeout,
+            process_count=runner.process_count,
+            initializer=runner.initializer,
+            duration_history=runner.duration_history,
+            test_timeout=runner.test_timeout,
+            run_timeout=runner.run_timeout,
+            result_codec=runner.result_codec,
+        )
+
+    @classmethod
+    def add_parser_arguments(self, parser, option_prefix, dest_prefix):
+        bind_address_help = (
+            'The HOST:PORT address on which the distributed runner waits '
+            'for agents.  Defaults to 127.0.0.1:{0}.'.format(DEFAULT_PORT))
+        authkey_file_help = (
+            'A file holding the key that agents of the distributed runner '
+            'authenticate with.  Defaults to the value of the {0} '
+            'environment variable.'.format(AUTHKEY_ENVIRONMENT_VARIABLE))
+        parser.add_argument(
+            '--bind-address', help=bind_address_help,
+            default='127.0.0.1:{0}'.format(DEFAULT_PORT),
+            metavar='HOST:PORT')
+        agent_timeout_help = (
+            'Seconds to wait for an agent to connect, when none is '
+            'connected, before the tests that were not run are reported '
+            'as errors.  Defaults to {0:g}.'.format(DEFAULT_AGENT_TIMEOUT))
+        parser.add_argument(
+            '--authkey-file', help=authkey_file_help, default=None,
+            metavar='FILE')
+        parser.add_argument(
+            '--agent-timeout', help=agent_timeout_help, type=float,
+            default=DEFAULT_AGENT_TIMEOUT, metavar='SECONDS')
+
+    def _create_pool(self, process_count, capture_limit=None,
+                     resource_monitor=None, capture=CAPTURE_SYS):
+        return RemoteWorkerPool(
+            self.bind_address, self.authkey, process_count,
+            initializer=self.initializer,
+            test_timeout=self._get_test_timeout(),
+            result_codec=self.result_codec, capture_limit=capture_limit,
+            resource_monitor=resource_monitor, capture=capture,
+            agent_timeout=self.agent_timeout)
+
+
+def _connect(address, authkey, connect_timeout):
+    deadline = _monotonic() + connect_timeout
+    while True:
+        try:
+            return Client(address, authkey=authkey)
+        except (IOError, OSError):
+            if _monotonic() >= deadline:
+                raise
+            time.sleep(0.5)
+
+
+def run_agent_worker(address, authkey, connect_timeout=60.0):
+    """Connect to the coordinator at ``address`` and run the tests it
+    sends until it has no more.
+
+    """
+    connection = _connect(address, authkey, connect_timeout)
+    try:
+        settings = connection.recv()
+        _worker_main(connection, maxtasks=None, dump_path=None, **settings)
+    except (EOFError, IOError, OSError) as exc:
+        logger.warning('Lost the connection to the coordinator: %s', exc)
+    finally:
+        connection.close()
+
+
+def _create_agent_argument_parser():
+    parser = argparse.ArgumentParser(
+        prog='haas-agent',
+        description='Run tests sent by a haas distributed runner.')
+    parser.add_argument(
+        'address', metavar='HOST:PORT',
+        help='The address of the coordinator.')
+    parser.add_argument(
+        '--processes', type=int, default=1,
+        help='Number of worker processes to run.  Defaults to 1.')
+    parser.add_argument(
+        '--authkey-file', default=None, metavar='FILE',
+        help=('A file holding the key to authenticate with.  Defaults to '
+              'the value of the {0} environment variable.'.format(
+                  AUTHKEY_ENVIRONMENT_VARIABLE)))
+    parser.add_argument(
+        '--connect-timeout', type=float, default=60.0, metavar='SECONDS',
+        help=('How long to keep trying to connect to the coordinator.  '
+              'Defaults to 60 seconds.'))
+    parser.add_argument(
+        '-t', '--top-level-directory', default=os.getcwd(),
+        help=('Top level directory of the project, from which tests are '
+              'imported (defaults to the current directory)'))
+    parser.add_argument(
+        '--log-level', default='warning',
+        type=lambda level_name: level_name.lower(),
+        choices=['critical', 'fatal', 'error', 'warning', 'info', 'debug'],
+        help='Log level for haas logging')
+    return parser
+
+
+def agent_main(argv=None):
+    """Entry point of the ``haas-agent`` command.
+
+    """
+    parser = _create_agent_argument_parser()
+    args = parser.parse_args(argv)
+    configure_logging(args.log_level)
+    try:
+        address = parse_address(args.address)
+        authkey = load_authkey(args.authkey_file)
+    except (ValueError, PluginError) as exc:
+        parser.error(str(exc))
+    sys.path.insert(0, os.path.abspath(args.top_level_directory))
+
+    worker_args = (address, authkey, args.connect_timeout)
+    if args.processes == 1:
+        run_agent_worker(*worker_args)
+        return 0
+    processes = [
+        multiprocessing.Process(target=run_agent_worker, args=worker_args)
+        for _ in range(args.processes)
+    ]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+    return 0
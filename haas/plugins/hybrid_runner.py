@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2013-2014 Simon Jagoe
+# All rights reserved.
+#
+# This software may be modified and distributed under the terms
+# of the 3-clause BSD license.  See the LICENSE.txt file for details.
+from __future__ import absolute_import, unicode_literals
+
+import logging
+
+from haas.markers import get_cpu_slots, get_resources
+from .parallel_runner import ParallelTestRunner
+
+logger = logging.getLogger(__name__)
+
+#: Tests expected to run in less than this many seconds are run in the
+#: parent process by default.
+DEFAULT_FAST_THRESHOLD = 0.01
+
+
+class HybridTestRunner(ParallelTestRunner):
+    """Test runner that executes fast tests in this process and sends
+    slow tests to a pool of worker processes.
+
+    Tests are classified with the durations recorded in the
+    ``--duration-history`` file: a test whose expected duration is at
+    most ``fast_threshold`` seconds is run in this process, while the
+    worker processes run the slow tests, so that fast tests do not pay
+    the cost of being sent to a worker and back.  Tests without a
+    recorded duration, and tests that declare resources or CPU slots
+    (see :mod:`haas.markers`), are always run in the pool.  The results
+    of both are reported to the same result collector.
+
+    The options of the ``parallel`` runner apply to the pool.  Note that
+    the process initializer is not run in this process.
+
+    """
+
+    def __init__(self, fast_threshold=DEFAULT_FAST_THRESHOLD, **kwargs):
+        super(HybridTestRunner, self).__init__(**kwargs)
+        self.fast_threshold = fast_threshold
+
+    @classmethod
+    def from_args(cls, args, arg_prefix):
+        """Create a :class:`~.HybridTestRunner` from command-line
+        arguments.
+
+        """
+        runner = ParallelTestRunner.from_args(args, arg_prefix)
+        return cls(
+            fast_threshold=args.fast_threshold,
+            process_count=runner.process_count,
+            initializer=runner.initializer,
+            maxtasksperchild=runner.maxtasksperchild,
+            duration_history=runner.duration_history,
+            test_timeout=runner.test_timeout,
+            run_timeout=runner.run_timeout,
+            result_codec=runner.result_codec,
+            pin_workers=runner.pin_workers,
+            process_max_rss=runner.process_max_rss,
+            result_transport=runner.result_transport,
+        )
+
+    @classmethod
+    def add_parser_arguments(self, parser, option_prefix, dest_prefix):
+        fast_threshold_help = (
+            'Tests whose recorded duration is at most this many seconds '
+            'are run in the main process by the hybrid runner.  Defaults to '
+            '{0}.'.format(DEFAULT_FAST_THRESHOLD))
+        parser.add_argument(
+            '--fast-threshold', help=fast_threshold_help, type=float,
+            default=DEFAULT_FAST_THRESHOLD, metavar='SECONDS')
+
+    def _runs_in_process(self, test_case):
+        if super(HybridTestRunner, self)._runs_in_process(test_case):
+            return True
+        duration_history = self.duration_history
+        if duration_history is None:
+            return False
+        estimate = duration_history.estimate(test_case.id())
+        if estimate is None or estimate > self.fast_threshold:
+            return False
+        return not get_resources(test_case) and \
+            get_cpu_slots(test_case) == 1
+
+    def _run_tests(self, result, test):
+        if self.duration_history is None:
+            logger.warning('No --duration-history file; all tests will be '
+                           'run in worker processes')
+        super(HybridTestRunner, self)._run_tests(result, test)
@@ -81,3 +81,19 @@ class IResultHandlerPlugin(object):
         """Handle the completed test result ``result``.
 
         """
+
+    def add_run_report(self, title, lines):
+        """Handle a report on the test run made by the test runner, such
+        as the memory used by its worker processes.  Reports are added
+        before :meth:`~.stop_test_run` is called.
+
+        The default implementation ignores the report.
+
+        Parameters
+        ----------
+        title : str
+            The heading of the report.
+        lines : list
+            The lines of the report.
+
+        """
@@ -0,0 +1,239 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2013-2014 Simon Jagoe
+# All rights reserved.
+#
+# This software may be modified and distributed under the terms
+# of the 3-clause BSD license.  See the LICENSE.txt file for details.
+from __future__ import absolute_import, unicode_literals
+
+from collections import deque
+from datetime import datetime
+import multiprocessing
+import os
+import pickle
+import signal
+import sys
+import traceback
+
+from haas.exceptions import PluginError
+from haas.result import (
+    CAPTURE_SYS, TestCompletionStatus, TestDuration, TestResult)
+from haas.result_codec import DEFAULT_RESULT_CODEC, RESULT_CODECS
+from haas.suite import find_test_cases
+from .runner import BaseTestRunner
+from .worker_pool import (
+    _RESULT_FRAME, _MessageSender, _describe_exit, _run_task,
+    _wait_for_connections, default_process_count)
+
+#: Run each test in a process of its own.
+ISOLATE_TEST = 'test'
+
+#: Run the tests of each class together in a process of their own.
+ISOLATE_CLASS = 'class'
+
+
+def _group_tests(test_cases, isolation):
+    """Split ``test_cases`` into the groups that are each run in a forked
+    process.
+
+    """
+    if isolation == ISOLATE_TEST:
+        return [[test_case] for test_case in test_cases]
+    groups = {}
+    ordered = []
+    for test_case in test_cases:
+        group = groups.get(type(test_case))
+        if group is None:
+            group = groups[type(test_case)] = []
+            ordered.append(group)
+        group.append(test_case)
+    return ordered
+
+
+def _exit_code(status):
+    if os.WIFSIGNALED(status):
+        return -os.WTERMSIG(status)
+    return os.WEXITSTATUS(status)
+
+
+class _Fork(object):
+    """The parent's view of a forked process running a group of tests.
+
+    """
+
+    def __init__(self, pid, connection, test_cases):
+        self.pid = pid
+        self.connection = connection
+        self.test_cases = test_cases
+        self.test_index = None
+        self.test_completed = False
+        self.test_start_time = None
+
+    def handle_frame(self, frame, codec):
+        """Return the result encoded in ``frame``, or ``None`` if the frame
+        reports the start of a test.
+
+        """
+        if frame[:1] == _RESULT_FRAME:
+            self.test_completed = True
+            return codec.decode(frame[1:], self.test_cases)
+        kind, _, payload = pickle.loads(frame[1:])
+        if kind == 'start':
+            self.test_index, self.test_start_time = payload
+            self.test_completed = False
+        return None
+
+
+class IsolatedTestRunner(BaseTestRunner):
+    """Test runner that executes each test, or the tests of each class,
+    in a process forked from the test runner.
+
+    Tests are imported once, in the test runner, and each forked process
+    starts with a copy of its state, so tests that change global state
+    cannot affect each other without paying for a new interpreter per
+    test.  Up to ``fork_count`` processes run at the same time.
+
+    A test whose process crashes is recorded as an error and the rest of
+    its group is run in a new process.  This runner requires
+    ``os.fork``.
+
+    """
+
+    def __init__(self, fork_count=None, isolation=ISOLATE_TEST,
+                 warnings=None):
+        super(IsolatedTestRunner, self).__init__(warnings=warnings)
+        self.fork_count = fork_count
+        self.isolation = isolation
+        self._codec = RESULT_CODECS[DEFAULT_RESULT_CODEC]()
+
+    @classmethod
+    def from_args(cls, args, arg_prefix):
+        """Create an :class:`~.IsolatedTestRunner` from command-line
+        arguments.
+
+        """
+        return cls(fork_count=args.forks, isolation=args.isolate)
+
+    @classmethod
+    def add_parser_arguments(self, parser, option_prefix, dest_prefix):
+        fork_count_help = (
+            'The number of forked processes running tests at the same '
+            'time.  Defaults to the number of processor cores.')
+        isolate_help = (
+            'Fork a new process for each test or for the tests of each '
+            'class.  Defaults to {0!r}.'.format(ISOLATE_TEST))
+        parser.add_argument(
+            '--forks', help=fork_count_help, type=int, default=None)
+        parser.add_argument(
+            '--isolate', help=isolate_help,
+            choices=[ISOLATE_TEST, ISOLATE_CLASS], default=ISOLATE_TEST)
+
+    def _handle_result(self, result, test_result):
+        test = test_result.test
+        result.startTest(test, test_result.duration.start_time)
+        result.add_result(test_result)
+        result.stopTest(test)
+
+    def _fork(self, test_cases, capture_limit=None, resource_monitor=None,
+              capture=CAPTURE_SYS):
+        # Output still buffered in this process would be written again
+        # by the child.
+        sys.stdout.flush()
+        sys.stderr.flush()
+        parent_connection, child_connection = multiprocessing.Pipe(
+            duplex=False)
+        pid = os.fork()
+        if pid == 0:  # pragma: no cover
+            exitcode = 1
+            try:
+                parent_connection.close()
+                sender = _MessageSender(child_connection, self._codec)
+                _run_task(sender, None, test_cases, capture_limit,
+                          resource_monitor, capture)
+                exitcode = 0
+            except BaseException:
+                traceback.print_exc()
+                sys.stderr.flush()
+            finally:
+                os._exit(exitcode)
+        child_connection.close()
+        return _Fork(pid, parent_connection, test_cases)
+
+    def _finish(self, result, fork, pending):
+        """Reap the process of ``fork``, recording the test it was
+        running as an error if it crashed and queueing the tests it did
+        not start.
+
+        """
+        fork.connection.close()
+        _, status = os.waitpid(fork.pid, 0)
+        exitcode = _exit_code(status)
+        if exitcode == 0:
+            return
+        if fork.test_index is None:
+            index = 0
+            start_time = datetime.utcnow()
+        else:
+            index = fork.test_index
+            start_time = fork.test_start_time
+        if not fork.test_completed:
+            test_case = fork.test_cases[index]
+            message = 'The process running this test {0}.'.format(
+                _describe_exit(exitcode))
+            duration = TestDuration(start_time, datetime.utcnow())
+            self._handle_result(result, TestResult(
+                type(test_case), test_case._testMethodName,
+                TestCompletionStatus.error, duration, exception=message))
+        remaining = fork.test_cases[index + 1:]
+        if remaining:
+            pending.appendleft(remaining)
+
+    def _kill(self, fork):
+        try:
+            os.kill(fork.pid, signal.SIGKILL)
+        except OSError:
+            pass
+        fork.connection.close()
+        os.waitpid(fork.pid, 0)
+
+    def _run_tests(self, result, test):
+        if not hasattr(os, 'fork'):
+            raise PluginError(
+                'The isolated test runner requires os.fork')
+        fork_count = self.fork_count or default_process_count()
+        pending = deque(_group_tests(
+            list(find_test_cases(test)), self.isolation))
+        running = {}
+        try:
+            while pending or running:
+                while pending and len(running) < fork_count and \
+                        not result.shouldStop:
+                    fork = self._fork(
+                        pending.popleft(), result.capture_limit,
+                        result.resource_monitor, result.capture)
+                    running[fork.connection] = fork
+                if result.shouldStop or not running:
+                    break
+                for connection in _wait_for_connections(
+                        list(running), 1.0):
+                    fork = running[connection]
+                    try:
+                        frame = connection.recv_bytes()
+                    except (EOFError, IOError, OSError):
+                        del running[connection]
+                        self._finish(result, fork, pending)
+                        continue
+                    test_result = fork.handle_frame(frame, self._codec)
+                    if test_result is not None:
+                        self._handle_result(result, test_result)
+        finally:
+            for fork in running.values():
+                self._kill(fork)
+
+    def run(self, result_collector, test_to_run):
+        """Run the tests in forked processes.
+
+        """
+        def test(result):
+            self._run_tests(result_collector, test_to_run)
+        return super(IsolatedTestRunner, self).run(result_collector, test)
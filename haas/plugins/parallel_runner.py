@@ -1,62 +1,149 @@
-from multiprocessing import Pool
-import time
+import logging
 
+from haas.duration_history import DurationHistory
+from haas.markers import get_cpu_slots, get_resources
 from haas.module_import_error import ModuleImportError
 from haas.suite import find_test_cases
-from haas.result import ResultCollector
-from haas.utils import get_module_by_name
-from .i_result_handler_plugin import IResultHandlerPlugin
+from haas.result import CAPTURE_SYS, ResultCollector
+from haas.result_codec import DEFAULT_RESULT_CODEC, RESULT_CODECS
+from haas.utils import get_module_by_name, parse_size
 from .runner import BaseTestRunner
+from .worker_pool import (
+    PIPE_TRANSPORT, RESULT_TRANSPORTS, ChildResultHandler, WorkerPool,
+    _monotonic, default_process_count)
 
+logger = logging.getLogger(__name__)
 
-class ChildResultHandler(IResultHandlerPlugin):
-    """A result handler that simply collects :class`TestResults
-    <haas.result.TestResult>` for returning to the parent process.
+#: With ``--test-timeout auto``, a test times out after this multiple
+#: of its longest recorded duration (or of the 99th percentile of all
+#: recorded durations, for tests that have not been recorded)...
+ADAPTIVE_TIMEOUT_FACTOR = 10
 
-    """
+#: ... but never in less than this many seconds.
+ADAPTIVE_TIMEOUT_MINIMUM = 60.0
 
-    def __init__(self):
-        self.start_time = None
-        self.stop_time = None
-        self.results = []
+#: The value of ``--test-timeout`` that selects the adaptive timeout.
+AUTO_TIMEOUT = 'auto'
 
-    # To keep the interface happy
-    @classmethod
-    def from_args(cls, args, arg_prefix, test_count):  # pragma: no cover
-        pass
+#: While running tests in the parent process, results are collected
+#: from the worker processes at most this often, in seconds.
+LOCAL_POLL_INTERVAL = 0.01
 
-    # To keep the interface happy
-    @classmethod
-    def add_parser_arguments(self, parser, name, option_prefix, dest_prefix):  # pragma: no cover  # noqa
-        pass
 
-    def start_test(self, test):
-        pass
+def _run_test_in_process(test_case, capture_limit=None,
+                         resource_monitor=None, capture=CAPTURE_SYS):
+    result_handler = ChildResultHandler()
+    result_collector = ResultCollector(
+        buffer=True, capture=capture, capture_limit=capture_limit,
+        resource_monitor=resource_monitor)
+    result_collector.add_result_handler(result_handler)
+    runner = BaseTestRunner()
+    runner.run(result_collector, test_case)
+    return result_handler.results
 
-    def stop_test(self, test):
-        pass
 
-    def start_test_run(self):
-        self.start_time = time.time()
+def _schedule_tasks(test_cases, duration_history, process_count):
+    """Group test cases into tasks ordered longest-processing-time-first.
 
-    def stop_test_run(self):
-        self.stop_time = time.time()
+    Tests without a recorded duration may be slow, so they are each
+    given a task of their own at the front of the queue.  Tests with a
+    recorded duration follow, longest first.  Each new task takes tests
+    until its expected duration reaches ``remaining / (2 *
+    process_count)``; the tasks get smaller as the queue drains so that
+    workers that become idle near the end of the run pick up the
+    remaining short tests instead of waiting on one long batch.  Tests
+    that declare resources or CPU slots (see :mod:`haas.markers`) are
+    given tasks of their own, so that they do not hold up other tests
+    in their batch.
 
-    def __call__(self, result):
-        self.results.append(result)
+    Parameters
+    ----------
+    test_cases : list
+        The test cases to schedule, in discovery order.
+    duration_history : haas.duration_history.DurationHistory
+        Recorded test durations, or ``None``.
+    process_count : int
+        The number of worker processes.
 
+    """
+    if duration_history is None or len(duration_history) == 0:
+        return [[test_case] for test_case in test_cases]
+
+    tasks = []
+    known = []
+    for index, test_case in enumerate(test_cases):
+        estimate = duration_history.estimate(test_case.id())
+        if estimate is None:
+            tasks.append([test_case])
+        else:
+            known.append((-estimate, index, test_case))
+    known.sort(key=lambda item: item[:2])
+
+    remaining = -sum(item[0] for item in known)
+    batch = []
+    batch_duration = 0.0
+    target = remaining / (2 * process_count)
+    for negative_estimate, _, test_case in known:
+        estimate = -negative_estimate
+        if get_resources(test_case) or get_cpu_slots(test_case) > 1:
+            tasks.append([test_case])
+            remaining -= estimate
+            continue
+        if batch and batch_duration + estimate > target:
+            tasks.append(batch)
+            remaining -= batch_duration
+            target = remaining / (2 * process_count)
+            batch = []
+            batch_duration = 0.0
+        batch.append(test_case)
+        batch_duration += estimate
+    if batch:
+        tasks.append(batch)
+    return tasks
 
-def _run_test_in_process(test_case):
-    result_handler = ChildResultHandler()
-    result_collector = ResultCollector(buffer=True)
-    result_collector.add_result_handler(result_handler)
-    runner = BaseTestRunner()
-    runner.run(result_collector, test_case)
-    return result_handler.results
+
+def _timeout_type(value):
+    if value == AUTO_TIMEOUT:
+        return value
+    return float(value)
+
+
+def _format_size(size):
+    if size is None:
+        return 'unknown'
+    return '{0:.1f} MiB'.format(size / float(1024 ** 2))
 
 
 class ParallelTestRunner(BaseTestRunner):
-    """Test runner that executes all tests via a ``multiprocessing.Pool``.
+    """Test runner that executes all tests in a pool of worker processes.
+
+    When a :class:`~haas.duration_history.DurationHistory` is given,
+    the duration of each test is recorded in it and tests are submitted
+    to the pool longest-first, based on their previous durations.
+
+    A test that runs for longer than ``test_timeout`` seconds is
+    recorded as an error and its worker process is replaced.  If
+    ``test_timeout`` is ``'auto'``, the timeout of each test is derived
+    from the durations in the ``duration_history``.  If the whole run
+    takes longer than ``run_timeout`` seconds, the running and queued
+    tests are recorded as errors and the run is stopped.  When the result
+    collector is stopped (for example, by ``--failfast`` or
+    ``--maxfail``), queued tests are dropped and the running tests are
+    killed.
+
+    Test results are sent from the worker processes encoded with the
+    :mod:`~haas.result_codec` named by ``result_codec``, over pipes or,
+    if ``result_transport`` is ``'shared-memory'``, through ring buffers
+    in shared memory (see :mod:`~haas.result_ring`).
+
+    The number of processes defaults to the number of CPUs that the
+    runner may use, respecting its CPU affinity and any cgroup CPU quota
+    (see :func:`~haas.plugins.worker_pool.default_process_count`).  If
+    ``pin_workers`` is ``True``, each worker process is pinned to a CPU.
+
+    A worker whose resident set size exceeds ``process_max_rss`` bytes
+    after a task is replaced, and the peak memory used by each worker is
+    reported at the end of the run.
 
     .. warning::
 
@@ -66,11 +153,22 @@ class ParallelTestRunner(BaseTestRunner):
     """
 
     def __init__(self, process_count=None, initializer=None,
-                 maxtasksperchild=None, warnings=None):
+                 maxtasksperchild=None, warnings=None,
+                 duration_history=None, test_timeout=None,
+                 run_timeout=None, result_codec=DEFAULT_RESULT_CODEC,
+                 pin_workers=False, process_max_rss=None,
+                 result_transport=PIPE_TRANSPORT):
         super(ParallelTestRunner, self).__init__(warnings=warnings)
         self.process_count = process_count
         self.initializer = initializer
         self.maxtasksperchild = maxtasksperchild
+        self.duration_history = duration_history
+        self.test_timeout = test_timeout
+        self.run_timeout = run_timeout
+        self.result_codec = result_codec
+        self.pin_workers = pin_workers
+        self.process_max_rss = process_max_rss
+        self.result_transport = result_transport
 
     @classmethod
     def from_args(cls, args, arg_prefix):
@@ -84,14 +182,26 @@ class ParallelTestRunner(BaseTestRunner):
             module_name, initializer_name = initializer_spec.rsplit('.', 1)
             init_module = get_module_by_name(module_name)
             initializer = getattr(init_module, initializer_name)
+        if args.duration_history is None:
+            duration_history = None
+        else:
+            duration_history = DurationHistory.load(args.duration_history)
         return cls(process_count=args.processes, initializer=initializer,
-                   maxtasksperchild=args.process_max_tasks)
+                   maxtasksperchild=args.process_max_tasks,
+                   duration_history=duration_history,
+                   test_timeout=args.test_timeout,
+                   run_timeout=args.run_timeout,
+                   result_codec=args.result_codec,
+                   pin_workers=args.pin_workers,
+                   process_max_rss=args.process_max_rss,
+                   result_transport=args.result_transport)
 
     @classmethod
     def add_parser_arguments(self, parser, option_prefix, dest_prefix):
         process_count_help = (
             'Number of processes to use if running tests in paralled.  '
-            'Defaults to number of processor cores.')
+            'Defaults to the number of processor cores available to haas, '
+            'respecting its CPU affinity and cgroup CPU quota.')
         process_init_help = (
             'The dotted module path to a subprocess initialization function. '
             'This function will be passed to the subprocess and called with '
@@ -100,6 +210,41 @@ class ParallelTestRunner(BaseTestRunner):
             'The number of tasks each process is allowed to run before it is '
             'replaced by a new process.  Defaults to no limit.'
         )
+        process_max_rss_help = (
+            'The resident memory size (in bytes, or with a K, M or G '
+            'suffix) above which a process is replaced by a new process '
+            'once it finishes its current tests.  Defaults to no limit.'
+        )
+        duration_history_help = (
+            'A file in which to record the duration of each test.  When '
+            'given, tests are run longest-first based on their recorded '
+            'durations.  If FILE is a --timing-history database, the '
+            'durations recorded there are used instead, and the database '
+            'is not written to.'
+        )
+        test_timeout_help = (
+            'The number of seconds after which a test is killed and '
+            'recorded as an error.  "auto" derives the timeout of each test '
+            'from the durations in the --duration-history file.  Defaults '
+            'to no timeout.'
+        )
+        run_timeout_help = (
+            'The number of seconds after which the whole test run is '
+            'stopped.  Defaults to no timeout.'
+        )
+        result_codec_help = (
+            'The encoding used to send test results from the worker '
+            'processes.  Defaults to {0!r}.'.format(DEFAULT_RESULT_CODEC)
+        )
+        result_transport_help = (
+            'How the worker processes send test results: over a pipe, or '
+            'through a ring buffer in shared memory.  Defaults to '
+            '{0!r}.'.format(PIPE_TRANSPORT)
+        )
+        pin_workers_help = (
+            'Pin each worker process to its own processor core, where the '
+            'platform supports it.'
+        )
         parser.add_argument(
             '--processes', help=process_count_help, type=int, default=None)
         parser.add_argument(
@@ -108,51 +253,172 @@ class ParallelTestRunner(BaseTestRunner):
             '--process-max-tasks', help=process_maxtasksperchild_help,
             type=int, default=None,
         )
+        parser.add_argument(
+            '--process-max-rss', help=process_max_rss_help,
+            type=parse_size, default=None, metavar='SIZE',
+        )
+        parser.add_argument(
+            '--duration-history', help=duration_history_help, default=None,
+            metavar='FILE',
+        )
+        parser.add_argument(
+            '--test-timeout', help=test_timeout_help, type=_timeout_type,
+            default=None, metavar='SECONDS',
+        )
+        parser.add_argument(
+            '--run-timeout', help=run_timeout_help, type=float,
+            default=None, metavar='SECONDS',
+        )
+        parser.add_argument(
+            '--result-codec', help=result_codec_help,
+            choices=sorted(RESULT_CODECS), default=DEFAULT_RESULT_CODEC,
+        )
+        parser.add_argument(
+            '--result-transport', help=result_transport_help,
+            choices=RESULT_TRANSPORTS, default=PIPE_TRANSPORT,
+        )
+        parser.add_argument(
+            '--pin-workers', help=pin_workers_help, action='store_true',
+            default=False,
+        )
+
+    def _get_test_timeout(self):
+        """Return a function mapping a test case to its timeout in
+        seconds, or ``None`` if tests have no timeout.
+
+        """
+        test_timeout = self.test_timeout
+        if test_timeout is None:
+            return None
+        if test_timeout != AUTO_TIMEOUT:
+            return lambda test_case: test_timeout
+
+        duration_history = self.duration_history
+        if duration_history is None or len(duration_history) == 0:
+            logger.warning('No recorded test durations; tests will not '
+                           'time out')
+            return None
+        default = duration_history.percentile(99)
+
+        def adaptive_timeout(test_case):
+            samples = duration_history.samples(test_case.id())
+            longest = max(samples) if samples else default
+            return max(ADAPTIVE_TIMEOUT_MINIMUM,
+                       ADAPTIVE_TIMEOUT_FACTOR * longest)
+        return adaptive_timeout
+
+    def _create_pool(self, process_count, capture_limit=None,
+                     resource_monitor=None, capture=CAPTURE_SYS):
+        return WorkerPool(
+            process_count, initializer=self.initializer,
+            maxtasksperchild=self.maxtasksperchild,
+            test_timeout=self._get_test_timeout(),
+            result_codec=self.result_codec, pin_workers=self.pin_workers,
+            max_rss=self.process_max_rss,
+            result_transport=self.result_transport,
+            capture_limit=capture_limit, resource_monitor=resource_monitor,
+            capture=capture)
 
     def _handle_result(self, result, collected_result):
+        duration_history = self.duration_history
         for test_result in collected_result:
             test = test_result.test
             result.startTest(test, test_result.duration.start_time)
             result.add_result(test_result)
             result.stopTest(test)
+            if duration_history is not None:
+                duration_history.record(
+                    test.id(), test_result.duration.total_seconds)
+
+    def _runs_in_process(self, test_case):
+        """Return ``True`` if ``test_case`` is run in this process rather
+        than being sent to a worker process.
+
+        """
+        return isinstance(test_case, ModuleImportError)
+
+    def _check_run_timeout(self, result, pool, deadline):
+        if deadline is not None and _monotonic() > deadline:
+            reason = 'Test run timed out after {0} seconds'.format(
+                self.run_timeout)
+            self._handle_result(result, pool.terminate(reason))
+            result.stop()
+
+    def _run_local_tests(self, result, pool, test_cases, deadline):
+        """Run ``test_cases`` in this process, collecting the results of
+        the worker processes between tests.
+
+        """
+        last_poll = _monotonic()
+        for test_case in test_cases:
+            if result.shouldStop:
+                break
+            self._handle_result(result, _run_test_in_process(
+                test_case, result.capture_limit, result.resource_monitor,
+                result.capture))
+            now = _monotonic()
+            if now - last_poll >= LOCAL_POLL_INTERVAL:
+                self._handle_result(result, pool.poll(0))
+                self._check_run_timeout(result, pool, deadline)
+                last_poll = now
 
     def _run_tests(self, result, test):
-        pool = Pool(processes=self.process_count,
-                    initializer=self.initializer,
-                    maxtasksperchild=self.maxtasksperchild)
+        local_tests = []
+        test_cases = []
+        for test_case in find_test_cases(test):
+            if self._runs_in_process(test_case):
+                local_tests.append(test_case)
+            else:
+                test_cases.append(test_case)
 
+        process_count = self.process_count or default_process_count()
+        pool = self._create_pool(
+            process_count, result.capture_limit, result.resource_monitor,
+            result.capture)
+        for task in _schedule_tasks(
+                test_cases, self.duration_history, process_count):
+            pool.submit(task)
+
+        if self.run_timeout is None:
+            deadline = None
+        else:
+            deadline = _monotonic() + self.run_timeout
+
+        pool.start()
         try:
-            def callback(collected_result):
-                self._handle_result(result, collected_result)
-            error_tests = []
-            call_results = []
-            for test_case in find_test_cases(test):
-                if isinstance(test_case, ModuleImportError):
-                    error_tests.append(test_case)
-                else:
-                    call_result = pool.apply_async(
-                        _run_test_in_process, args=(test_case,),
-                        callback=callback)
-                    call_results.append(call_result)
-
-            for test_case in error_tests:
-                collected_result = _run_test_in_process(test_case)
-                callback(collected_result)
+            self._run_local_tests(result, pool, local_tests, deadline)
+            while pool.has_work:
+                if result.shouldStop:
+                    pool.cancel()
+                    break
+                self._handle_result(result, pool.poll(0.25))
+                self._check_run_timeout(result, pool, deadline)
         finally:
-            pool.close()
-            # In some cases (when processes > CPU_CORE_COUNT), the
-            # combination of pool.close() and pool.join() does not
-            # make the Pool terminate, one or more processes remains
-            # alive and the program hangs.
-            # To work around this, We wait for all jobs submitted to
-            # the pool to complete, and then explicitly call
-            # pool.terminate() before pool.join().
-            while len(call_results) > 0:
-                call_results[0].wait(0.25)
-                call_results = [call_result for call_result in call_results
-                                if not call_result.ready()]
-            pool.terminate()
-            pool.join()
+            pool.shutdown()
+        if self.process_max_rss is not None:
+            result.add_run_report(*self._memory_report(pool.memory_usage))
+
+    def _memory_report(self, memory_usage):
+        """Return the title and lines of the report on the peak memory
+        of each worker.
+
+        """
+        title = 'Worker memory (limit {0}):'.format(
+            _format_size(self.process_max_rss))
+        lines = []
+        recycled = 0
+        for worker_id in sorted(memory_usage):
+            usage = memory_usage[worker_id]
+            lines.append(
+                '  worker {0} (pid {1}): peak RSS {2} over {3} task{4}'
+                '{5}'.format(
+                    worker_id, usage.pid, _format_size(usage.peak_rss),
+                    usage.tasks_run, '' if usage.tasks_run == 1 else 's',
+                    ', recycled' if usage.recycled else ''))
+            recycled += usage.recycled
+        lines.append('{0} worker{1} recycled for exceeding the limit'.format(
+            recycled, '' if recycled == 1 else 's'))
+        return title, lines
 
     def run(self, result_collector, test_to_run):
         """Run the tests in subprocesses.
@@ -160,4 +426,10 @@ class ParallelTestRunner(BaseTestRunner):
         """
         def test(result):
             self._run_tests(result_collector, test_to_run)
-        return super(ParallelTestRunner, self).run(result_collector, test)
+        try:
+            return super(ParallelTestRunner, self).run(result_collector, test)
+        finally:
+            duration_history = self.duration_history
+            if duration_history is not None and \
+                    duration_history.path is not None:
+                duration_history.save()
@@ -6,13 +6,33 @@
 # of the 3-clause BSD license.  See the LICENSE.txt file for details.
 from __future__ import absolute_import, unicode_literals
 
-import statistics
+from array import array
+import bisect
+from collections import OrderedDict
+import heapq
+import io
+import math
+import random
+import re
+import shutil
+import signal
 import sys
+import tempfile
 import time
 
-from haas.result import TestCompletionStatus, TestDuration, separator2
+try:
+    import numpy
+except ImportError:  # pragma: no cover
+    numpy = None
+
+from haas.resource_usage import format_bytes
+from haas.result import (
+    STDERR_LINE, STDOUT_LINE, TestCompletionStatus, TestDuration,
+    separator2)
 from .i_result_handler_plugin import IResultHandlerPlugin
 
+_monotonic = getattr(time, 'monotonic', time.time)
+
 
 def get_test_description(test, descriptions=True):
     doc_first_line = test.shortDescription()
@@ -38,6 +58,58 @@ class _WritelnDecorator(object):
         self.write('\n')  # text-mode streams translate to \r\n if needed
 
 
+#: The number of innermost traceback frames in a failure signature.
+SIGNATURE_FRAMES = 3
+
+_FRAME_LINE = re.compile(
+    r'^  File "(?P<filename>.*)", line (?P<line>\d+), in (?P<name>.*)$')
+_VARIABLE_TEXT = re.compile(
+    r"0x[0-9a-fA-F]+|\d+(?:\.\d+)?|'[^']*'|\"[^\"]*\"")
+_OUTPUT_MARKERS = (STDOUT_LINE % '', STDERR_LINE % '')
+
+
+def failure_signature(exception, frames=SIGNATURE_FRAMES):
+    """Return a normalised signature of a formatted ``exception``.
+
+    The signature is made of the exception type, its message with
+    numbers, addresses and quoted strings replaced by placeholders, and
+    the ``frames`` innermost frames of the traceback.  Captured output
+    is ignored, so tests that fail in the same way have the same
+    signature.
+
+    """
+    if exception is None:
+        return None
+    for marker in _OUTPUT_MARKERS:
+        exception = exception.split(marker, 1)[0]
+    lines = exception.splitlines()
+    frame_lines = []
+    exception_line = ''
+    for line in lines:
+        match = _FRAME_LINE.match(line)
+        if match is not None:
+            frame_lines.append(match.group('filename', 'line', 'name'))
+            exception_line = ''
+        elif not exception_line and line and not line.startswith(' '):
+            exception_line = line
+    return (
+        _VARIABLE_TEXT.sub('<?>', exception_line),
+        tuple(frame_lines[-frames:]) if frames > 0 else ())
+
+
+def group_by_signature(results):
+    """Group :class:`~haas.result.TestResult` instances by the
+    :func:`~.failure_signature` of their exception, in the order in which
+    each group was first seen.
+
+    """
+    groups = OrderedDict()
+    for result in results:
+        groups.setdefault(
+            failure_signature(result.exception), []).append(result)
+    return list(groups.values())
+
+
 def sort_result_handlers(handlers):
     core_result_handlers = set([
         QuietTestResultHandler,
@@ -64,11 +136,34 @@ def sort_result_handlers(handlers):
 
 
 class QuietTestResultHandler(IResultHandlerPlugin):
+    """Prints the errors and failures and a summary at the end of the
+    test run.
+
+    If ``group_failures`` is set, tests that fail with the same
+    :func:`~.failure_signature` are reported once, with the list of the
+    affected tests.
+
+    If ``streaming`` is set, the handler only counts results: the
+    reports of errors and failures are written to temporary files as
+    they arrive and copied to the stream at the end of the run, so that
+    its memory use does not grow with the number of tests.  Grouped
+    failures then record the number of affected tests, but not their
+    names.
+
+    """
+
     separator1 = '=' * 70
     separator2 = separator2
 
-    def __init__(self, test_count):
+    _error_kinds = {
+        TestCompletionStatus.error: 'ERROR',
+        TestCompletionStatus.failure: 'FAIL',
+    }
+
+    def __init__(self, test_count, group_failures=False, streaming=False):
         self.enabled = True
+        self.group_failures = group_failures
+        self.streaming = streaming
         self.stream = _WritelnDecorator(sys.stderr)
         self._test_count = test_count
         self.tests_run = 0
@@ -85,13 +180,24 @@ class QuietTestResultHandler(IResultHandlerPlugin):
             TestCompletionStatus.expected_failure: expectedFailures,
             TestCompletionStatus.skipped: skipped,
         }
+        self._counts = dict((status, 0) for status in TestCompletionStatus)
+        # The spilled reports, or the groups of failures by signature, of
+        # each error kind in streaming mode
+        self._spilled = {}
+        self._groups = dict(
+            (status, OrderedDict()) for status in self._error_kinds)
+        #: The ``(title, lines)`` of the reports on the test run printed
+        #: before the summary.
+        self.run_reports = []
         self.start_time = None
         self.stop_time = None
 
     @classmethod
     def from_args(cls, args, name, dest_prefix, test_count):
         if args.verbosity == 0:
-            return cls(test_count=test_count)
+            return cls(test_count=test_count,
+                       group_failures=args.group_failures,
+                       streaming=args.streaming)
 
     @classmethod
     def add_parser_arguments(self, parser, name, option_prefix, dest_prefix):
@@ -114,13 +220,20 @@ class QuietTestResultHandler(IResultHandlerPlugin):
         self.print_errors()
         self.print_summary()
 
+    def add_run_report(self, title, lines):
+        self.run_reports.append((title, lines))
+
     def print_errors(self):
         """Print all errors and failures to the console.
 
         """
         self.stream.writeln()
-        self.print_error_list('ERROR', self.errors)
-        self.print_error_list('FAIL', self.failures)
+        if self.streaming:
+            self._print_streamed_errors(TestCompletionStatus.error)
+            self._print_streamed_errors(TestCompletionStatus.failure)
+        else:
+            self.print_error_list('ERROR', self.errors)
+            self.print_error_list('FAIL', self.failures)
 
     def print_error_list(self, error_kind, errors):
         """Print the list of errors or failures.
@@ -133,15 +246,73 @@ class QuietTestResultHandler(IResultHandlerPlugin):
             List of :class:`~haas.result.TestResult`
 
         """
-        for result in errors:
-            self.stream.writeln(self.separator1)
-            self.stream.writeln(
-                '%s: %s' % (error_kind, self.get_test_description(
-                    result.test)))
-            self.stream.writeln(self.separator2)
-            self.stream.writeln(result.exception)
+        if self.group_failures:
+            groups = group_by_signature(errors)
+        else:
+            groups = [[result] for result in errors]
+        for group in groups:
+            result = group[0]
+            self._write_error(
+                self.stream, error_kind,
+                self.get_test_description(result.test), result.exception,
+                len(group) - 1,
+                [self.get_test_description(other.test)
+                 for other in group[1:]])
+
+    def _write_error(self, stream, error_kind, description, exception,
+                     other_count=0, other_descriptions=()):
+        stream.writeln(self.separator1)
+        stream.writeln('%s: %s' % (error_kind, description))
+        if other_count:
+            stream.writeln('and %d more tests with the same %s%s' % (
+                other_count, error_kind, ':' if other_descriptions else ''))
+            for other in other_descriptions:
+                stream.writeln('  %s' % (other,))
+        stream.writeln(self.separator2)
+        stream.writeln(exception)
+
+    def _stream_error(self, result):
+        """Record an error or failure in streaming mode.
+
+        """
+        status = result.status
+        description = self.get_test_description(result.test)
+        if self.group_failures:
+            groups = self._groups[status]
+            signature = failure_signature(result.exception)
+            group = groups.get(signature)
+            if group is None:
+                groups[signature] = [description, result.exception, 0]
+            else:
+                group[2] += 1
+            return
+        spilled = self._spilled.get(status)
+        if spilled is None:
+            spilled = self._spilled[status] = _WritelnDecorator(
+                io.TextIOWrapper(tempfile.TemporaryFile(), encoding='utf-8',
+                                 errors='replace'))
+        self._write_error(
+            spilled, self._error_kinds[status], description,
+            result.exception)
+
+    def _print_streamed_errors(self, status):
+        error_kind = self._error_kinds[status]
+        for description, exception, other_count in \
+                self._groups[status].values():
+            self._write_error(
+                self.stream, error_kind, description, exception,
+                other_count)
+        spilled = self._spilled.pop(status, None)
+        if spilled is not None:
+            spilled.seek(0)
+            shutil.copyfileobj(spilled, self.stream)
+            spilled.close()
 
     def print_summary(self):
+        for title, lines in self.run_reports:
+            self.stream.writeln(title)
+            for line in lines:
+                self.stream.writeln(line)
         self.stream.writeln(self.separator2)
         time_taken = self.stop_time - self.start_time
 
@@ -151,15 +322,16 @@ class QuietTestResultHandler(IResultHandlerPlugin):
                             (run, run != 1 and "s" or "", time_taken))
         self.stream.writeln()
 
-        selfs = map(len, (self.expectedFailures,
-                          self.unexpectedSuccesses,
-                          self.skipped))
-        expectedFails, unexpectedSuccesses, skipped = selfs
+        counts = self._counts
+        expectedFails = counts[TestCompletionStatus.expected_failure]
+        unexpectedSuccesses = counts[TestCompletionStatus.unexpected_success]
+        skipped = counts[TestCompletionStatus.skipped]
 
         infos = []
         if not self.was_successful():
             self.stream.write("FAILED")
-            failed, errored = len(self.failures), len(self.errors)
+            failed = counts[TestCompletionStatus.failure]
+            errored = counts[TestCompletionStatus.error]
             if failed:
                 infos.append("failures=%d" % failed)
             if errored:
@@ -178,11 +350,17 @@ class QuietTestResultHandler(IResultHandlerPlugin):
             self.stream.write("\n")
 
     def was_successful(self):
-        return (len(self.errors) == 0 and
-                len(self.failures) == 0 and
-                len(self.unexpectedSuccesses) == 0)
+        counts = self._counts
+        return (counts[TestCompletionStatus.error] == 0 and
+                counts[TestCompletionStatus.failure] == 0 and
+                counts[TestCompletionStatus.unexpected_success] == 0)
 
     def __call__(self, result):
+        self._counts[result.status] += 1
+        if self.streaming:
+            if result.status in self._error_kinds:
+                self._stream_error(result)
+            return
         collector = self._collectors.get(result.status)
         if collector is not None:
             collector.append(result)
@@ -202,7 +380,9 @@ class StandardTestResultHandler(QuietTestResultHandler):
     @classmethod
     def from_args(cls, args, name, dest_prefix, test_count):
         if args.verbosity == 1:
-            return cls(test_count=test_count)
+            return cls(test_count=test_count,
+                       group_failures=args.group_failures,
+                       streaming=args.streaming)
 
     def __call__(self, result):
         super(StandardTestResultHandler, self).__call__(result)
@@ -224,7 +404,9 @@ class VerboseTestResultHandler(StandardTestResultHandler):
     @classmethod
     def from_args(cls, args, name, dest_prefix, test_count):
         if args.verbosity == 2:
-            return cls(test_count=test_count)
+            return cls(test_count=test_count,
+                       group_failures=args.group_failures,
+                       streaming=args.streaming)
 
     def start_test(self, test):
         super(VerboseTestResultHandler, self).start_test(test)
@@ -249,25 +431,181 @@ class VerboseTestResultHandler(StandardTestResultHandler):
         self.stream.flush()
 
 
+#: The number of test durations sampled by the
+#: :class:`~.TimingResultHandler` in streaming mode to estimate the median
+#: and percentiles.
+TIMING_SAMPLE_SIZE = 10000
+
+#: The percentiles of the test durations reported by the
+#: :class:`~.TimingResultHandler`.
+TIMING_PERCENTILES = (80, 90, 95, 99)
+
+
+def _duration_percentiles(durations):
+    """Return the median and the :data:`TIMING_PERCENTILES` of the
+    ``durations``, an ``array('d')`` of seconds.
+
+    With NumPy, the values are found with a partial sort (selection) of
+    the durations; without it, the floats are sorted.
+
+    """
+    count = len(durations)
+    # The n-th percentile is the duration of the test at index
+    # int(count * (100 - n) / 100) of the tests ordered slowest first.
+    percentile_indices = [
+        count - 1 - int(count * (100 - percentile) / 100.0)
+        for percentile in TIMING_PERCENTILES]
+    median_indices = [(count - 1) // 2, count // 2]
+    indices = sorted(set(percentile_indices + median_indices))
+    if numpy is not None:
+        values = numpy.frombuffer(durations, dtype=numpy.float64)
+        ordered = numpy.partition(values, indices)
+    else:
+        ordered = sorted(durations)
+    low, high = (float(ordered[index]) for index in median_indices)
+    median = (low + high) / 2
+    percentiles = [float(ordered[index]) for index in percentile_indices]
+    return median, percentiles
+
+
+#: The percentiles of the test durations in the live timing reports.
+LIVE_PERCENTILES = (50, 90, 99)
+
+#: The upper edges, in seconds, of the bars of the duration histogram in
+#: the live timing reports.
+HISTOGRAM_EDGES = (0.001, 0.01, 0.1, 1.0, 10.0)
+
+_HISTOGRAM_LABELS = (
+    '< 1ms', '1ms-10ms', '10ms-100ms', '100ms-1s', '1s-10s', '>= 10s')
+
+_HISTOGRAM_WIDTH = 40
+
+
+class _DurationHistogram(object):
+    """A constant-memory sketch of the distribution of test durations.
+
+    Durations between :attr:`MIN_DURATION` and :attr:`MAX_DURATION`
+    seconds are counted in logarithmic bins, so a quantile is estimated
+    to within ``precision`` of its value, in the manner of an HDR
+    histogram.  The durations are also counted in the coarser bars of
+    :data:`HISTOGRAM_EDGES`.
+
+    """
+
+    MIN_DURATION = 1e-6
+
+    MAX_DURATION = 86400.0
+
+    def __init__(self, precision=0.01):
+        self.count = 0
+        self._log_base = math.log1p(precision)
+        self._last_bin = int(math.log(
+            self.MAX_DURATION / self.MIN_DURATION) / self._log_base) + 1
+        self._counts = array('L', [0]) * (self._last_bin + 1)
+        self._bars = [0] * (len(HISTOGRAM_EDGES) + 1)
+
+    def _bin(self, seconds):
+        if seconds <= self.MIN_DURATION:
+            return 0
+        index = int(
+            math.log(seconds / self.MIN_DURATION) / self._log_base) + 1
+        return min(index, self._last_bin)
+
+    def add(self, seconds):
+        self.count += 1
+        self._counts[self._bin(seconds)] += 1
+        self._bars[bisect.bisect_right(HISTOGRAM_EDGES, seconds)] += 1
+
+    def quantile(self, fraction):
+        """Estimate the duration, in seconds, below which ``fraction`` of
+        the durations fall.
+
+        """
+        if self.count == 0:
+            return None
+        rank = fraction * (self.count - 1)
+        seen = 0
+        for index, count in enumerate(self._counts):
+            seen += count
+            if seen > rank:
+                break
+        if index == 0:
+            return self.MIN_DURATION
+        # The geometric middle of the bin.
+        return self.MIN_DURATION * math.exp(self._log_base * (index - 0.5))
+
+    def bars(self):
+        """Return a list of ``(label, count)`` for the bars of the
+        histogram.
+
+        """
+        return list(zip(_HISTOGRAM_LABELS, self._bars))
+
+
 class TimingResultHandler(IResultHandlerPlugin):
+    """Prints the slowest tests and statistics of the test durations at
+    the end of the test run.
+
+    The handler keeps the slowest tests, the running mean and variance
+    of the durations, and the durations themselves in an
+    ``array('d')``, from which the median and percentiles are selected
+    (see :func:`_duration_percentiles`).
+
+    If ``streaming`` is set, only a random sample of
+    :data:`TIMING_SAMPLE_SIZE` durations is kept, from which the median
+    and percentiles are estimated, so that its memory use does not grow
+    with the number of tests.
+
+    While the tests run, the durations are also counted in a
+    :class:`_DurationHistogram`.  A live report of the
+    :data:`LIVE_PERCENTILES` and a histogram of the durations so far is
+    printed every ``report_interval`` seconds, if set, and after the next
+    test result when the process receives ``SIGUSR1``.
+
+    The resources used by the slowest tests, and the mean CPU time and
+    largest memory growth of all tests, are reported for results that
+    hold :class:`~haas.resource_usage.TestResources`.
+
+    """
+
     separator1 = '=' * 70
     separator2 = separator2
 
     OPTION_DEFAULT = object()
 
-    def __init__(self, number_to_summarize):
+    def __init__(self, number_to_summarize, streaming=False,
+                 report_interval=None):
         self.enabled = True
         self.stream = _WritelnDecorator(sys.stderr)
         self.descriptions = True
         self.number_to_summarize = number_to_summarize
-        self._test_results = []
+        self.streaming = streaming
+        # A heap of the slowest tests, the count, mean and sum of squared
+        # deviations of the durations, and the (sampled) durations.
+        self._slowest = []
+        self._count = 0
+        self._mean = 0.0
+        self._m2 = 0.0
+        self._durations = array('d')
+        self._random = random.Random(0)
+        # The totals and peaks of the resources used by the tests.
+        self._resource_count = 0
+        self._cpu_time = 0.0
+        self._max_rss_delta = None
+        self._tracemalloc_peak = None
+        self.report_interval = report_interval
+        self._histogram = _DurationHistogram()
+        self._next_report = None
+        self._report_requested = False
+        self._previous_handler = None
 
     @classmethod
     def from_args(cls, args, name, dest_prefix, test_count):
         if args.summarize_test_time is not cls.OPTION_DEFAULT:
             number_to_summarize = args.summarize_test_time or 10
             if number_to_summarize > 0:
-                return cls(number_to_summarize)
+                return cls(number_to_summarize, streaming=args.streaming,
+                           report_interval=args.timing_report_interval)
 
     @classmethod
     def add_parser_arguments(cls, parser, name, option_prefix, dest_prefix):
@@ -276,6 +614,12 @@ class TimingResultHandler(IResultHandlerPlugin):
                             nargs='?', default=cls.OPTION_DEFAULT,
                             help=('Show test time summary and N slowest tests '
                                   '(default 10)'))
+        parser.add_argument('--timing-report-interval', action='store',
+                            type=float, metavar='SECONDS', default=None,
+                            help=('With --summarize-test-time, print the '
+                                  'running percentiles and a histogram of '
+                                  'the test durations every SECONDS.  The '
+                                  'report is also printed on SIGUSR1'))
 
     def start_test(self, test):
         pass
@@ -284,62 +628,143 @@ class TimingResultHandler(IResultHandlerPlugin):
         pass
 
     def start_test_run(self):
-        pass
+        if self.report_interval is not None:
+            self._next_report = _monotonic() + self.report_interval
+        if hasattr(signal, 'SIGUSR1'):
+            try:
+                self._previous_handler = signal.signal(
+                    signal.SIGUSR1, self._request_report)
+            except ValueError:
+                # Signal handlers can only be set in the main thread.
+                self._previous_handler = None
 
     def stop_test_run(self):
+        if self._previous_handler is not None:
+            signal.signal(signal.SIGUSR1, self._previous_handler)
+            self._previous_handler = None
         self.print_summary()
 
-    def print_summary(self):
-        tests_by_time = sorted(
-            self._test_results,
-            key=lambda item: item.duration,
-            reverse=True,
-        )
-        tests_count = len(tests_by_time)
-
-        durations = [t.duration for t in tests_by_time]
-        median = statistics.median(durations)
-        mean = statistics.mean(durations)
-        if len(durations) > 1:
-            stdev = statistics.stdev(
-                duration.total_seconds for duration in durations)
-            stdev = TestDuration(stdev)
-        else:
-            stdev = '-'
+    def _request_report(self, signum, frame):
+        # Printing is left to the next result rather than done in the
+        # middle of whatever the interrupted code was writing.
+        self._report_requested = True
 
-        percentile_99_index = int(tests_count * 0.01)
-        percentile_95_index = int(tests_count * 0.05)
-        percentile_90_index = int(tests_count * 0.10)
-        percentile_80_index = int(tests_count * 0.20)
+    def print_live_report(self):
+        """Print the running percentiles and a histogram of the test
+        durations so far.
 
+        """
+        histogram = self._histogram
+        stream = self.stream
+        stream.writeln()
+        percentiles = '  '.join(
+            'p{0} {1}'.format(
+                percentile,
+                str(TestDuration(
+                    histogram.quantile(percentile / 100.0))).strip())
+            for percentile in LIVE_PERCENTILES)
+        stream.writeln('Test timing after {0} tests: {1}'.format(
+            histogram.count, percentiles))
+        bars = histogram.bars()
+        label_length = max(len(label) for label, _ in bars)
+        for label, count in bars:
+            width = int(round(_HISTOGRAM_WIDTH * count / histogram.count))
+            line = '  {0: >{1}} {2: >7} {3}'.format(
+                label, label_length, count, '#' * width)
+            stream.writeln(line.rstrip())
+        stream.flush()
+
+    def print_summary(self):
         stream = self.stream
         stream.writeln('\n\nTest timing report')
         stream.writeln(self.separator2)
 
         template = '  {0} {1}'
 
-        for test_result in tests_by_time[:self.number_to_summarize]:
-            description = get_test_description(
-                test_result.test, descriptions=self.descriptions)
-            line = template.format(str(test_result.duration), description)
+        for seconds, _, description in sorted(self._slowest, reverse=True):
+            line = template.format(str(TestDuration(seconds)), description)
             stream.writeln(line)
 
         stream.writeln()
 
+        if self._count == 0:
+            return
+        mean = TestDuration(self._mean)
+        if self._count > 1:
+            stdev = TestDuration(math.sqrt(self._m2 / (self._count - 1)))
+        else:
+            stdev = '-'
+        median, percentiles = _duration_percentiles(self._durations)
+
         pairs = [
             ['Mean', str(mean).strip()],
             ['Std Dev', str(stdev).strip()],
-            ['Median', str(median).strip()],
-            ['80%', str(tests_by_time[percentile_80_index].duration).strip()],
-            ['90%', str(tests_by_time[percentile_90_index].duration).strip()],
-            ['95%', str(tests_by_time[percentile_95_index].duration).strip()],
-            ['99%', str(tests_by_time[percentile_99_index].duration).strip()],
+            ['Median', str(TestDuration(median)).strip()],
         ]
+        for percentile, seconds in zip(TIMING_PERCENTILES, percentiles):
+            duration = str(TestDuration(seconds)).strip()
+            pairs.append(['{0}%'.format(percentile), duration])
+        if self._resource_count > 0:
+            cpu_time = TestDuration(self._cpu_time / self._resource_count)
+            pairs.append(['Mean CPU', str(cpu_time).strip()])
+        if self._max_rss_delta is not None:
+            pairs.append(['Max RSS +', format_bytes(self._max_rss_delta)])
+        if self._tracemalloc_peak is not None:
+            pairs.append(['Max Alloc', format_bytes(self._tracemalloc_peak)])
         stat_table = _format_stat_table(pairs)
         stream.writeln(stat_table)
 
+    def _record_resources(self, resources):
+        self._resource_count += 1
+        self._cpu_time += resources.cpu_time
+        if resources.max_rss_delta is not None:
+            self._max_rss_delta = max(
+                self._max_rss_delta or 0, resources.max_rss_delta)
+        if resources.tracemalloc_peak is not None:
+            self._tracemalloc_peak = max(
+                self._tracemalloc_peak or 0, resources.tracemalloc_peak)
+
     def __call__(self, result):
-        self._test_results.append(result)
+        seconds = result.duration.total_seconds
+        self._count += 1
+        count = self._count
+        delta = seconds - self._mean
+        self._mean += delta / count
+        self._m2 += delta * (seconds - self._mean)
+
+        slowest = self._slowest
+        full = len(slowest) >= self.number_to_summarize
+        if not full or (seconds, -count) > slowest[0][:2]:
+            description = get_test_description(
+                result.test, descriptions=self.descriptions)
+            if result.resources is not None:
+                description = '{0} [{1}]'.format(
+                    description, result.resources.format())
+            entry = (seconds, -count, description)
+            if full:
+                heapq.heapreplace(slowest, entry)
+            else:
+                heapq.heappush(slowest, entry)
+
+        durations = self._durations
+        if not self.streaming or len(durations) < TIMING_SAMPLE_SIZE:
+            durations.append(seconds)
+        else:
+            index = self._random.randrange(count)
+            if index < TIMING_SAMPLE_SIZE:
+                durations[index] = seconds
+
+        self._histogram.add(seconds)
+        resources = result.resources
+        if resources is not None:
+            self._record_resources(resources)
+        if self._report_requested or (
+                self._next_report is not None and
+                _monotonic() >= self._next_report):
+            self._report_requested = False
+            if self._next_report is not None:
+                self._next_report = _monotonic() + self.report_interval
+            self.print_live_report()
 
 
 def _format_stat_table(pairs):
@@ -1,9 +1,13 @@
+from array import array
 from datetime import datetime, timedelta
+import os
+import signal
 import statistics
 
 from mock import patch
 from six.moves import StringIO
 
+from haas.resource_usage import TestResources
 from haas.result import TestResult, TestCompletionStatus, TestDuration
 from haas.testing import unittest
 from haas.tests import _test_cases
@@ -12,7 +16,10 @@ from ..result_handler import (
     QuietTestResultHandler,
     TimingResultHandler,
     VerboseTestResultHandler,
+    _WritelnDecorator,
     sort_result_handlers,
+    _DurationHistogram,
+    _duration_percentiles,
     _format_stat_table,
 )
 
@@ -346,6 +353,222 @@ class TestTimingResultHandler(ExcInfoFixture, unittest.TestCase):
         self.assertIn(expected_stats, output)
 
 
+class TestStreamingTimingResultHandler(unittest.TestCase):
+
+    def _results(self, count):
+        start_time = datetime(2015, 12, 23, 8, 14, 12)
+        results = []
+        for index in range(count):
+            class Case(_test_cases.TestCase):
+                pass
+            duration = timedelta(milliseconds=(index * 37) % 1000)
+            results.append(TestResult.from_test_case(
+                Case('test_method'), TestCompletionStatus.success,
+                TestDuration(start_time, start_time + duration)))
+        return results
+
+    def _output(self, handler, results):
+        with patch('sys.stderr', new_callable=StringIO) as stderr:
+            handler.stream = _WritelnDecorator(stderr)
+            for result in results:
+                handler(result)
+            handler.stop_test_run()
+        return stderr.getvalue()
+
+    def test_same_report_as_buffered_handler(self):
+        # Given
+        results = self._results(50)
+
+        # When
+        output = self._output(
+            TimingResultHandler(number_to_summarize=5), results)
+        streaming_output = self._output(
+            TimingResultHandler(number_to_summarize=5, streaming=True),
+            results)
+
+        # Then
+        self.assertEqual(streaming_output, output)
+
+    def test_bounded_aggregates(self):
+        # Given
+        handler = TimingResultHandler(number_to_summarize=3, streaming=True)
+
+        # When
+        with patch('haas.plugins.result_handler.TIMING_SAMPLE_SIZE', 10):
+            output = self._output(handler, self._results(100))
+
+        # Then
+        self.assertEqual(len(handler._slowest), 3)
+        self.assertEqual(len(handler._durations), 10)
+        self.assertIn('  00:00.999 test_method (', output)
+        self.assertIn('  00:00.997 test_method (', output)
+
+
+class TestTimingResultHandlerResources(unittest.TestCase):
+
+    def test_report_resources(self):
+        # Given
+        start_time = datetime(2015, 12, 23, 8, 14, 12)
+        handler = TimingResultHandler(number_to_summarize=5)
+        stream = StringIO()
+        handler.stream = _WritelnDecorator(stream)
+        resources = [
+            TestResources(1.25, 0.5, 4096, None),
+            TestResources(0.25, 0.0, 0, 2048),
+            None,
+        ]
+        for index, test_resources in enumerate(resources):
+            duration = timedelta(seconds=index + 1)
+            handler(TestResult(
+                _test_cases.TestCase, 'test_method',
+                TestCompletionStatus.success,
+                TestDuration(start_time, start_time + duration),
+                resources=test_resources))
+
+        # When
+        handler.stop_test_run()
+
+        # Then
+        output = stream.getvalue()
+        self.assertIn(
+            'test_method (haas.tests._test_cases.TestCase.test_method) '
+            '[cpu 1.250s user 0.500s sys, rss +4.0 KiB]\n', output)
+        self.assertIn(
+            '  00:03.000 test_method '
+            '(haas.tests._test_cases.TestCase.test_method)\n', output)
+        self.assertIn('| Mean CPU  | Max RSS + | Max Alloc', output)
+        self.assertIn('| 00:01.000 |   4.0 KiB |   2.0 KiB', output)
+
+
+class TestLiveTimingReport(unittest.TestCase):
+
+    def _result(self, milliseconds):
+        start_time = datetime(2015, 12, 23, 8, 14, 12)
+        duration = timedelta(milliseconds=milliseconds)
+        return TestResult.from_test_case(
+            _test_cases.TestCase('test_method'), TestCompletionStatus.success,
+            TestDuration(start_time, start_time + duration))
+
+    def test_histogram_quantiles(self):
+        # Given
+        histogram = _DurationHistogram()
+        durations = [index / 1000.0 for index in range(1, 1001)]
+
+        # When
+        for seconds in durations:
+            histogram.add(seconds)
+
+        # Then
+        self.assertEqual(histogram.count, 1000)
+        for fraction in (0.5, 0.9, 0.99):
+            expected = durations[int(fraction * 999)]
+            self.assertAlmostEqual(
+                histogram.quantile(fraction), expected,
+                delta=expected * 0.01)
+        self.assertEqual(
+            histogram.bars(),
+            [('< 1ms', 0), ('1ms-10ms', 9), ('10ms-100ms', 90),
+             ('100ms-1s', 900), ('1s-10s', 1), ('>= 10s', 0)])
+
+    def test_histogram_constant_size(self):
+        # Given
+        histogram = _DurationHistogram()
+        size = len(histogram._counts)
+
+        # When
+        for seconds in (0, 1e-9, 0.5, 1e9):
+            histogram.add(seconds)
+
+        # Then
+        self.assertEqual(len(histogram._counts), size)
+        self.assertEqual(histogram.count, 4)
+        self.assertEqual(
+            histogram.quantile(0), _DurationHistogram.MIN_DURATION)
+
+    @patch('haas.plugins.result_handler._monotonic')
+    def test_periodic_report(self, monotonic):
+        # Given
+        monotonic.return_value = 100.0
+        handler = TimingResultHandler(
+            number_to_summarize=5, report_interval=10.0)
+        stream = StringIO()
+        handler.stream = _WritelnDecorator(stream)
+        handler.start_test_run()
+
+        # When
+        handler(self._result(5))
+        monotonic.return_value = 110.0
+        handler(self._result(500))
+
+        # Then
+        output = stream.getvalue()
+        self.assertEqual(output.count('Test timing after'), 1)
+        self.assertIn('Test timing after 2 tests: p50 ', output)
+        self.assertIn(
+            '    1ms-10ms       1 ' + '#' * 20 + '\n', output)
+        self.assertIn(
+            '    100ms-1s       1 ' + '#' * 20 + '\n', output)
+
+        # When
+        monotonic.return_value = 115.0
+        handler(self._result(5))
+
+        # Then
+        self.assertEqual(stream.getvalue(), output)
+        handler.stop_test_run()
+
+    @unittest.skipUnless(hasattr(signal, 'SIGUSR1'), 'Requires SIGUSR1')
+    def test_report_on_signal(self):
+        # Given
+        previous = signal.getsignal(signal.SIGUSR1)
+        handler = TimingResultHandler(number_to_summarize=5)
+        stream = StringIO()
+        handler.stream = _WritelnDecorator(stream)
+        handler.start_test_run()
+        handler(self._result(5))
+
+        # When
+        os.kill(os.getpid(), signal.SIGUSR1)
+        handler(self._result(5))
+
+        # Then
+        self.assertIn('Test timing after 2 tests: p50 ', stream.getvalue())
+
+        # When
+        handler.stop_test_run()
+
+        # Then
+        self.assertEqual(signal.getsignal(signal.SIGUSR1), previous)
+
+
+class TestDurationPercentiles(unittest.TestCase):
+
+    def _check_percentiles(self, durations):
+        # Given
+        ordered = sorted(durations, reverse=True)
+        expected = (
+            statistics.median(durations),
+            [ordered[int(len(ordered) * fraction)]
+             for fraction in (0.20, 0.10, 0.05, 0.01)],
+        )
+
+        # When
+        result = _duration_percentiles(array('d', durations))
+
+        # Then
+        self.assertEqual(result, expected)
+
+    def test_percentiles(self):
+        for count in (1, 2, 7, 100, 1001):
+            durations = [((index * 7919) % 1009) / 1000.0
+                         for index in range(count)]
+            self._check_percentiles(durations)
+
+    def test_percentiles_without_numpy(self):
+        with patch('haas.plugins.result_handler.numpy', None):
+            self.test_percentiles()
+
+
 class TestSortResultHandlers(unittest.TestCase):
 
     def test_sort_result_handlers(self):
@@ -0,0 +1,183 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2013-2014 Simon Jagoe
+# All rights reserved.
+#
+# This software may be modified and distributed under the terms
+# of the 3-clause BSD license.  See the LICENSE.txt file for details.
+from __future__ import absolute_import, unicode_literals
+
+import logging
+import sys
+import sysconfig
+import threading
+
+from six.moves import queue
+
+from haas.markers import is_thread_safe
+from haas.result import CAPTURE_SYS, ResultCollector, thread_local_output
+from haas.suite import find_test_cases
+from .runner import BaseTestRunner
+from .worker_pool import ChildResultHandler, default_process_count
+
+logger = logging.getLogger(__name__)
+
+
+def _default_thread_count():
+    return min(32, default_process_count() + 4)
+
+
+def _gil_disabled():
+    """Return ``True`` if the GIL is disabled in this interpreter.
+
+    """
+    is_gil_enabled = getattr(sys, '_is_gil_enabled', None)
+    return is_gil_enabled is not None and not is_gil_enabled()
+
+
+def _run_test_in_thread(test_case, capture_limit=None,
+                        resource_monitor=None, capture=CAPTURE_SYS):
+    # BaseTestRunner.run is not used here as it changes the global
+    # warnings filters.
+    result_handler = ChildResultHandler()
+    result_collector = ResultCollector(
+        buffer=True, capture=capture, capture_limit=capture_limit,
+        resource_monitor=resource_monitor)
+    result_collector.add_result_handler(result_handler)
+    result_collector.startTestRun()
+    try:
+        test_case(result_collector)
+    finally:
+        result_collector.stopTestRun()
+    return result_handler.results
+
+
+class ThreadedTestRunner(BaseTestRunner):
+    """Test runner that executes tests in a pool of threads.
+
+    Only tests of classes marked with :func:`haas.markers.thread_safe`
+    are run concurrently; all other tests are run one at a time once the
+    thread-safe tests have completed.  The output of each test is
+    captured separately (see :func:`haas.result.thread_local_output`).
+
+    Tests waiting on I/O run concurrently in any build of Python.  On
+    free-threaded builds of CPython, CPU-bound tests also run in
+    parallel across cores.
+
+    """
+
+    def __init__(self, thread_count=None, warnings=None):
+        super(ThreadedTestRunner, self).__init__(warnings=warnings)
+        self.thread_count = thread_count
+
+    @classmethod
+    def from_args(cls, args, arg_prefix):
+        """Create a :class:`~.ThreadedTestRunner` from command-line
+        arguments.
+
+        """
+        return cls(thread_count=args.threads)
+
+    @classmethod
+    def add_parser_arguments(self, parser, option_prefix, dest_prefix):
+        thread_count_help = (
+            'Number of threads to use if running tests in threads.  '
+            'Defaults to the number of processor cores plus four, up to '
+            '32.')
+        parser.add_argument(
+            '--threads', help=thread_count_help, type=int, default=None)
+
+    def _handle_result(self, result, collected_result):
+        for test_result in collected_result:
+            test = test_result.test
+            result.startTest(test, test_result.duration.start_time)
+            result.add_result(test_result)
+            result.stopTest(test)
+
+    def _runs_concurrently(self, test_case):
+        """Return ``True`` if ``test_case`` may run at the same time as
+        other tests.
+
+        """
+        return is_thread_safe(test_case)
+
+    def _run_concurrent_test(self, result, test_case):
+        """Run ``test_case`` in the current thread, returning its results.
+
+        """
+        return _run_test_in_thread(
+            test_case, capture_limit=result.capture_limit,
+            resource_monitor=result.resource_monitor, capture=result.capture)
+
+    def _run_thread(self, result, test_cases, collected_results):
+        try:
+            while not result.shouldStop:
+                try:
+                    test_case = test_cases.get_nowait()
+                except queue.Empty:
+                    break
+                collected_results.put(
+                    self._run_concurrent_test(result, test_case))
+        finally:
+            collected_results.put(None)
+
+    def _run_concurrently(self, result, test_cases):
+        thread_count = min(
+            self.thread_count or _default_thread_count(), len(test_cases))
+        if thread_count == 0:
+            return
+        pending = queue.Queue()
+        for test_case in test_cases:
+            pending.put(test_case)
+        collected_results = queue.Queue()
+        threads = [
+            threading.Thread(
+                target=self._run_thread,
+                args=(result, pending, collected_results),
+                name='haas-test-{0}'.format(index),
+            )
+            for index in range(thread_count)
+        ]
+        for thread in threads:
+            thread.daemon = True
+            thread.start()
+        running = len(threads)
+        while running > 0:
+            collected_result = collected_results.get()
+            if collected_result is None:
+                running -= 1
+            else:
+                self._handle_result(result, collected_result)
+        for thread in threads:
+            thread.join()
+
+    def _run_tests(self, result, test):
+        concurrent_tests = []
+        other_tests = []
+        for test_case in find_test_cases(test):
+            if self._runs_concurrently(test_case):
+                concurrent_tests.append(test_case)
+            else:
+                other_tests.append(test_case)
+
+        if concurrent_tests and not _gil_disabled() and \
+                sysconfig.get_config_var('Py_GIL_DISABLED'):
+            logger.warning('The GIL has been enabled; CPU-bound tests will '
+                           'not run in parallel')
+
+        with thread_local_output():
+            self._run_concurrently(result, concurrent_tests)
+            for test_case in other_tests:
+                if result.shouldStop:
+                    break
+                self._handle_result(result, _run_test_in_thread(
+                    test_case, capture_limit=result.capture_limit,
+                    resource_monitor=result.resource_monitor,
+                    capture=result.capture))
+
+    def run(self, result_collector, test_to_run):
+        """Run the tests in threads.
+
+        """
+        def test(result):
+            self._run_tests(result_collector, test_to_run)
+        return super(ThreadedTestRunner, self).run(result_collector, test)
@@ -0,0 +1,110 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2013-2014 Simon Jagoe
+# All rights reserved.
+#
+# This software may be modified and distributed under the terms
+# of the 3-clause BSD license.  See the LICENSE.txt file for details.
+from __future__ import absolute_import, unicode_literals
+
+import sys
+
+from haas.result import separator2
+from haas.timing_history import (
+    BASELINE_RUNS, DEFAULT_TIMING_HISTORY, TimingHistory, format_seconds,
+    git_revision)
+from .i_result_handler_plugin import IResultHandlerPlugin
+from .result_handler import _WritelnDecorator
+
+
+class TimingHistoryResultHandler(IResultHandlerPlugin):
+    """Records the status, duration and, if they were measured, the
+    resources used by each test in a
+    :class:`~haas.timing_history.TimingHistory` database, tagged with
+    the git revision of the code under test.
+
+    If ``report_regressions`` is set, the tests whose duration regressed
+    against their durations in the previous
+    :data:`~haas.timing_history.BASELINE_RUNS` runs are printed at the
+    end of the test run.
+
+    """
+
+    separator2 = separator2
+
+    def __init__(self, path=DEFAULT_TIMING_HISTORY, revision=None,
+                 report_regressions=False):
+        self.enabled = True
+        self.stream = _WritelnDecorator(sys.stderr)
+        self.path = path
+        self.revision = revision
+        self.report_regressions = report_regressions
+        self.history = None
+
+    @classmethod
+    def from_args(cls, args, name, dest_prefix, test_count):
+        if args.timing_history is None:
+            return None
+        revision = args.timing_history_revision
+        if revision is None:
+            revision = git_revision()
+        return cls(args.timing_history, revision=revision,
+                   report_regressions=args.timing_regressions)
+
+    @classmethod
+    def add_parser_arguments(cls, parser, name, option_prefix, dest_prefix):
+        parser.add_argument(
+            '--timing-history', action='store', nargs='?', default=None,
+            const=DEFAULT_TIMING_HISTORY, metavar='DATABASE',
+            help=('Record the duration of each test in a SQLite database '
+                  '(default {0!r}), which can be queried with '
+                  '--show-history'.format(DEFAULT_TIMING_HISTORY)))
+        parser.add_argument(
+            '--timing-history-revision', action='store', default=None,
+            metavar='REVISION',
+            help=('The revision recorded with the test durations.  '
+                  'Defaults to the git revision of the current directory'))
+        parser.add_argument(
+            '--timing-regressions', action='store_true', default=False,
+            help=('With --timing-history, report the tests whose duration '
+                  'regressed against the previous {0} runs'.format(
+                      BASELINE_RUNS)))
+
+    def start_test(self, test):
+        pass
+
+    def stop_test(self, test):
+        pass
+
+    def start_test_run(self):
+        self.history = TimingHistory(self.path)
+        self.history.start_run(self.revision)
+
+    def stop_test_run(self):
+        history = self.history
+        try:
+            history.finish_run()
+            if self.report_regressions:
+                self.print_regressions()
+        finally:
+            history.close()
+            self.history = None
+
+    def print_regressions(self):
+        regressions = self.history.regressions()
+        if len(regressions) == 0:
+            return
+        stream = self.stream
+        stream.writeln('\n\nTiming regressions against the last {0} '
+                       'runs'.format(BASELINE_RUNS))
+        stream.writeln(self.separator2)
+        for regression in regressions:
+            stream.writeln('  {0} (mean {1}, std dev {2}) {3}'.format(
+                format_seconds(regression.duration),
+                format_seconds(regression.mean),
+                format_seconds(regression.stdev),
+                regression.test_id))
+
+    def __call__(self, result):
+        self.history.record(
+            result.test.id(), result.status.name,
+            result.duration.total_seconds, result.resources)
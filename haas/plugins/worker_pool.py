@@ -0,0 +1,1047 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2013-2014 Simon Jagoe
+# All rights reserved.
+#
+# This software may be modified and distributed under the terms
+# of the 3-clause BSD license.  See the LICENSE.txt file for details.
+from __future__ import absolute_import, unicode_literals
+
+from collections import deque
+from datetime import datetime
+import logging
+import math
+import multiprocessing
+import os
+import pickle
+import signal
+import sys
+import tempfile
+import threading
+import time
+import traceback
+
+from haas.markers import get_cpu_slots, get_resources
+from haas.result import (
+    CAPTURE_SYS, ResultCollector, TestCompletionStatus, TestDuration,
+    TestResult)
+from haas.result_codec import DEFAULT_RESULT_CODEC, RESULT_CODECS
+from haas.result_ring import (
+    RESULT_RECORD, START_RECORD, ResultRing, decode_start, encode_start,
+    shared_memory)
+from .i_result_handler_plugin import IResultHandlerPlugin
+from .runner import BaseTestRunner
+
+try:
+    import faulthandler
+except ImportError:  # pragma: no cover
+    faulthandler = None
+
+try:
+    import resource
+except ImportError:  # pragma: no cover
+    resource = None
+
+try:
+    from multiprocessing.connection import wait as _wait_for_connections
+except ImportError:  # pragma: no cover
+    def _wait_for_connections(connections, timeout):
+        deadline = _monotonic() + timeout
+        while True:
+            ready = [conn for conn in connections if conn.poll()]
+            if ready or _monotonic() >= deadline:
+                return ready
+            time.sleep(0.01)
+
+if hasattr(time, 'monotonic'):
+    _monotonic = time.monotonic
+else:  # pragma: no cover
+    _monotonic = time.time
+
+logger = logging.getLogger(__name__)
+
+#: Give up starting workers after this many fail in a row before they
+#: are ready to run tests.
+MAX_START_FAILURES = 3
+
+#: Send test results from the workers over their pipes.
+PIPE_TRANSPORT = 'pipe'
+
+#: Send test results from the workers through a
+#: :class:`~haas.result_ring.ResultRing` in shared memory.
+SHARED_MEMORY_TRANSPORT = 'shared-memory'
+
+RESULT_TRANSPORTS = (PIPE_TRANSPORT, SHARED_MEMORY_TRANSPORT)
+
+#: With the shared memory transport, the rings of the workers are read
+#: at least this often, in seconds.
+RING_POLL_INTERVAL = 0.01
+
+#: The reasons for which a worker retires after finishing a task.
+RETIRE_MAX_TASKS = 'max-tasks'
+RETIRE_MAX_RSS = 'max-rss'
+
+#: A task whose worker is lost before it starts any of the task's
+#: tests is attempted this many times before its tests are recorded as
+#: errors.
+MAX_TASK_ATTEMPTS = 2
+
+# The first byte of each frame sent by a worker marks its type: an
+# encoded test result or a pickled ``(kind, task_id, payload)`` message.
+_RESULT_FRAME = b'R'
+_MESSAGE_FRAME = b'M'
+
+# The requirements of a task whose tests declare no resources or CPU
+# slots.
+_NO_REQUIREMENTS = (frozenset(), 1)
+
+
+class ChildResultHandler(IResultHandlerPlugin):
+    """A result handler that simply collects :class`TestResults
+    <haas.result.TestResult>` for returning to the parent process.
+
+    If a ``result_queue`` is given, each result is sent to the parent
+    process on the queue as soon as it is received instead of being
+    collected.
+
+    """
+
+    def __init__(self, result_queue=None, task_id=None):
+        self.start_time = None
+        self.stop_time = None
+        self.results = []
+        self.result_queue = result_queue
+        self.task_id = task_id
+
+    # To keep the interface happy
+    @classmethod
+    def from_args(cls, args, arg_prefix, test_count):  # pragma: no cover
+        pass
+
+    # To keep the interface happy
+    @classmethod
+    def add_parser_arguments(self, parser, name, option_prefix, dest_prefix):  # pragma: no cover  # noqa
+        pass
+
+    def start_test(self, test):
+        pass
+
+    def stop_test(self, test):
+        pass
+
+    def start_test_run(self):
+        self.start_time = time.time()
+
+    def stop_test_run(self):
+        self.stop_time = time.time()
+
+    def __call__(self, result):
+        if self.result_queue is None:
+            self.results.append(result)
+        else:
+            self.result_queue.put(('result', self.task_id, result))
+
+
+class _MessageSender(object):
+    """Send messages from a worker to the parent process.
+
+    Messages are ``(kind, task_id, payload)`` tuples.  Test results are
+    encoded with ``codec`` rather than pickled, identified by the index
+    of the running test in its task (``test_index``).  Sending is
+    serialized as both the worker's main thread and its heartbeat
+    thread send messages on the same connection.
+
+    If a :class:`~haas.result_ring.ResultRing` is given, test results
+    and the start of each test are written to it instead of the
+    connection.  Only the main thread writes to the ring.
+
+    """
+
+    def __init__(self, connection, codec, ring=None):
+        self._connection = connection
+        self._codec = codec
+        self._ring = ring
+        self._lock = threading.Lock()
+        self.test_index = None
+
+    def put(self, message):
+        kind, task_id, payload = message
+        if self._ring is not None:
+            if kind == 'result':
+                self._ring.write(RESULT_RECORD, self._codec.encode(
+                    self.test_index, payload))
+                return
+            elif kind == 'start':
+                self._ring.write(START_RECORD, encode_start(*payload))
+                return
+        if kind == 'result':
+            frame = _RESULT_FRAME + self._codec.encode(
+                self.test_index, payload)
+        else:
+            frame = _MESSAGE_FRAME + pickle.dumps(
+                message, pickle.HIGHEST_PROTOCOL)
+        with self._lock:
+            self._connection.send_bytes(frame)
+
+
+class _Heartbeat(threading.Thread):
+
+    def __init__(self, sender, interval):
+        super(_Heartbeat, self).__init__(name='haas-heartbeat')
+        self.daemon = True
+        self._sender = sender
+        self._interval = interval
+        self._stopped = threading.Event()
+
+    def run(self):
+        while not self._stopped.wait(self._interval):
+            try:
+                self._sender.put(('heartbeat', None, None))
+            except (EOFError, IOError, OSError):
+                return
+
+    def stop(self):
+        self._stopped.set()
+
+
+def _run_task(sender, task_id, test_cases, capture_limit=None,
+              resource_monitor=None, capture=CAPTURE_SYS):
+    result_handler = ChildResultHandler(sender, task_id)
+    result_collector = ResultCollector(
+        buffer=True, capture=capture, capture_limit=capture_limit,
+        resource_monitor=resource_monitor)
+    result_collector.add_result_handler(result_handler)
+    runner = BaseTestRunner()
+
+    def run_tests(result):
+        for index, test_case in enumerate(test_cases):
+            sender.test_index = index
+            sender.put(('start', task_id, (index, datetime.utcnow())))
+            test_case(result)
+    runner.run(result_collector, run_tests)
+
+
+def _current_rss():
+    """Return the resident set size of this process in bytes, or ``None``
+    if it cannot be measured.
+
+    Where ``/proc`` is not available, the peak resident set size is
+    returned instead.
+
+    """
+    try:
+        with open('/proc/self/statm') as fh:
+            pages = int(fh.read().split()[1])
+        return pages * os.sysconf('SC_PAGE_SIZE')
+    except (IOError, OSError, ValueError, IndexError):
+        pass
+    if resource is None:  # pragma: no cover
+        return None
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == 'darwin':  # pragma: no cover
+        return max_rss
+    return max_rss * 1024  # pragma: no cover
+
+
+def _worker_main(connection, initializer, maxtasks, heartbeat_interval,
+                 dump_path, result_codec, cpu=None, max_rss=None,
+                 ring_name=None, capture_limit=None, resource_monitor=None,
+                 capture=CAPTURE_SYS):
+    """The main loop of a worker process.
+
+    The worker runs ``(task_id, test_cases)`` tasks received on
+    ``connection`` until it receives ``None``, has run ``maxtasks``
+    tasks or its resident set size exceeds ``max_rss`` bytes after a
+    task.  If ``cpu`` is given, the worker is pinned to that CPU.  If
+    ``ring_name`` is given, results are written to the
+    :class:`~haas.result_ring.ResultRing` of that name.  The output of
+    each test is captured as selected by ``capture`` and limited to
+    ``capture_limit`` characters, and the resources used by each test
+    are measured by the ``resource_monitor``, if given.
+
+    """
+    if cpu is not None:
+        os.sched_setaffinity(0, [cpu])
+    ring = None if ring_name is None else ResultRing.attach(ring_name)
+    sender = _MessageSender(connection, RESULT_CODECS[result_codec](), ring)
+    if dump_path is not None:
+        dump_file = open(dump_path, 'w')
+        faulthandler.register(signal.SIGUSR1, file=dump_file,
+                              all_threads=True)
+    if initializer is not None:
+        try:
+            initializer()
+        except Exception:
+            sender.put(('failed', None, traceback.format_exc()))
+            return
+    heartbeat = _Heartbeat(sender, heartbeat_interval)
+    heartbeat.start()
+    sender.put(('ready', None, os.getpid()))
+    tasks_run = 0
+    while True:
+        try:
+            task = connection.recv()
+        except EOFError:
+            break
+        if task is None:
+            break
+        task_id, test_cases = task
+        _run_task(sender, task_id, test_cases, capture_limit,
+                  resource_monitor, capture)
+        tasks_run += 1
+        rss = _current_rss()
+        if max_rss is not None and rss is not None and rss > max_rss:
+            retire = RETIRE_MAX_RSS
+        elif maxtasks is not None and tasks_run >= maxtasks:
+            retire = RETIRE_MAX_TASKS
+        else:
+            retire = None
+        sender.put(('done', task_id, (retire, rss)))
+        if retire is not None:
+            break
+    heartbeat.stop()
+
+
+def available_cpus():
+    """Return the ids of the CPUs that this process may run on.
+
+    """
+    if hasattr(os, 'sched_getaffinity'):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(multiprocessing.cpu_count()))  # pragma: no cover
+
+
+def _cgroup_cpu_limit(cgroup_root='/sys/fs/cgroup',
+                      proc_cgroup='/proc/self/cgroup'):
+    """Return the number of CPUs that the cgroup v2 quota (``cpu.max``)
+    of this process and its ancestors allows it to use, or ``None`` if
+    there is no quota.
+
+    """
+    try:
+        with open(proc_cgroup) as fh:
+            lines = fh.read().splitlines()
+    except (IOError, OSError):
+        return None
+    for line in lines:
+        hierarchy, _, path = line.split(':', 2)
+        if hierarchy == '0':
+            break
+    else:
+        return None
+    limit = None
+    path = path.strip('/')
+    while True:
+        try:
+            with open(os.path.join(cgroup_root, path, 'cpu.max')) as fh:
+                quota, period = fh.read().split()
+            if quota != 'max':
+                cpus = float(quota) / float(period)
+                limit = cpus if limit is None else min(limit, cpus)
+        except (IOError, OSError, ValueError):
+            pass
+        if not path:
+            return limit
+        path = os.path.dirname(path)
+
+
+def default_process_count():
+    """Return the number of CPUs available to this process, taking into
+    account its CPU affinity and cgroup CPU quota.
+
+    """
+    count = len(available_cpus())
+    limit = _cgroup_cpu_limit()
+    if limit is not None:
+        count = min(count, int(math.ceil(limit)))
+    return max(1, count)
+
+
+def _task_requirements(test_cases):
+    """Return the resources and the number of CPU slots needed by a task
+    running ``test_cases``.
+
+    """
+    resources = frozenset()
+    slots = 1
+    for test_case in test_cases:
+        resources |= get_resources(test_case)
+        slots = max(slots, get_cpu_slots(test_case))
+    return resources, slots
+
+
+def _describe_exit(exitcode):
+    if exitcode is None:
+        return 'stopped responding'
+    if exitcode >= 0:
+        return 'exited with code {0}'.format(exitcode)
+    signum = -exitcode
+    try:
+        name = signal.Signals(signum).name
+    except (AttributeError, ValueError):  # pragma: no cover
+        name = signum
+    description = 'was killed by signal {0}'.format(name)
+    if signum == getattr(signal, 'SIGKILL', None):
+        description += ' (possibly by the out-of-memory killer)'
+    return description
+
+
+class WorkerMemoryUsage(object):
+    """The memory used by a worker process, as reported by the worker
+    after each task.
+
+    """
+
+    def __init__(self, worker_id, pid):
+        self.worker_id = worker_id
+        self.pid = pid
+        #: The largest resident set size reported, in bytes.
+        self.peak_rss = None
+        self.tasks_run = 0
+        #: Whether the worker was replaced for exceeding the RSS limit.
+        self.recycled = False
+
+    def record(self, rss, retire):
+        self.tasks_run += 1
+        if rss is not None and (self.peak_rss is None or
+                                rss > self.peak_rss):
+            self.peak_rss = rss
+        if retire == RETIRE_MAX_RSS:
+            self.recycled = True
+
+
+class _WorkerProcess(object):
+    """The parent's view of a single worker process.
+
+    """
+
+    def __init__(self, worker_id, process, connection, dump_path, cpu=None):
+        self.worker_id = worker_id
+        self.process = process
+        self.connection = connection
+        self.dump_path = dump_path
+        #: The CPU the worker is pinned to, if any.
+        self.cpu = cpu
+        #: The :class:`~haas.result_ring.ResultRing` that the worker
+        #: writes its results to, if any.
+        self.ring = None
+        self.pid = None
+        self.ready = False
+        self.retiring = False
+        self.last_message = _monotonic()
+        #: The ``(task_id, test_cases)`` task being run by the worker.
+        self.task = None
+        #: The index in the task of the test being run.
+        self.test_index = None
+        #: Whether a result has been received for the current test.
+        self.test_completed = False
+        self.test_start_time = None
+        self.test_started = None
+        #: The reason the worker failed to start, if it did.
+        self.start_failure = None
+
+    @property
+    def idle(self):
+        return self.ready and self.task is None and not self.retiring
+
+    @property
+    def current_test(self):
+        if self.task is None or self.test_index is None:
+            return None
+        return self.task[1][self.test_index]
+
+    @property
+    def remaining_tests(self):
+        """The tests in the worker's task that have not yet started.
+
+        """
+        if self.task is None:
+            return []
+        if self.test_index is None:
+            return list(self.task[1])
+        return list(self.task[1][self.test_index + 1:])
+
+    def assign(self, task):
+        self.task = task
+        self.test_index = None
+        self.test_completed = False
+        self.connection.send(task)
+
+
+class WorkerPool(object):
+    """A pool of worker processes that run batches of tests and stream
+    their results back to the parent.
+
+    Tests may declare resources and CPU slots with :mod:`haas.markers`.
+    A task is not started while another running task holds one of its
+    resources, or while the CPU slots of the running tasks would exceed
+    ``process_count``.
+
+    Unlike ``multiprocessing.Pool``, the pool knows which test each
+    worker is running.  A worker whose test runs for longer than its
+    timeout (or that stops sending heartbeats while it holds a task) is
+    killed, after its stack has been dumped with :mod:`faulthandler`
+    where possible.  The test is recorded as an error, a replacement
+    worker is started and the rest of the worker's task is scheduled
+    again.  Workers that crash (for example, with a segmentation fault
+    or when killed by the out-of-memory killer) are handled the same
+    way, and the error records how the worker exited.
+
+    Parameters
+    ----------
+    process_count : int
+        The number of worker processes.
+    initializer : callable
+        Called with zero arguments when each worker starts.
+    maxtasksperchild : int
+        The number of tasks a worker runs before it is replaced.
+    test_timeout : callable
+        Called with a test case; returns its timeout in seconds, or
+        ``None`` for no timeout.
+    heartbeat_interval : float
+        The interval in seconds between worker heartbeats.
+    result_codec : str
+        The name of the :class:`~haas.result_codec.ResultCodec` used to
+        send test results from the workers.
+    pin_workers : bool
+        Pin each worker to a CPU of its own (where the platform
+        supports it), sharing CPUs only when there are more workers
+        than CPUs.
+    max_rss : int
+        The resident set size in bytes above which a worker is replaced
+        once it finishes its task.
+    result_transport : str
+        How the workers send test results: over their pipe
+        (:data:`PIPE_TRANSPORT`) or through a ring buffer in shared
+        memory (:data:`SHARED_MEMORY_TRANSPORT`), which the pool reads
+        in batches.
+    capture_limit : int
+        The number of characters of the captured output of each stream
+        kept for a failing test (see
+        :class:`~haas.result.ResultCollector`).
+    resource_monitor : haas.resource_usage.ResourceMonitor
+        Measures the resources used by each test in the workers.
+    capture : str
+        How the workers capture the output of each test
+        (:data:`~haas.result.CAPTURE_SYS` or
+        :data:`~haas.result.CAPTURE_FD`).
+
+    """
+
+    def __init__(self, process_count, initializer=None,
+                 maxtasksperchild=None, test_timeout=None,
+                 heartbeat_interval=1.0, result_codec=DEFAULT_RESULT_CODEC,
+                 pin_workers=False, max_rss=None,
+                 result_transport=PIPE_TRANSPORT, capture_limit=None,
+                 resource_monitor=None, capture=CAPTURE_SYS):
+        if pin_workers and not hasattr(os, 'sched_setaffinity'):
+            logger.warning('Workers cannot be pinned to CPUs on this '
+                           'platform')
+            pin_workers = False
+        if result_transport == SHARED_MEMORY_TRANSPORT and \
+                shared_memory is None:
+            logger.warning('Shared memory is not available; sending '
+                           'results over pipes')
+            result_transport = PIPE_TRANSPORT
+        self.pin_workers = pin_workers
+        self.result_transport = result_transport
+        self.process_count = process_count
+        self.initializer = initializer
+        self.maxtasksperchild = maxtasksperchild
+        self.test_timeout = test_timeout
+        self.heartbeat_interval = heartbeat_interval
+        self.result_codec = result_codec
+        self.max_rss = max_rss
+        self.capture_limit = capture_limit
+        self.resource_monitor = resource_monitor
+        self.capture = capture
+        #: The :class:`~.WorkerMemoryUsage` of each worker that has
+        #: finished a task, by worker id.
+        self.memory_usage = {}
+        self._codec = RESULT_CODECS[result_codec]()
+        self._pending = deque()
+        self._workers = {}
+        self._task_attempts = {}
+        self._task_requirements = {}
+        self._start_failures = 0
+        self._next_task_id = 0
+        self._next_worker_id = 0
+
+    def _new_task(self, test_cases, attempts=0):
+        task_id = self._next_task_id
+        self._next_task_id += 1
+        if attempts > 0:
+            self._task_attempts[task_id] = attempts
+        requirements = _task_requirements(test_cases)
+        if requirements != _NO_REQUIREMENTS:
+            self._task_requirements[task_id] = requirements
+        return task_id, list(test_cases)
+
+    def submit(self, test_cases):
+        """Add a task running ``test_cases`` to the end of the queue.
+
+        """
+        self._pending.append(self._new_task(test_cases))
+
+    @property
+    def has_work(self):
+        """``True`` while there are tasks queued or running.
+
+        """
+        if self._pending:
+            return True
+        return any(worker.task is not None
+                   for worker in self._workers.values())
+
+    def _choose_cpu(self):
+        """Return the available CPU used by the fewest workers.
+
+        """
+        used = dict((cpu, 0) for cpu in available_cpus())
+        for worker in self._workers.values():
+            if worker.cpu in used:
+                used[worker.cpu] += 1
+        return min(used, key=lambda cpu: (used[cpu], cpu))
+
+    def _start_worker(self):
+        worker_id = self._next_worker_id
+        self._next_worker_id += 1
+        cpu = self._choose_cpu() if self.pin_workers else None
+        dump_path = None
+        if faulthandler is not None and hasattr(signal, 'SIGUSR1'):
+            fd, dump_path = tempfile.mkstemp(prefix='haas-worker-stack-')
+            os.close(fd)
+        if self.result_transport == SHARED_MEMORY_TRANSPORT:
+            ring = ResultRing.create()
+            ring_name = ring.name
+        else:
+            ring = ring_name = None
+        parent_connection, child_connection = multiprocessing.Pipe()
+        process = multiprocessing.Process(
+            target=_worker_main,
+            args=(child_connection, self.initializer,
+                  self.maxtasksperchild, self.heartbeat_interval,
+                  dump_path, self.result_codec, cpu, self.max_rss,
+                  ring_name, self.capture_limit, self.resource_monitor,
+                  self.capture),
+        )
+        process.daemon = True
+        process.start()
+        child_connection.close()
+        worker = _WorkerProcess(
+            worker_id, process, parent_connection, dump_path, cpu)
+        worker.ring = ring
+        self._workers[worker_id] = worker
+        return worker
+
+    def _maintain_workers(self):
+        """Start workers while there is queued work for them.
+
+        """
+        active = [worker for worker in self._workers.values()
+                  if not worker.retiring]
+        available = sum(1 for worker in active if worker.task is None)
+        needed = min(self.process_count - len(active),
+                     len(self._pending) - available)
+        for _ in range(needed):
+            self._start_worker()
+
+    def start(self):
+        """Start the worker processes.
+
+        """
+        self._maintain_workers()
+
+    def _assign(self, worker, task):
+        """Send ``task`` to ``worker``, returning error results for tests
+        that cannot be sent.
+
+        """
+        try:
+            worker.assign(task)
+        except (IOError, OSError):
+            # The worker has gone away; it is cleaned up when its exit
+            # is noticed.
+            worker.task = None
+            self._pending.appendleft(task)
+        except Exception as exc:
+            # The task could not be pickled
+            worker.task = None
+            task_id, test_cases = task
+            if len(test_cases) > 1:
+                for test_case in reversed(test_cases):
+                    self._pending.appendleft(self._new_task([test_case]))
+                return []
+            message = 'The test could not be sent to a worker process: ' \
+                '{0}: {1}'.format(type(exc).__name__, exc)
+            return [self._error_result(test_cases[0], None, message)]
+        return []
+
+    def _held_requirements(self):
+        """Return the resources held and the CPU slots used by the tasks
+        being run.
+
+        """
+        held = set()
+        used = 0
+        for worker in self._workers.values():
+            if worker.task is not None:
+                resources, slots = self._task_requirements.get(
+                    worker.task[0], _NO_REQUIREMENTS)
+                held.update(resources)
+                used += slots
+        return held, used
+
+    def _dispatch(self):
+        results = []
+        idle = [worker for worker in self._workers.values() if worker.idle]
+        if not idle or not self._pending:
+            return results
+        held, used = self._held_requirements()
+        blocked = []
+        while idle and self._pending:
+            task = self._pending.popleft()
+            resources, slots = self._task_requirements.get(
+                task[0], _NO_REQUIREMENTS)
+            if used > 0 and used + slots > self.process_count:
+                # Keep the slots that are free for this task rather than
+                # starting later tasks that could take them.
+                blocked.append(task)
+                break
+            if not resources.isdisjoint(held):
+                blocked.append(task)
+                continue
+            worker = idle.pop(0)
+            results.extend(self._assign(worker, task))
+            if worker.task is not None:
+                held.update(resources)
+                used += slots
+        self._pending.extendleft(reversed(blocked))
+        return results
+
+    def _remove_worker(self, worker):
+        del self._workers[worker.worker_id]
+        worker.connection.close()
+        worker.process.join(1)
+        if worker.dump_path is not None and os.path.exists(worker.dump_path):
+            os.remove(worker.dump_path)
+        if worker.ring is not None:
+            worker.ring.unlink()
+            worker.ring = None
+
+    def _dump_worker_stack(self, worker):
+        """Ask a worker to dump the stack of all of its threads with
+        :mod:`faulthandler` and return the dumped text.
+
+        """
+        if worker.dump_path is None:
+            return None
+        try:
+            os.kill(worker.process.pid, signal.SIGUSR1)
+        except OSError:
+            return None
+        deadline = _monotonic() + 1.0
+        size = -1
+        while _monotonic() < deadline:
+            time.sleep(0.05)
+            new_size = os.path.getsize(worker.dump_path)
+            if new_size > 0 and new_size == size:
+                break
+            size = new_size
+        with open(worker.dump_path) as fh:
+            return fh.read() or None
+
+    def _kill(self, worker):
+        kill_signal = getattr(signal, 'SIGKILL', None)
+        if kill_signal is None:  # pragma: no cover
+            worker.process.terminate()
+            return
+        try:
+            os.kill(worker.process.pid, kill_signal)
+        except OSError:
+            pass
+
+    def _error_result(self, test_case, start_time, message):
+        if start_time is None:
+            start_time = datetime.utcnow()
+        duration = TestDuration(start_time, datetime.utcnow())
+        return TestResult(
+            type(test_case), test_case._testMethodName,
+            TestCompletionStatus.error, duration, exception=message)
+
+    def _lose_worker(self, worker, message):
+        """Remove a worker that is no longer usable, reporting the test
+        it was running as an error and queueing the rest of its task.
+
+        """
+        results = []
+        test_case = worker.current_test
+        if test_case is not None and not worker.test_completed:
+            results.append(self._error_result(
+                test_case, worker.test_start_time, message))
+        remaining = worker.remaining_tests
+        if remaining:
+            task_id = worker.task[0]
+            if worker.test_index is None:
+                # The worker was lost before starting any test of the
+                # task, which may itself be the cause.
+                attempts = self._task_attempts.pop(task_id, 0) + 1
+            else:
+                attempts = 0
+            if attempts < MAX_TASK_ATTEMPTS:
+                self._pending.appendleft(self._new_task(remaining, attempts))
+            else:
+                results.extend(
+                    self._error_result(test_case, None, message)
+                    for test_case in remaining)
+        self._task_requirements.pop(worker.task[0], None)
+        worker.task = None
+        self._remove_worker(worker)
+        return results
+
+    def _kill_worker(self, worker, reason):
+        stack = self._dump_worker_stack(worker)
+        self._kill(worker)
+        # Results written to the ring before the worker was killed are
+        # not lost, and their tests are not reported as errors.
+        results = self._drain(worker)
+        message = '{0}; the worker process was killed.\n'.format(reason)
+        if stack is not None:
+            message = '{0}\nStack of the worker process:\n{1}'.format(
+                message, stack)
+        logger.warning('Killing worker %d: %s', worker.worker_id, reason)
+        results.extend(self._lose_worker(worker, message))
+        return results
+
+    def _drain(self, worker):
+        """Return the results written to the ring of ``worker``, handling
+        the starts of tests recorded with them.
+
+        """
+        if worker.ring is None:
+            return []
+        records = worker.ring.read()
+        if not records:
+            return []
+        worker.last_message = _monotonic()
+        results = []
+        for kind, payload in records:
+            if kind == RESULT_RECORD:
+                worker.test_completed = True
+                results.append(self._codec.decode(payload, worker.task[1]))
+            else:
+                self._handle_message(
+                    worker, ('start', None, decode_start(payload)))
+        return results
+
+    def _handle_frame(self, worker, frame):
+        # Records in the ring were written before the frame was sent.
+        results = self._drain(worker)
+        worker.last_message = _monotonic()
+        if frame[:1] == _RESULT_FRAME:
+            worker.test_completed = True
+            results.append(self._codec.decode(frame[1:], worker.task[1]))
+        else:
+            results.extend(
+                self._handle_message(worker, pickle.loads(frame[1:])))
+        return results
+
+    def _handle_message(self, worker, message):
+        kind, task_id, payload = message
+        if kind == 'start':
+            worker.test_index, worker.test_start_time = payload
+            worker.test_completed = False
+            worker.test_started = worker.last_message
+        elif kind == 'done':
+            retire, rss = payload
+            self._task_requirements.pop(task_id, None)
+            worker.task = None
+            worker.test_index = None
+            worker.retiring = retire is not None
+            usage = self.memory_usage.get(worker.worker_id)
+            if usage is None:
+                usage = self.memory_usage[worker.worker_id] = \
+                    WorkerMemoryUsage(worker.worker_id, worker.pid)
+            usage.record(rss, retire)
+            if retire == RETIRE_MAX_RSS:
+                logger.info('Replacing worker %d (pid %s): its RSS of %d '
+                            'bytes exceeds the limit', worker.worker_id,
+                            worker.pid, rss)
+        elif kind == 'ready':
+            worker.ready = True
+            worker.pid = payload
+            self._start_failures = 0
+        elif kind == 'failed':
+            worker.start_failure = payload
+        return []
+
+    def _receive(self, worker):
+        results = self._drain(worker)
+        try:
+            while worker.connection.poll():
+                results.extend(self._handle_frame(
+                    worker, worker.connection.recv_bytes()))
+        except (EOFError, IOError, OSError):
+            results.extend(self._handle_exit(worker))
+        return results
+
+    def _describe_worker_exit(self, worker):
+        return _describe_exit(worker.process.exitcode)
+
+    def _handle_exit(self, worker):
+        worker.process.join(1)
+        if worker.retiring and worker.task is None:
+            self._remove_worker(worker)
+            return []
+        if not worker.ready:
+            return self._handle_start_failure(worker)
+        description = self._describe_worker_exit(worker)
+        message = 'The worker process running this test {0}.'.format(
+            description)
+        logger.warning('Worker %d (pid %s) %s', worker.worker_id,
+                       worker.pid, description)
+        return self._lose_worker(worker, message)
+
+    def _handle_start_failure(self, worker):
+        self._remove_worker(worker)
+        if worker.start_failure is not None:
+            message = 'The worker process initializer failed:\n{0}'.format(
+                worker.start_failure)
+        else:
+            message = 'The worker process {0} before it was ready.'.format(
+                self._describe_worker_exit(worker))
+        logger.warning('Worker %d failed to start: %s',
+                       worker.worker_id, message)
+        self._start_failures += 1
+        if self._start_failures < MAX_START_FAILURES:
+            return []
+        # Workers cannot be started, so no test can be run.
+        results = [
+            self._error_result(test_case, None, message)
+            for task_id, test_cases in self._pending
+            for test_case in test_cases
+        ]
+        self._pending.clear()
+        return results
+
+    def _check_timeouts(self):
+        if self.test_timeout is None:
+            return []
+        results = []
+        now = _monotonic()
+        for worker in list(self._workers.values()):
+            if worker.task is None:
+                continue
+            test_case = worker.current_test
+            if test_case is not None and not worker.test_completed:
+                timeout = self.test_timeout(test_case)
+                if timeout is not None and now - worker.test_started > timeout:
+                    reason = 'Test timed out after {0:.1f} seconds'.format(
+                        now - worker.test_started)
+                    results.extend(self._kill_worker(worker, reason))
+                continue
+            remaining = worker.remaining_tests
+            if not remaining:
+                continue
+            timeout = self.test_timeout(remaining[0])
+            if timeout is not None and now - worker.last_message > timeout:
+                reason = 'No heartbeat from worker for {0:.1f} seconds'.format(
+                    now - worker.last_message)
+                results.extend(self._kill_worker(worker, reason))
+        return results
+
+    def poll(self, timeout):
+        """Wait up to ``timeout`` seconds for results from the workers.
+
+        Returns a list of the :class:`~haas.result.TestResult` objects
+        received, including errors recorded for tests whose worker was
+        lost.
+
+        """
+        self._maintain_workers()
+        results = self._dispatch()
+        if self.result_transport == SHARED_MEMORY_TRANSPORT:
+            # Writing to a ring does not wake this process up.
+            timeout = min(timeout, RING_POLL_INTERVAL)
+        waitables = {}
+        exited = set()
+        for worker in self._workers.values():
+            waitables[worker.connection] = worker
+            sentinel = getattr(worker.process, 'sentinel', None)
+            if sentinel is not None:
+                waitables[sentinel] = worker
+        if waitables:
+            ready = _wait_for_connections(list(waitables), timeout)
+            for worker in list(self._workers.values()):
+                results.extend(self._drain(worker))
+            for item in ready:
+                worker = waitables[item]
+                if item is not worker.connection:
+                    exited.add(worker)
+            for worker in set(waitables[item] for item in ready):
+                results.extend(self._receive(worker))
+        else:
+            time.sleep(timeout)
+        # Workers may exit without closing their connection (for
+        # example, if a test forked a process that inherited it).  A
+        # ready sentinel counts as an exit even if ``is_alive`` has not
+        # caught up yet, otherwise the pool would spin on it.
+        for worker in list(self._workers.values()):
+            if worker in exited or not worker.process.is_alive():
+                results.extend(self._receive(worker))
+                if worker.worker_id in self._workers:
+                    results.extend(self._handle_exit(worker))
+        results.extend(self._check_timeouts())
+        self._maintain_workers()
+        results.extend(self._dispatch())
+        return results
+
+    def terminate(self, reason):
+        """Kill all workers and drop queued tasks.
+
+        Returns error results for the tests that were running and for
+        the tests that were not run, so that every submitted test is
+        reported.
+
+        """
+        results = []
+        for worker in list(self._workers.values()):
+            if worker.task is not None:
+                results.extend(self._kill_worker(worker, reason))
+            else:
+                self._kill(worker)
+                self._remove_worker(worker)
+        # Includes the tests of the killed workers that were not run.
+        message = '{0}; the test was not run.\n'.format(reason)
+        results.extend(
+            self._error_result(test_case, None, message)
+            for task_id, test_cases in self._pending
+            for test_case in test_cases)
+        self._pending.clear()
+        return results
+
+    def cancel(self):
+        """Drop queued tasks and kill all workers without waiting for the
+        tests they are running, whose results are discarded.
+
+        """
+        self._pending.clear()
+        self._task_requirements.clear()
+        for worker in list(self._workers.values()):
+            self._kill(worker)
+            worker.task = None
+            self._remove_worker(worker)
+
+    def shutdown(self):
+        """Stop all workers.
+
+        """
+        for worker in list(self._workers.values()):
+            try:
+                worker.connection.send(None)
+            except (IOError, OSError):
+                pass
+        for worker in list(self._workers.values()):
+            worker.process.join(5)
+            if worker.process.is_alive():
+                self._kill(worker)
+            self._remove_worker(worker)
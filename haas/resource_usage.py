@@ -0,0 +1,210 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2013-2014 Simon Jagoe
+# All rights reserved.
+#
+# This software may be modified and distributed under the terms
+# of the 3-clause BSD license.  See the LICENSE.txt file for details.
+"""Measurement of the CPU time and memory used by individual tests.
+
+"""
+from __future__ import absolute_import, unicode_literals
+
+import sys
+import time
+
+try:
+    import resource
+except ImportError:  # pragma: no cover
+    resource = None
+
+try:
+    import tracemalloc
+except ImportError:  # pragma: no cover
+    tracemalloc = None
+
+if resource is not None:
+    # CPU time is measured for the thread running the test, where the
+    # platform supports it, so that tests run in other threads at the
+    # same time are not counted.
+    _RUSAGE_CPU = getattr(resource, 'RUSAGE_THREAD', resource.RUSAGE_SELF)
+    if sys.platform == 'darwin':  # pragma: no cover
+        _MAX_RSS_UNIT = 1
+    else:  # pragma: no cover
+        _MAX_RSS_UNIT = 1024
+
+
+def _cpu_times():
+    if resource is None:  # pragma: no cover
+        return time.process_time(), None
+    usage = resource.getrusage(_RUSAGE_CPU)
+    return usage.ru_utime, usage.ru_stime
+
+
+def _max_rss():
+    if resource is None:  # pragma: no cover
+        return None
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * _MAX_RSS_UNIT
+
+
+def format_bytes(value):
+    """Format a number of bytes for the timing reports.
+
+    """
+    for unit in ('B', 'KiB', 'MiB'):
+        if abs(value) < 1024:
+            break
+        value /= 1024.0
+    else:
+        unit = 'GiB'
+    if unit == 'B':
+        return '{0:d} {1}'.format(int(value), unit)
+    return '{0:.1f} {1}'.format(value, unit)
+
+
+class TestResources(object):
+    """The resources used by a single test, measured by a
+    :class:`~.ResourceMonitor`.
+
+    Attributes
+    ----------
+    user_time : float
+        The user CPU time of the test, in seconds.
+    system_time : float
+        The system CPU time of the test, in seconds, or ``None`` where
+        it cannot be measured separately (in which case ``user_time``
+        holds the total CPU time).
+    max_rss_delta : int
+        The number of bytes by which the test grew the peak resident set
+        size of the process, or ``None`` where it cannot be measured.
+    tracemalloc_peak : int
+        The peak number of bytes allocated by the test and traced by
+        :mod:`tracemalloc`, or ``None`` if allocations were not traced.
+
+    """
+
+    __slots__ = (
+        'user_time', 'system_time', 'max_rss_delta', 'tracemalloc_peak')
+
+    def __init__(self, user_time, system_time=None, max_rss_delta=None,
+                 tracemalloc_peak=None):
+        self.user_time = user_time
+        self.system_time = system_time
+        self.max_rss_delta = max_rss_delta
+        self.tracemalloc_peak = tracemalloc_peak
+
+    def __getstate__(self):
+        return self.to_tuple()
+
+    def __setstate__(self, state):
+        (self.user_time, self.system_time, self.max_rss_delta,
+         self.tracemalloc_peak) = state
+
+    def __repr__(self):
+        return ('<{0} user_time={1!r}, system_time={2!r}, '
+                'max_rss_delta={3!r}, tracemalloc_peak={4!r}>').format(
+                    type(self).__name__, self.user_time, self.system_time,
+                    self.max_rss_delta, self.tracemalloc_peak)
+
+    def __eq__(self, other):
+        if not isinstance(other, TestResources):
+            return NotImplemented
+        return self.to_tuple() == other.to_tuple()
+
+    def __ne__(self, other):
+        return not (self == other)
+
+    __hash__ = None
+
+    @property
+    def cpu_time(self):
+        """The total CPU time of the test, in seconds.
+
+        """
+        return self.user_time + (self.system_time or 0.0)
+
+    def to_tuple(self):
+        """Return the measurements as a tuple of ``(user_time,
+        system_time, max_rss_delta, tracemalloc_peak)``.
+
+        """
+        return (self.user_time, self.system_time, self.max_rss_delta,
+                self.tracemalloc_peak)
+
+    def to_dict(self):
+        """Serialize the ``TestResources`` to a dictionary.
+
+        """
+        return dict(zip(self.__slots__, self.to_tuple()))
+
+    def format(self):
+        """Format the measurements for the timing reports.
+
+        """
+        if self.system_time is None:
+            parts = ['cpu {0:.3f}s'.format(self.user_time)]
+        else:
+            parts = ['cpu {0:.3f}s user {1:.3f}s sys'.format(
+                self.user_time, self.system_time)]
+        if self.max_rss_delta is not None:
+            parts.append('rss +{0}'.format(format_bytes(self.max_rss_delta)))
+        if self.tracemalloc_peak is not None:
+            parts.append('alloc {0}'.format(
+                format_bytes(self.tracemalloc_peak)))
+        return ', '.join(parts)
+
+
+class ResourceMonitor(object):
+    """Measures the :class:`~.TestResources` used by each test run by a
+    :class:`~haas.result.ResultCollector`.
+
+    The CPU time is measured with :func:`resource.getrusage` for the
+    thread running the test where the platform supports it, and for the
+    whole process otherwise.  The growth of the peak resident set size
+    is that of the whole process, so it only shows the tests that push
+    the peak higher.
+
+    If ``trace_allocations`` is set, :mod:`tracemalloc` is started and
+    the peak traced memory of each test is recorded as well.  Tracing
+    slows allocation-heavy tests down considerably, and the peak
+    includes the allocations of any tests run in other threads at the
+    same time.
+
+    """
+
+    def __init__(self, trace_allocations=False):
+        self.trace_allocations = (
+            trace_allocations and tracemalloc is not None)
+
+    def start(self):
+        """Start measuring a test, returning the state to pass to
+        :meth:`stop`.
+
+        """
+        traced = None
+        if self.trace_allocations:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+            if hasattr(tracemalloc, 'reset_peak'):
+                tracemalloc.reset_peak()
+                traced, _ = tracemalloc.get_traced_memory()
+        return _cpu_times(), _max_rss(), traced
+
+    def stop(self, state):
+        """Return the :class:`~.TestResources` used since :meth:`start`
+        returned ``state``.
+
+        """
+        (user_time, system_time), max_rss, traced = state
+        tracemalloc_peak = None
+        if traced is not None and tracemalloc.is_tracing():
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc_peak = max(peak - traced, 0)
+        max_rss_delta = None
+        if max_rss is not None:
+            max_rss_delta = _max_rss() - max_rss
+        stop_user_time, stop_system_time = _cpu_times()
+        if system_time is not None:
+            system_time = stop_system_time - system_time
+        return TestResources(
+            stop_user_time - user_time, system_time, max_rss_delta,
+            tracemalloc_peak)
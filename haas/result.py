@@ -6,11 +6,16 @@
 # of the 3-clause BSD license.  See the LICENSE.txt file for details.
 from __future__ import absolute_import, unicode_literals
 
+from contextlib import contextmanager
 from datetime import datetime, timedelta
 from enum import Enum
-from functools import wraps
 import locale
+import mmap
+import os
 import sys
+import tempfile
+import threading
+import time
 import traceback
 import warnings
 
@@ -18,6 +23,29 @@ import six
 from six.moves import StringIO
 
 from .error_holder import ErrorHolder
+from .resource_usage import TestResources
+
+try:
+    import contextvars
+except ImportError:  # pragma: no cover
+    contextvars = None
+
+# Not available on Python 2, where tracebacks are formatted immediately
+_TracebackException = getattr(traceback, 'TracebackException', None)
+
+_EPOCH = datetime(1970, 1, 1)
+
+if hasattr(time, 'perf_counter_ns'):
+    _counter_ns = time.perf_counter_ns
+    _wall_clock_ns = time.time_ns
+else:  # pragma: no cover
+    _counter = getattr(time, 'perf_counter', time.time)
+
+    def _counter_ns():
+        return int(_counter() * 1e9)
+
+    def _wall_clock_ns():
+        return int(time.time() * 1e9)
 
 
 class TestCompletionStatus(Enum):
@@ -51,6 +79,39 @@ _successful_results = set([TestCompletionStatus.success,
 STDOUT_LINE = '\nStdout:\n%s'
 STDERR_LINE = '\nStderr:\n%s'
 
+#: Buffer output by replacing ``sys.stdout`` and ``sys.stderr``.
+CAPTURE_SYS = 'sys'
+
+#: Buffer output by redirecting file descriptors 1 and 2 to temporary
+#: files, capturing the output of C extensions and subprocesses.
+CAPTURE_FD = 'fd'
+
+# Replaces the middle of output longer than the capture limit
+TRUNCATED_OUTPUT = '\n[... {0} {1} of output truncated ...]\n'
+
+
+def _truncate_output(output, limit, unit='characters'):
+    """Keep the first and last ``limit // 2`` characters of ``output``,
+    replacing the rest with a marker.
+
+    """
+    if limit is None or len(output) <= limit:
+        return output
+    head = limit // 2
+    tail = limit - head
+    marker = TRUNCATED_OUTPUT.format(len(output) - limit, unit)
+    return output[:head] + marker + output[len(output) - tail:]
+
+
+def _read_output(buffer, limit):
+    """Return the output captured in ``buffer``, truncated to
+    ``limit``.
+
+    """
+    if isinstance(buffer, _FdCapture):
+        return buffer.getvalue(limit)
+    return _truncate_output(buffer.getvalue(), limit)
+
 
 def _is_relevant_tb_level(tb):
     return '__unittest' in tb.tb_frame.f_globals
@@ -73,77 +134,162 @@ def _decode(line, encoding):
         return line.decode(encoding, 'replace')
 
 
+class _ExceptionSummary(object):
+    """A compact summary of an exception raised by a test, formatted as
+    text only when it is needed.
+
+    The traceback is reduced to the file name, line number and function
+    name of each relevant frame, so the summary does not keep the frames
+    (and their locals) alive, and source lines are only read when the
+    text is formatted.
+
+    """
+
+    __slots__ = ('_exception', '_lines', '_stdout', '_stderr')
+
+    def __init__(self, err, is_failure, stdout=None, stderr=None):
+        exctype, value, tb = err
+        # Skip test runner traceback levels
+        while tb and _is_relevant_tb_level(tb):
+            tb = tb.tb_next
+
+        if is_failure:
+            # Skip assert*() traceback levels
+            length = _count_relevant_tb_levels(tb)
+        else:
+            length = None
+
+        if _TracebackException is None:  # pragma: no cover
+            self._exception = None
+            self._lines = traceback.format_exception(
+                exctype, value, tb, length)
+        else:
+            self._exception = _TracebackException(
+                exctype, value, tb, limit=length, lookup_lines=False)
+            self._lines = None
+        self._stdout = stdout
+        self._stderr = stderr
+
+    def format(self):
+        """Return the text of the exception and the captured output.
+
+        """
+        if self._lines is None:
+            msgLines = list(self._exception.format())
+        else:  # pragma: no cover
+            msgLines = self._lines
+
+        encoding = locale.getpreferredencoding()
+        msgLines = [_decode(line, encoding) for line in msgLines]
+
+        stdout = self._stdout
+        if stdout:
+            if not stdout.endswith('\n'):
+                stdout += '\n'
+            msgLines.append(STDOUT_LINE % stdout)
+        stderr = self._stderr
+        if stderr:
+            if not stderr.endswith('\n'):
+                stderr += '\n'
+            msgLines.append(STDERR_LINE % stderr)
+        return ''.join(msgLines)
+
+
 def _format_exception(err, is_failure, stdout=None, stderr=None):
     """Converts a sys.exc_info()-style tuple of values into a string."""
-    exctype, value, tb = err
-    # Skip test runner traceback levels
-    while tb and _is_relevant_tb_level(tb):
-        tb = tb.tb_next
+    return _ExceptionSummary(err, is_failure, stdout, stderr).format()
+
+
+def _timedelta_to_ns(delta):
+    return ((delta.days * 86400 + delta.seconds) * 1000000 +
+            delta.microseconds) * 1000
+
 
-    if is_failure:
-        # Skip assert*() traceback levels
-        length = _count_relevant_tb_levels(tb)
-        msgLines = traceback.format_exception(exctype, value, tb, length)
-    else:
-        msgLines = traceback.format_exception(exctype, value, tb)
+def _datetime_to_ns(value):
+    """Return the naive UTC datetime ``value`` in nanoseconds since the
+    epoch.
+
+    """
+    return _timedelta_to_ns(value - _EPOCH)
 
-    encoding = locale.getpreferredencoding()
-    msgLines = [_decode(line, encoding) for line in msgLines]
 
-    if stdout:
-        if not stdout.endswith('\n'):
-            stdout += '\n'
-        msgLines.append(STDOUT_LINE % stdout)
-    if stderr:
-        if not stderr.endswith('\n'):
-            stderr += '\n'
-        msgLines.append(STDERR_LINE % stderr)
-    return ''.join(msgLines)
+def _ns_to_datetime(value):
+    return _EPOCH + timedelta(microseconds=value // 1000)
 
 
 class TestDuration(object):
     """An orderable representation of the duration of an individual test.
 
+    The duration is held as an integer number of nanoseconds, with an
+    optional wall-clock start time, also in nanoseconds since the epoch.
+    Create durations measured with a monotonic clock with
+    :meth:`~.from_ns`.
+
     """
 
+    __slots__ = ('_start_ns', '_duration_ns')
+
     def __init__(self, start_time, stop_time=None):
         if stop_time is not None:
-            self._start_time = start_time
-            self._stop_time = stop_time
-            self._duration = stop_time - start_time
+            self._start_ns = _datetime_to_ns(start_time)
+            self._duration_ns = _timedelta_to_ns(stop_time - start_time)
         else:
             # Once calculations are done, start & stop are meaningless
-            self._start_time = None
-            self._stop_time = None
+            self._start_ns = None
             duration = start_time
-            if not isinstance(duration, timedelta):
-                duration = timedelta(seconds=float(start_time))
-            self._duration = duration
-        self._total_seconds = None
+            if isinstance(duration, timedelta):
+                self._duration_ns = _timedelta_to_ns(duration)
+            else:
+                self._duration_ns = int(round(float(duration) * 1e9))
+
+    @classmethod
+    def from_ns(cls, duration_ns, start_ns=None):
+        """Create a :class:`~.TestDuration` of ``duration_ns``
+        nanoseconds, started ``start_ns`` nanoseconds after the epoch.
+
+        """
+        duration = cls.__new__(cls)
+        duration._start_ns = start_ns
+        duration._duration_ns = duration_ns
+        return duration
+
+    def __getstate__(self):
+        return (self._start_ns, self._duration_ns)
+
+    def __setstate__(self, state):
+        self._start_ns, self._duration_ns = state
+
+    @property
+    def start_ns(self):
+        """The wall-clock start time in nanoseconds since the epoch, or
+        ``None``.
+
+        """
+        return self._start_ns
+
+    @property
+    def duration_ns(self):
+        return self._duration_ns
 
     @property
     def start_time(self):
-        return self._start_time
+        if self._start_ns is None:
+            return None
+        return _ns_to_datetime(self._start_ns)
 
     @property
     def stop_time(self):
-        return self._stop_time
+        if self._start_ns is None:
+            return None
+        return _ns_to_datetime(self._start_ns + self._duration_ns)
 
     @property
     def duration(self):
-        return self._duration
+        return timedelta(microseconds=self._duration_ns // 1000)
 
     @property
     def total_seconds(self):
-        if self._total_seconds is None:
-            if sys.version_info < (2, 7):
-                delta = self._duration
-                total_seconds = delta.microseconds / 1000000.0 + delta.seconds
-                total_seconds += delta.days * 24 * 60 * 60
-            else:
-                total_seconds = self._duration.total_seconds()
-            self._total_seconds = total_seconds
-        return self._total_seconds
+        return self._duration_ns / 1e9
 
     def __repr__(self):
         return '<TestDuration {0}>'.format(str(self))
@@ -164,6 +310,8 @@ class TestDuration(object):
         )
 
     def __eq__(self, other):
+        if isinstance(other, TestDuration):
+            return self._duration_ns == other._duration_ns
         if not hasattr(other, 'duration'):
             return NotImplemented
         return self.duration == other.duration
@@ -172,6 +320,8 @@ class TestDuration(object):
         return not (self == other)
 
     def __lt__(self, other):
+        if isinstance(other, TestDuration):
+            return self._duration_ns < other._duration_ns
         if not hasattr(other, 'duration'):
             return NotImplemented
         return self.duration < other.duration
@@ -180,6 +330,8 @@ class TestDuration(object):
         return not (self > other)
 
     def __gt__(self, other):
+        if isinstance(other, TestDuration):
+            return self._duration_ns > other._duration_ns
         if not hasattr(other, 'duration'):
             return NotImplemented
         return self.duration > other.duration
@@ -188,7 +340,7 @@ class TestDuration(object):
         return not (self < other)
 
     def __hash__(self):
-        return hash((self._start_time, self._stop_time))
+        return hash((self._start_ns, self._duration_ns))
 
     # To support statistics.mean() on TestDuration objects
     def as_integer_ratio(self):
@@ -197,12 +349,12 @@ class TestDuration(object):
     def __add__(self, other):
         if not isinstance(other, TestDuration):
             return NotImplemented
-        return TestDuration(self.duration + other.duration)
+        return TestDuration.from_ns(self._duration_ns + other._duration_ns)
 
     def __truediv__(self, divisor):
         if not isinstance(self, TestDuration) and isinstance(divisor, int):
             return NotImplemented
-        return TestDuration(self.duration / divisor)
+        return TestDuration.from_ns(int(round(self._duration_ns / divisor)))
 
 
 class TestResult(object):
@@ -211,16 +363,46 @@ class TestResult(object):
     the reason or error associated with status, along with timing
     information.
 
+    The text of an exception recorded with :meth:`~.from_test_case` is
+    only formatted when :attr:`~.exception` is first read, so results
+    whose tracebacks are never reported (such as expected failures) do
+    not pay for formatting them.
+
+    If the test was run by a :class:`~.ResultCollector` with a
+    :class:`~haas.resource_usage.ResourceMonitor`, ``resources`` holds
+    the :class:`~haas.resource_usage.TestResources` it used.
+
     """
 
     def __init__(self, test_class, test_method_name, status, duration,
-                 exception=None, message=None):
+                 exception=None, message=None, resources=None):
         self.test_class = test_class
         self.test_method_name = test_method_name
         self.status = status
-        self.exception = exception
+        self._exception = exception
         self.message = message
         self.duration = duration
+        self.resources = resources
+
+    @property
+    def exception(self):
+        """The formatted exception and captured output of the test, or
+        ``None``.
+
+        """
+        exception = self._exception
+        if isinstance(exception, _ExceptionSummary):
+            exception = self._exception = exception.format()
+        return exception
+
+    @exception.setter
+    def exception(self, exception):
+        self._exception = exception
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['_exception'] = self.exception
+        return state
 
     def __repr__(self):
         template = ('<{0} class={1}, method={2}, exc={3!r}, status={4!r}, '
@@ -239,7 +421,8 @@ class TestResult(object):
             self.status == other.status and
             self.exception == other.exception and
             self.message == other.message and
-            self.duration == other.duration
+            self.duration == other.duration and
+            self.resources == other.resources
         )
 
     def __ne__(self, other):
@@ -247,7 +430,8 @@ class TestResult(object):
 
     @classmethod
     def from_test_case(cls, test_case, status, duration,
-                       exception=None, message=None, stdout=None, stderr=None):
+                       exception=None, message=None, stdout=None, stderr=None,
+                       resources=None):
         """Construct a :class:`~.TestResult` object from the test and a status.
 
         Parameters
@@ -265,6 +449,8 @@ class TestResult(object):
             The test stdout if stdout was buffered.
         stderr : str
             The test stderr if stderr was buffered.
+        resources : haas.resource_usage.TestResources
+            The resources used by the test, if they were measured.
 
         """
         test_class = type(test_case)
@@ -272,10 +458,10 @@ class TestResult(object):
         if exception is not None:
             exctype, value, tb = exception
             is_failure = exctype is test_case.failureException
-            exception = _format_exception(
+            exception = _ExceptionSummary(
                 exception, is_failure, stdout, stderr)
         return cls(test_class, test_method_name, status, duration,
-                   exception, message)
+                   exception, message, resources)
 
     @property
     def test(self):
@@ -288,14 +474,15 @@ class TestResult(object):
         """Serialize the ``TestResult`` to a dictionary.
 
         """
+        resources = self.resources
         return {
             'test_class': self.test_class,
             'test_method_name': self.test_method_name,
             'status': self.status,
             'exception': self.exception,
             'message': self.message,
-            # 'started_time': self.started_time,
-            'completed_time': self.completed_time,
+            'duration': self.duration,
+            'resources': None if resources is None else resources.to_dict(),
         }
 
     @classmethod
@@ -304,6 +491,10 @@ class TestResult(object):
         :meth:`~.TestResult.to_dict`
 
         """
+        data = dict(data)
+        resources = data.get('resources')
+        if resources is not None:
+            data['resources'] = TestResources(**resources)
         return cls(**data)
 
 
@@ -311,14 +502,137 @@ class TestResult(object):
 separator2 = '-' * 70
 
 
-# Copied from unittest.result
-def failfast(method):
-    @wraps(method)
-    def inner(self, *args, **kw):
-        if self.failfast:
-            self.stop()
-        return method(self, *args, **kw)
-    return inner
+class _ContextLocalStream(object):
+    """A stream that writes to the buffer registered by the current
+    thread or asyncio task, or to the wrapped stream in threads and
+    tasks that have not registered a buffer.
+
+    """
+
+    def __init__(self, stream):
+        self.stream = stream
+        if contextvars is None:  # pragma: no cover
+            self._local = threading.local()
+        else:
+            self._buffer = contextvars.ContextVar(
+                'haas_output_buffer', default=None)
+
+    def get_buffer(self):
+        """Return the buffer registered by the current thread or task.
+
+        """
+        if contextvars is None:  # pragma: no cover
+            return getattr(self._local, 'buffer', None)
+        return self._buffer.get()
+
+    def set_buffer(self, buffer):
+        """Send the output of the current thread or task to ``buffer``, or
+        back to the wrapped stream if ``buffer`` is ``None``.
+
+        """
+        if contextvars is None:  # pragma: no cover
+            self._local.buffer = buffer
+        else:
+            self._buffer.set(buffer)
+
+    @property
+    def _target(self):
+        buffer = self.get_buffer()
+        if buffer is None:
+            return self.stream
+        return buffer
+
+    def write(self, data):
+        return self._target.write(data)
+
+    def writelines(self, lines):
+        return self._target.writelines(lines)
+
+    def flush(self):
+        return self._target.flush()
+
+    def __getattr__(self, name):
+        return getattr(self._target, name)
+
+
+class _FdCapture(object):
+    """Captures everything written to the file descriptor ``fd`` in a
+    temporary file on disk.
+
+    Provides the ``getvalue``, ``seek`` and ``truncate`` methods of the
+    ``StringIO`` buffers used to capture ``sys.stdout`` and
+    ``sys.stderr``; the captured output is only read (through a memory
+    map) when it is asked for, and only its head and tail are read when
+    it is longer than the capture limit.
+
+    """
+
+    def __init__(self, fd, stream):
+        self._fd = fd
+        self._stream = stream
+        self._file = tempfile.TemporaryFile()
+        self._saved_fd = None
+
+    def start(self):
+        self._stream.flush()
+        self._saved_fd = os.dup(self._fd)
+        os.dup2(self._file.fileno(), self._fd)
+
+    def stop(self):
+        self._stream.flush()
+        os.dup2(self._saved_fd, self._fd)
+        os.close(self._saved_fd)
+        self._saved_fd = None
+
+    def getvalue(self, limit=None):
+        """Return the captured output, keeping only the first and last
+        ``limit // 2`` bytes if it is longer than ``limit`` bytes.
+
+        """
+        self._stream.flush()
+        fileno = self._file.fileno()
+        size = os.fstat(fileno).st_size
+        if size == 0:
+            return ''
+        mapped = mmap.mmap(fileno, size, access=mmap.ACCESS_READ)
+        try:
+            if limit is None or size <= limit:
+                return mapped[:].decode('utf-8', 'replace')
+            head = limit // 2
+            tail = limit - head
+            marker = TRUNCATED_OUTPUT.format(size - limit, 'bytes')
+            return ''.join((
+                mapped[:head].decode('utf-8', 'replace'), marker,
+                mapped[size - tail:].decode('utf-8', 'replace')))
+        finally:
+            mapped.close()
+
+    def seek(self, position):
+        os.lseek(self._file.fileno(), position, os.SEEK_SET)
+
+    def truncate(self):
+        self._file.truncate(os.lseek(self._file.fileno(), 0, os.SEEK_CUR))
+
+
+@contextmanager
+def thread_local_output():
+    """Replace ``sys.stdout`` and ``sys.stderr`` so that buffering
+    :class:`~.ResultCollector` instances used in different threads (or
+    asyncio tasks) each capture only the output of their own thread.
+
+    """
+    if isinstance(sys.stdout, _ContextLocalStream):
+        yield
+        return
+    original_stdout = sys.stdout
+    original_stderr = sys.stderr
+    sys.stdout = _ContextLocalStream(original_stdout)
+    sys.stderr = _ContextLocalStream(original_stderr)
+    try:
+        yield
+    finally:
+        sys.stdout = original_stdout
+        sys.stderr = original_stderr
 
 
 class ResultCollector(object):
@@ -326,14 +640,56 @@ class ResultCollector(object):
     :class:`~.TestResult` instances and handing them off the registered
     result output handlers.
 
+    When output is buffered inside :func:`~.thread_local_output`, only
+    the output of the thread running the test is captured, so separate
+    collectors may run tests in separate threads at the same time.
+
+    With ``capture`` set to :data:`CAPTURE_FD`, buffered output is
+    captured by redirecting file descriptors 1 and 2 to temporary files,
+    so that the output of C extensions and subprocesses is captured too,
+    without holding it in memory.  Captured output is only read back for
+    tests that do not succeed.  Inside :func:`~.thread_local_output`,
+    ``sys.stdout`` and ``sys.stderr`` are always captured instead.
+
+    If ``capture_limit`` is set, only the first and last
+    ``capture_limit // 2`` characters (bytes, when capturing file
+    descriptors) of the output of each stream are kept; the rest is
+    replaced by a marker, bounding the memory used by, and the size of
+    the results sent from worker processes for, noisy failing tests.
+
+    If ``streaming`` is set, the collector does not keep the results of
+    unsuccessful or skipped tests in its ``errors``, ``failures``,
+    ``skipped``, ``expectedFailures`` and ``unexpectedSuccesses`` lists,
+    so that its memory use does not grow with the number of tests; the
+    results are only passed to the result handlers.
+
+    If a ``resource_monitor`` (see
+    :class:`~haas.resource_usage.ResourceMonitor`) is given, the CPU
+    time and memory used by each test run by the collector are measured
+    and attached to its result.
+
+    The collector is stopped (see :meth:`~.stop`) on the first
+    unsuccessful result if ``failfast`` is set, or once ``maxfail``
+    unsuccessful results have been collected.  This applies to results
+    collected in other processes and added with :meth:`~.add_result`.
+
     """
 
     # Temporary compatibility with unittest's runner
     separator2 = separator2
 
-    def __init__(self, buffer=False, failfast=False):
+    def __init__(self, buffer=False, failfast=False, maxfail=None,
+                 capture=CAPTURE_SYS, capture_limit=None, streaming=False,
+                 resource_monitor=None):
         self.buffer = buffer
+        self.streaming = streaming
+        self.capture = capture
+        self.capture_limit = capture_limit
+        self.resource_monitor = resource_monitor
         self.failfast = failfast
+        self.maxfail = maxfail
+        #: The number of unsuccessful results collected.
+        self.failure_count = 0
         self._result_handlers = []
         self._sorted_handlers = None
         self.testsRun = 0
@@ -347,6 +703,9 @@ class ResultCollector(object):
         self._mirror_output = False
         self._stderr_buffer = None
         self._stdout_buffer = None
+        self._fd_capture = None
+        self._capturing_fds = False
+        self._thread_local_output = False
         self._original_stderr = sys.stderr
         self._original_stdout = sys.stdout
         self._test_timing = {}
@@ -370,32 +729,71 @@ class ResultCollector(object):
             if self._stderr_buffer is None:
                 self._stderr_buffer = StringIO()
                 self._stdout_buffer = StringIO()
-            sys.stdout = self._stdout_buffer
-            sys.stderr = self._stderr_buffer
+            if isinstance(sys.stdout, _ContextLocalStream) and \
+                    isinstance(sys.stderr, _ContextLocalStream):
+                self._thread_local_output = True
+                sys.stdout.set_buffer(self._stdout_buffer)
+                sys.stderr.set_buffer(self._stderr_buffer)
+            elif self.capture == CAPTURE_FD:
+                if self._fd_capture is None:
+                    self._fd_capture = (
+                        _FdCapture(1, sys.stdout), _FdCapture(2, sys.stderr))
+                for capture in self._fd_capture:
+                    capture.start()
+                self._capturing_fds = True
+            else:
+                sys.stdout = self._stdout_buffer
+                sys.stderr = self._stderr_buffer
 
     def _restore_stdout(self):
         """Unhook stdout and stderr if buffering is enabled.
 
         """
         if self.buffer:
+            stdout_buffer, stderr_buffer = self._output_buffers
+            if self._thread_local_output:
+                sys.stdout.set_buffer(None)
+                sys.stderr.set_buffer(None)
+                original_stdout = sys.stdout
+                original_stderr = sys.stderr
+            elif self._capturing_fds:
+                for capture in self._fd_capture:
+                    capture.stop()
+                original_stdout = sys.stdout
+                original_stderr = sys.stderr
+            else:
+                original_stdout = self._original_stdout
+                original_stderr = self._original_stderr
             if self._mirror_output:
-                output = sys.stdout.getvalue()
-                error = sys.stderr.getvalue()
+                output = _read_output(stdout_buffer, self.capture_limit)
+                error = _read_output(stderr_buffer, self.capture_limit)
                 if output:
                     if not output.endswith('\n'):
                         output += '\n'
-                    self._original_stdout.write(STDOUT_LINE % output)
+                    original_stdout.write(STDOUT_LINE % output)
                 if error:
                     if not error.endswith('\n'):
                         error += '\n'
-                    self._original_stderr.write(STDERR_LINE % error)
+                    original_stderr.write(STDERR_LINE % error)
+
+            if not self._thread_local_output and not self._capturing_fds:
+                sys.stdout = self._original_stdout
+                sys.stderr = self._original_stderr
+            self._thread_local_output = False
+            self._capturing_fds = False
+            for buffer in (stdout_buffer, stderr_buffer):
+                buffer.seek(0)
+                buffer.truncate()
 
-            sys.stdout = self._original_stdout
-            sys.stderr = self._original_stderr
-            self._stdout_buffer.seek(0)
-            self._stdout_buffer.truncate()
-            self._stderr_buffer.seek(0)
-            self._stderr_buffer.truncate()
+    @property
+    def _output_buffers(self):
+        """The buffers holding the captured ``(stdout, stderr)`` of the
+        running test.
+
+        """
+        if self._capturing_fds:
+            return self._fd_capture
+        return self._stdout_buffer, self._stderr_buffer
 
     def printErrors(self):  # pragma: no cover
         # FIXME: Remove
@@ -422,9 +820,18 @@ class ResultCollector(object):
             set the actual start time of a test run in a subprocess.
 
         """
-        if start_time is None:
-            start_time = datetime.utcnow()
-        self._test_timing[self._testcase_to_key(test)] = start_time
+        resource_monitor = self.resource_monitor
+        if start_time is not None:
+            # Only the wall clock is shared with the process that ran it
+            timing = (_datetime_to_ns(start_time), None, None)
+        elif resource_monitor is not None:
+            resources = resource_monitor.start()
+            started = _counter_ns()
+            timing = (_wall_clock_ns(), started, resources)
+        else:
+            started = _counter_ns()
+            timing = (_wall_clock_ns(), started, None)
+        self._test_timing[self._testcase_to_key(test)] = timing
         self._mirror_output = False
         self._setup_stdout()
         self.testsRun += 1
@@ -444,6 +851,7 @@ class ResultCollector(object):
             handler.stop_test(test)
         self._restore_stdout()
         self._mirror_output = False
+        self._test_timing.pop(self._testcase_to_key(test), None)
 
     def startTestRun(self):
         """Indicate that the test run is starting.
@@ -459,6 +867,21 @@ class ResultCollector(object):
         for handler in self._handlers:
             handler.stop_test_run()
 
+    def add_run_report(self, title, lines):
+        """Pass a report on the test run made by the test runner to the
+        result handlers.
+
+        Parameters
+        ----------
+        title : str
+            The heading of the report.
+        lines : list
+            The lines of the report.
+
+        """
+        for handler in self._handlers:
+            handler.add_run_report(title, lines)
+
     def add_result(self, result):
         """Add an already-constructed :class:`~.TestResult` to this
         :class:`~.ResultCollector`.
@@ -469,8 +892,12 @@ class ResultCollector(object):
         """
         for handler in self._handlers:
             handler(result)
-        if self._successful and result.status not in _successful_results:
+        if result.status not in _successful_results:
             self._successful = False
+            self.failure_count += 1
+            if self.failfast or (self.maxfail is not None and
+                                 self.failure_count >= self.maxfail):
+                self.stop()
 
     def _handle_result(self, test, status, exception=None, message=None):
         """Create a :class:`~.TestResult` and add it to this
@@ -489,22 +916,31 @@ class ResultCollector(object):
             reason).
 
         """
-        if self.buffer:
-            stderr = self._stderr_buffer.getvalue()
-            stdout = self._stdout_buffer.getvalue()
+        if self.buffer and exception is not None:
+            # The output is only reported with the exception
+            stdout_buffer, stderr_buffer = self._output_buffers
+            stdout = _read_output(stdout_buffer, self.capture_limit)
+            stderr = _read_output(stderr_buffer, self.capture_limit)
         else:
             stderr = stdout = None
 
-        started_time = self._test_timing.get(self._testcase_to_key(test))
-        if started_time is None and isinstance(test, ErrorHolder):
-            started_time = datetime.utcnow()
-        elif started_time is None:
+        timing = self._test_timing.get(self._testcase_to_key(test))
+        if timing is None and isinstance(test, ErrorHolder):
+            started = _counter_ns()
+            timing = (_wall_clock_ns(), started, None)
+        elif timing is None:
             raise RuntimeError(
                 'Missing test start! Please report this error as a bug in '
                 'haas.')
 
-        completion_time = datetime.utcnow()
-        duration = TestDuration(started_time, completion_time)
+        start_ns, started, resources = timing
+        if started is None:
+            duration_ns = _wall_clock_ns() - start_ns
+        else:
+            duration_ns = _counter_ns() - started
+        if resources is not None:
+            resources = self.resource_monitor.stop(resources)
+        duration = TestDuration.from_ns(duration_ns, start_ns)
         result = TestResult.from_test_case(
             test,
             status,
@@ -513,11 +949,15 @@ class ResultCollector(object):
             message=message,
             stdout=stdout,
             stderr=stderr,
+            resources=resources,
         )
         self.add_result(result)
         return result
 
-    @failfast
+    def _keep_result(self, results, result):
+        if not self.streaming:
+            results.append(result)
+
     def addError(self, test, exception):
         """Register that a test ended in an error.
 
@@ -531,10 +971,9 @@ class ResultCollector(object):
         """
         result = self._handle_result(
             test, TestCompletionStatus.error, exception=exception)
-        self.errors.append(result)
+        self._keep_result(self.errors, result)
         self._mirror_output = True
 
-    @failfast
     def addFailure(self, test, exception):
         """Register that a test ended with a failure.
 
@@ -548,7 +987,7 @@ class ResultCollector(object):
         """
         result = self._handle_result(
             test, TestCompletionStatus.failure, exception=exception)
-        self.failures.append(result)
+        self._keep_result(self.failures, result)
         self._mirror_output = True
 
     def addSuccess(self, test):
@@ -575,7 +1014,7 @@ class ResultCollector(object):
         """
         result = self._handle_result(
             test, TestCompletionStatus.skipped, message=reason)
-        self.skipped.append(result)
+        self._keep_result(self.skipped, result)
 
     def addExpectedFailure(self, test, exception):
         """Register that a test that failed and was expected to fail.
@@ -590,9 +1029,8 @@ class ResultCollector(object):
         """
         result = self._handle_result(
             test, TestCompletionStatus.expected_failure, exception=exception)
-        self.expectedFailures.append(result)
+        self._keep_result(self.expectedFailures, result)
 
-    @failfast
     def addUnexpectedSuccess(self, test):
         """Register a test that passed unexpectedly.
 
@@ -604,7 +1042,7 @@ class ResultCollector(object):
         """
         result = self._handle_result(
             test, TestCompletionStatus.unexpected_success)
-        self.unexpectedSuccesses.append(result)
+        self._keep_result(self.unexpectedSuccesses, result)
 
     def wasSuccessful(self):
         """Return ``True`` if the run was successful.
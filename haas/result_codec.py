@@ -0,0 +1,257 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2013-2014 Simon Jagoe
+# All rights reserved.
+#
+# This software may be modified and distributed under the terms
+# of the 3-clause BSD license.  See the LICENSE.txt file for details.
+"""Compact serialization of :class:`~haas.result.TestResult` objects for
+sending between processes.
+
+A result is encoded as a record holding the index of its test in the
+batch of tests run by the worker (the receiver holds the same batch
+and uses it to look up the test), a status byte, the start time and
+duration in nanoseconds, the exception and message text and, if they
+were measured, the resources used by the test.  The
+``zlib`` codec compresses records holding long text (such as the
+captured output of a noisy failing test) before they are sent.
+
+"""
+from __future__ import absolute_import, unicode_literals
+
+from abc import ABCMeta, abstractmethod
+import marshal
+import math
+import pickle
+import struct
+import zlib
+
+import six
+from six import add_metaclass
+
+from .resource_usage import TestResources
+from .result import TestCompletionStatus, TestDuration, TestResult
+
+# Marks a missing start time, a missing string or a missing measurement
+_NO_TIME = -1
+_NO_STRING = 0xffffffff
+_NO_BYTES = -1
+
+# Marks a record compressed by the ZlibResultCodec
+_PLAIN = b'\x00'
+_COMPRESSED = b'\x01'
+
+#: Records of at least this many bytes are compressed by the
+#: :class:`~.ZlibResultCodec`.
+COMPRESSION_THRESHOLD = 1024
+
+if six.PY2:  # pragma: no cover
+    _TEXT_ERRORS = 'strict'
+else:  # pragma: no cover
+    _TEXT_ERRORS = 'surrogatepass'
+
+
+def _result_times(result):
+    """Return the start time and the duration of ``result`` in
+    nanoseconds.
+
+    """
+    duration = result.duration
+    start_ns = duration.start_ns
+    if start_ns is None:
+        start_ns = _NO_TIME
+    return start_ns, duration.duration_ns
+
+
+def _create_result(test_case, status, start_ns, duration_ns, exception,
+                   message, resources=None):
+    if start_ns == _NO_TIME:
+        start_ns = None
+    duration = TestDuration.from_ns(duration_ns, start_ns)
+    if resources is not None:
+        resources = TestResources(*resources)
+    return TestResult(
+        type(test_case), test_case._testMethodName,
+        TestCompletionStatus(status), duration, exception, message,
+        resources)
+
+
+def _result_resources(result):
+    resources = result.resources
+    if resources is None:
+        return None
+    return resources.to_tuple()
+
+
+@add_metaclass(ABCMeta)
+class ResultCodec(object):
+    """Encodes test results as byte strings and decodes them again.
+
+    """
+
+    #: The name used to select the codec on the command line.
+    name = None
+
+    @abstractmethod
+    def encode(self, index, result):
+        """Encode ``result``, the result of the test at ``index`` in the
+        batch being run, as a byte string.
+
+        """
+
+    @abstractmethod
+    def decode(self, data, test_cases):
+        """Decode a result encoded by :meth:`encode`.
+
+        Parameters
+        ----------
+        data : bytes
+            The encoded result.
+        test_cases : list
+            The batch of tests that the encoded index refers to.
+
+        """
+
+
+class StructResultCodec(ResultCodec):
+    """Encodes results as a fixed-size ``struct`` header followed by the
+    UTF-8 encoded exception and message text, and the resources used by
+    the test, if they were measured.
+
+    """
+
+    name = 'struct'
+
+    _header = struct.Struct('<IBqqII')
+
+    _resources = struct.Struct('<ddqq')
+
+    def encode(self, index, result):
+        start_ns, duration_ns = _result_times(result)
+        exception = result.exception
+        message = result.message
+        if exception is None:
+            exception_data = b''
+            exception_length = _NO_STRING
+        else:
+            exception_data = exception.encode('utf-8', _TEXT_ERRORS)
+            exception_length = len(exception_data)
+        if message is None:
+            message_data = b''
+            message_length = _NO_STRING
+        else:
+            message_data = message.encode('utf-8', _TEXT_ERRORS)
+            message_length = len(message_data)
+        header = self._header.pack(
+            index, result.status.value, start_ns, duration_ns,
+            exception_length, message_length)
+        resources = result.resources
+        if resources is None:
+            resources_data = b''
+        else:
+            user_time, system_time, max_rss_delta, tracemalloc_peak = \
+                resources.to_tuple()
+            resources_data = self._resources.pack(
+                user_time,
+                float('nan') if system_time is None else system_time,
+                _NO_BYTES if max_rss_delta is None else max_rss_delta,
+                _NO_BYTES if tracemalloc_peak is None else tracemalloc_peak)
+        return b''.join(
+            (header, exception_data, message_data, resources_data))
+
+    def decode(self, data, test_cases):
+        header = self._header
+        (index, status, start_ns, duration_ns, exception_length,
+         message_length) = header.unpack_from(data)
+        offset = header.size
+        if exception_length == _NO_STRING:
+            exception = None
+        else:
+            end = offset + exception_length
+            exception = data[offset:end].decode('utf-8', _TEXT_ERRORS)
+            offset = end
+        if message_length == _NO_STRING:
+            message = None
+        else:
+            end = offset + message_length
+            message = data[offset:end].decode('utf-8', _TEXT_ERRORS)
+            offset = end
+        if offset < len(data):
+            user_time, system_time, max_rss_delta, tracemalloc_peak = \
+                self._resources.unpack_from(data, offset)
+            resources = (
+                user_time,
+                None if math.isnan(system_time) else system_time,
+                None if max_rss_delta == _NO_BYTES else max_rss_delta,
+                None if tracemalloc_peak == _NO_BYTES else tracemalloc_peak)
+        else:
+            resources = None
+        return _create_result(
+            test_cases[index], status, start_ns, duration_ns, exception,
+            message, resources)
+
+
+class MarshalResultCodec(ResultCodec):
+    """Encodes results as a tuple of primitive values using
+    :mod:`marshal`.
+
+    """
+
+    name = 'marshal'
+
+    def encode(self, index, result):
+        start_ns, duration_ns = _result_times(result)
+        return marshal.dumps((
+            index, result.status.value, start_ns, duration_ns,
+            result.exception, result.message, _result_resources(result)))
+
+    def decode(self, data, test_cases):
+        (index, status, start_ns, duration_ns, exception,
+         message, resources) = marshal.loads(data)
+        return _create_result(
+            test_cases[index], status, start_ns, duration_ns, exception,
+            message, resources)
+
+
+class PickleResultCodec(ResultCodec):
+    """Pickles the whole :class:`~haas.result.TestResult`.
+
+    """
+
+    name = 'pickle'
+
+    def encode(self, index, result):
+        return pickle.dumps(result, pickle.HIGHEST_PROTOCOL)
+
+    def decode(self, data, test_cases):
+        return pickle.loads(data)
+
+
+class ZlibResultCodec(StructResultCodec):
+    """Encodes results like the :class:`~.StructResultCodec`,
+    compressing records of at least :data:`COMPRESSION_THRESHOLD` bytes
+    with :mod:`zlib`.
+
+    """
+
+    name = 'zlib'
+
+    def encode(self, index, result):
+        data = super(ZlibResultCodec, self).encode(index, result)
+        if len(data) < COMPRESSION_THRESHOLD:
+            return _PLAIN + data
+        return _COMPRESSED + zlib.compress(data)
+
+    def decode(self, data, test_cases):
+        if data[:1] == _COMPRESSED:
+            data = zlib.decompress(data[1:])
+        else:
+            data = data[1:]
+        return super(ZlibResultCodec, self).decode(data, test_cases)
+
+
+RESULT_CODECS = dict(
+    (codec.name, codec)
+    for codec in (StructResultCodec, MarshalResultCodec, PickleResultCodec,
+                  ZlibResultCodec))
+
+DEFAULT_RESULT_CODEC = StructResultCodec.name
@@ -0,0 +1,210 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2013-2014 Simon Jagoe
+# All rights reserved.
+#
+# This software may be modified and distributed under the terms
+# of the 3-clause BSD license.  See the LICENSE.txt file for details.
+"""A ring buffer of records in shared memory, used to send test results
+from a worker process to the parent without a pipe.
+
+Each ring has one writer (the worker) and one reader (the parent).  The
+shared memory block starts with the total number of bytes written and
+read, followed by the ring of records.  A record is a one byte kind, a
+four byte length, a four byte checksum and the payload.  Payloads larger
+than a quarter of the ring are split into continuation records, so that
+large exception text never needs a ring of its own size.
+
+The writer publishes a record by storing the new write position after
+the record has been copied into the ring.  Python offers no memory
+barriers, and on CPUs with weakly ordered memory (such as ARM) the
+reader may see the new write position before the bytes of the record.
+The checksum of each record therefore covers its position in the stream
+of records as well as its kind, length and payload: a record that does
+not match its checksum (including the record of the previous lap around
+the ring) has not been published yet, and the reader stops there until
+its next read.  The reader only releases the space of records whose
+checksum it has verified.
+
+"""
+from __future__ import absolute_import, unicode_literals
+
+import struct
+import time
+import zlib
+
+from .result import _datetime_to_ns, _ns_to_datetime
+
+try:
+    from multiprocessing import shared_memory
+except ImportError:  # pragma: no cover
+    shared_memory = None
+
+#: The size in bytes of the ring of each worker.
+DEFAULT_RING_SIZE = 1024 * 1024
+
+#: The record kind of a test result encoded by a
+#: :class:`~haas.result_codec.ResultCodec`.
+RESULT_RECORD = b'R'
+
+#: The record kind of the start of a test (see :func:`encode_start`).
+START_RECORD = b'S'
+
+_CHUNK_RECORD = b'C'
+
+# Bytes written, bytes read and the capacity of the ring
+_HEADER = struct.Struct('<QQQ')
+_WRITE_OFFSET = 0
+_READ_OFFSET = 8
+_RECORD_HEADER = struct.Struct('<cII')
+# The kind, length and position of a record, covered by its checksum
+_CHECKED_HEADER = struct.Struct('<cIQ')
+_START = struct.Struct('<Iq')
+
+# How long the writer sleeps while the ring is full
+_FULL_WAIT = 0.001
+
+
+def _checksum(position, kind, payload):
+    checksum = zlib.crc32(_CHECKED_HEADER.pack(kind, len(payload), position))
+    return zlib.crc32(payload, checksum) & 0xffffffff
+
+
+def encode_start(index, start_time):
+    """Encode the start of the test at ``index`` in its batch.
+
+    """
+    return _START.pack(index, _datetime_to_ns(start_time))
+
+
+def decode_start(data):
+    """Decode the ``(index, start_time)`` encoded by
+    :func:`encode_start`.
+
+    """
+    index, start_ns = _START.unpack(data)
+    return index, _ns_to_datetime(start_ns)
+
+
+class ResultRing(object):
+    """A single-writer, single-reader ring buffer of ``(kind, payload)``
+    records in a :class:`multiprocessing.shared_memory.SharedMemory`
+    block.
+
+    Use :meth:`create` in the reading process and :meth:`attach` in the
+    writing process.
+
+    """
+
+    def __init__(self, memory):
+        self._memory = memory
+        self._buffer = memory.buf
+        _, _, self._capacity = _HEADER.unpack_from(self._buffer)
+        self._max_payload = self._capacity // 4 - _RECORD_HEADER.size
+        self._chunks = []
+
+    @classmethod
+    def create(cls, size=DEFAULT_RING_SIZE):
+        """Create a new, empty ring able to hold ``size`` bytes of
+        records.
+
+        """
+        memory = shared_memory.SharedMemory(
+            create=True, size=_HEADER.size + size)
+        _HEADER.pack_into(memory.buf, 0, 0, 0, size)
+        return cls(memory)
+
+    @classmethod
+    def attach(cls, name):
+        """Attach to the ring created with the name ``name``.
+
+        """
+        return cls(shared_memory.SharedMemory(name=name))
+
+    @property
+    def name(self):
+        return self._memory.name
+
+    def _position(self, offset):
+        return struct.unpack_from('<Q', self._buffer, offset)[0]
+
+    def _copy_in(self, position, data):
+        offset = position % self._capacity
+        first = min(len(data), self._capacity - offset)
+        start = _HEADER.size + offset
+        self._buffer[start:start + first] = data[:first]
+        if first < len(data):
+            rest = len(data) - first
+            self._buffer[_HEADER.size:_HEADER.size + rest] = data[first:]
+
+    def _copy_out(self, position, length):
+        offset = position % self._capacity
+        first = min(length, self._capacity - offset)
+        start = _HEADER.size + offset
+        data = bytes(self._buffer[start:start + first])
+        if first < length:
+            rest = length - first
+            data += bytes(self._buffer[_HEADER.size:_HEADER.size + rest])
+        return data
+
+    def _write_record(self, kind, payload):
+        size = _RECORD_HEADER.size + len(payload)
+        written = self._position(_WRITE_OFFSET)
+        while self._capacity - (written - self._position(_READ_OFFSET)) < \
+                size:
+            time.sleep(_FULL_WAIT)
+        self._copy_in(written, _RECORD_HEADER.pack(
+            kind, len(payload), _checksum(written, kind, payload)))
+        self._copy_in(written + _RECORD_HEADER.size, payload)
+        struct.pack_into('<Q', self._buffer, _WRITE_OFFSET, written + size)
+
+    def write(self, kind, payload):
+        """Append a record, waiting while the ring is full.
+
+        """
+        max_payload = self._max_payload
+        while len(payload) > max_payload:
+            self._write_record(_CHUNK_RECORD, payload[:max_payload])
+            payload = payload[max_payload:]
+        self._write_record(kind, payload)
+
+    def read(self):
+        """Return the ``(kind, payload)`` records written since the last
+        call, oldest first.
+
+        """
+        records = []
+        position = self._position(_READ_OFFSET)
+        written = self._position(_WRITE_OFFSET)
+        header_size = _RECORD_HEADER.size
+        while position < written:
+            kind, length, checksum = _RECORD_HEADER.unpack(
+                self._copy_out(position, header_size))
+            end = position + header_size + length
+            if end > written:
+                break
+            payload = self._copy_out(position + header_size, length)
+            if _checksum(position, kind, payload) != checksum:
+                # Not visible to this process yet
+                break
+            position = end
+            if kind == _CHUNK_RECORD:
+                self._chunks.append(payload)
+                continue
+            if self._chunks:
+                self._chunks.append(payload)
+                payload = b''.join(self._chunks)
+                self._chunks = []
+            records.append((kind, payload))
+        struct.pack_into('<Q', self._buffer, _READ_OFFSET, position)
+        return records
+
+    def close(self):
+        self._buffer = None
+        self._memory.close()
+
+    def unlink(self):
+        """Close the ring and free its shared memory.
+
+        """
+        self.close()
+        self._memory.unlink()
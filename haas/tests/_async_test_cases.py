@@ -0,0 +1,67 @@
+import asyncio
+import contextvars
+import unittest
+
+from haas.markers import concurrency_safe
+
+context_value = contextvars.ContextVar('context_value', default=None)
+
+
+@concurrency_safe
+class ConcurrentAsyncTests(unittest.IsolatedAsyncioTestCase):
+    """Two tests that only pass when they run at the same time on the same
+    event loop.  Each prints its name and fails, so that its captured
+    output is reported.
+
+    """
+
+    loops = []
+
+    @classmethod
+    def reset(cls):
+        cls.first_started = asyncio.Event()
+        cls.second_started = asyncio.Event()
+        cls.loops = []
+
+    async def asyncSetUp(self):
+        context_value.set(self._testMethodName)
+
+    async def test_first(self):
+        print('first')
+        self.loops.append(asyncio.get_running_loop())
+        self.first_started.set()
+        await asyncio.wait_for(self.second_started.wait(), 10)
+        self.assertEqual(context_value.get(), 'test_first')
+        self.fail('first failed')
+
+    async def test_second(self):
+        print('second')
+        self.loops.append(asyncio.get_running_loop())
+        self.second_started.set()
+        await asyncio.wait_for(self.first_started.wait(), 10)
+        self.assertEqual(context_value.get(), 'test_second')
+        self.fail('second failed')
+
+
+@concurrency_safe
+class CountingAsyncTests(unittest.IsolatedAsyncioTestCase):
+
+    @classmethod
+    def reset(cls):
+        cls.running = 0
+        cls.most_running = 0
+
+    async def _count(self):
+        cls = type(self)
+        cls.running += 1
+        cls.most_running = max(cls.most_running, cls.running)
+        await asyncio.sleep(0.05)
+        cls.running -= 1
+
+    test_0 = test_1 = test_2 = test_3 = _count
+
+
+class NotConcurrentAsyncTest(unittest.IsolatedAsyncioTestCase):
+
+    async def test_method(self):
+        await asyncio.sleep(0)
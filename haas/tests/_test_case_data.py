@@ -1,3 +1,9 @@
+import os
+import signal
+import threading
+import time
+
+from haas.markers import cpu_slots, resources, thread_safe
 from haas.testing import unittest
 from ..suite import TestSuite
 
@@ -38,3 +44,128 @@ class TestWithTwoErrors(unittest.TestCase):
 
     def tearDown(self):
         raise RuntimeError('An error in tearDown')
+
+
+class TestWithHang(unittest.TestCase):
+
+    def test_fast(self):
+        pass
+
+    def test_hang(self):
+        time.sleep(60)
+
+
+class TestWithCrash(unittest.TestCase):
+
+    def test_fast(self):
+        pass
+
+    def test_exit(self):
+        os._exit(3)
+
+    def test_killed(self):
+        os.kill(os.getpid(), signal.SIGTERM)
+
+
+class TestWithFdOutput(unittest.TestCase):
+
+    def test_fd_output(self):
+        os.write(1, b'Fd output')
+        self.fail('Check the captured output')
+
+
+class Unpicklable(object):
+
+    def __reduce__(self):
+        raise TypeError('Unpicklable')
+
+
+class TestUnpicklable(unittest.TestCase):
+
+    def __init__(self, methodName='runTest'):
+        super(TestUnpicklable, self).__init__(methodName)
+        self.unpicklable = Unpicklable()
+
+    def test_method(self):
+        pass
+
+
+def failing_initializer():
+    raise RuntimeError('Initializer failed')
+
+
+@thread_safe
+class ThreadSafeTests(unittest.TestCase):
+    """Two tests that only pass when they run at the same time.  Each
+    prints its name and fails, so that its captured output is reported.
+
+    """
+
+    first_started = threading.Event()
+    second_started = threading.Event()
+
+    @classmethod
+    def reset(cls):
+        cls.first_started.clear()
+        cls.second_started.clear()
+
+    def test_first(self):
+        print('first')
+        self.first_started.set()
+        self.assertTrue(self.second_started.wait(10))
+        self.fail('first failed')
+
+    def test_second(self):
+        print('second')
+        self.second_started.set()
+        self.assertTrue(self.first_started.wait(10))
+        self.fail('second failed')
+
+
+class NotThreadSafeTest(unittest.TestCase):
+
+    def test_method(self):
+        pass
+
+
+@resources('database')
+class DatabaseTests(unittest.TestCase):
+
+    def test_read(self):
+        pass
+
+    @resources('ports')
+    def test_write(self):
+        pass
+
+
+@cpu_slots(2)
+class HeavyTests(unittest.TestCase):
+
+    def test_method(self):
+        pass
+
+    @cpu_slots(4)
+    def test_heavier(self):
+        pass
+
+
+class TestCpuAffinity(unittest.TestCase):
+
+    def test_affinity(self):
+        self.fail(','.join(str(cpu) for cpu in
+                           sorted(os.sched_getaffinity(0))))
+
+
+_GLOBAL_STATE = []
+
+
+class GlobalStateTests(unittest.TestCase):
+
+    def test_first(self):
+        self.assertEqual(_GLOBAL_STATE, [])
+        _GLOBAL_STATE.append('first')
+
+    def test_second(self):
+        self.assertEqual(_GLOBAL_STATE, [])
+        _GLOBAL_STATE.append('second')
@@ -1,6 +1,10 @@
 from contextlib import contextmanager
 import sys
 
+from mock import patch
+
+from haas.result import _datetime_to_ns
+
 
 class ExcInfoFixture(object):
 
@@ -19,15 +23,40 @@ class ExcInfoFixture(object):
             yield sys.exc_info()
 
 
-class MockDateTime(object):
+class MockClock(object):
+    """Replaces the clocks used to time tests in :mod:`haas.result`.
+
+    Each reading of the monotonic clock returns the next of the given
+    datetimes; the wall clock returns the last value read.
+
+    """
+
     def __init__(self, ret):
         try:
             self.ret = iter(ret)
         except TypeError:
             self.ret = iter((ret,))
+        self._last = None
+        self._patchers = [
+            patch('haas.result._counter_ns', new=self.counter_ns),
+            patch('haas.result._wall_clock_ns', new=self.wall_clock_ns),
+        ]
 
-    def utcnow(self):
+    def counter_ns(self):
         try:
-            return next(self.ret)
+            self._last = _datetime_to_ns(next(self.ret))
         except StopIteration:
             raise ValueError('No more mock values!')
+        return self._last
+
+    def wall_clock_ns(self):
+        return self._last
+
+    def __enter__(self):
+        for patcher in self._patchers:
+            patcher.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        for patcher in reversed(self._patchers):
+            patcher.stop()
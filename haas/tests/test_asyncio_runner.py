@@ -0,0 +1,122 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2013-2014 Simon Jagoe
+# All rights reserved.
+#
+# This software may be modified and distributed under the terms
+# of the 3-clause BSD license.  See the LICENSE.txt file for details.
+from __future__ import absolute_import, unicode_literals
+
+from argparse import ArgumentParser
+import sys
+
+from mock import patch
+from six.moves import StringIO
+
+from ..plugins.worker_pool import ChildResultHandler
+from ..result import ResultCollector, TestCompletionStatus
+from ..suite import TestSuite
+from ..testing import unittest
+from . import _test_cases
+
+try:
+    from ..plugins.asyncio_runner import AsyncioTestRunner
+    from . import _async_test_cases
+except (ImportError, SyntaxError):  # pragma: no cover
+    AsyncioTestRunner = _async_test_cases = None
+
+
+@unittest.skipIf(sys.version_info < (3, 11),
+                 'Requires asyncio.Runner (Python 3.11)')
+class TestAsyncioTestRunner(unittest.TestCase):
+
+    def setUp(self):
+        _async_test_cases.ConcurrentAsyncTests.reset()
+
+    def _run(self, runner, test_suite):
+        result_handler = ChildResultHandler()
+        result_collector = ResultCollector()
+        result_collector.add_result_handler(result_handler)
+        with patch('sys.stdout', new=StringIO()):
+            runner.run(result_collector, test_suite)
+        return result_handler.results
+
+    def test_runs_concurrency_safe_tests_on_shared_loop(self):
+        # Given
+        test_suite = TestSuite([
+            _async_test_cases.NotConcurrentAsyncTest('test_method'),
+            _test_cases.TestCase('test_method'),
+            _async_test_cases.ConcurrentAsyncTests('test_first'),
+            _async_test_cases.ConcurrentAsyncTests('test_second'),
+        ])
+        runner = AsyncioTestRunner(concurrency=2)
+
+        # When
+        results = self._run(runner, test_suite)
+
+        # Then
+        self.assertEqual(
+            sorted(result.test_method_name for result in results[:2]),
+            ['test_first', 'test_second'])
+        self.assertEqual(
+            [(result.test_class, result.status) for result in results[2:]],
+            [(_async_test_cases.NotConcurrentAsyncTest,
+              TestCompletionStatus.success),
+             (_test_cases.TestCase, TestCompletionStatus.success)])
+        loops = _async_test_cases.ConcurrentAsyncTests.loops
+        self.assertEqual(len(loops), 2)
+        self.assertIs(loops[0], loops[1])
+        self.assertTrue(loops[0].is_closed())
+
+    def test_captures_output_and_context_per_test(self):
+        # Given
+        test_suite = TestSuite([
+            _async_test_cases.ConcurrentAsyncTests('test_first'),
+            _async_test_cases.ConcurrentAsyncTests('test_second'),
+        ])
+        runner = AsyncioTestRunner(concurrency=2)
+
+        # When
+        results = self._run(runner, test_suite)
+
+        # Then
+        by_name = dict(
+            (result.test_method_name, result) for result in results)
+        first = by_name['test_first']
+        second = by_name['test_second']
+        self.assertEqual(first.status, TestCompletionStatus.failure)
+        self.assertIn('first failed', first.exception)
+        self.assertIn('first\n', first.exception)
+        self.assertNotIn('second\n', first.exception)
+        self.assertIn('second failed', second.exception)
+        self.assertNotIn('first\n', second.exception)
+
+    def test_concurrency_limit(self):
+        # Given
+        _async_test_cases.CountingAsyncTests.reset()
+        test_suite = TestSuite([
+            _async_test_cases.CountingAsyncTests('test_{0}'.format(index))
+            for index in range(4)
+        ])
+        runner = AsyncioTestRunner(concurrency=2)
+
+        # When
+        results = self._run(runner, test_suite)
+
+        # Then
+        self.assertEqual(
+            [result.status for result in results],
+            [TestCompletionStatus.success] * 4)
+        self.assertEqual(_async_test_cases.CountingAsyncTests.most_running, 2)
+
+    def test_from_args(self):
+        # Given
+        parser = ArgumentParser()
+        AsyncioTestRunner.add_parser_arguments(
+            parser, '--runner-', 'runner_')
+        args = parser.parse_args(['--async-concurrency', '3'])
+
+        # When
+        runner = AsyncioTestRunner.from_args(args, 'runner_')
+
+        # Then
+        self.assertEqual(runner.thread_count, 3)
@@ -0,0 +1,275 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2013-2014 Simon Jagoe
+# All rights reserved.
+#
+# This software may be modified and distributed under the terms
+# of the 3-clause BSD license.  See the LICENSE.txt file for details.
+from __future__ import absolute_import, unicode_literals
+
+from argparse import ArgumentParser
+import multiprocessing
+import os
+import shutil
+import tempfile
+
+from mock import patch
+
+from ..exceptions import PluginError
+from ..plugins.distributed_runner import (
+    AuthenticationError, DistributedTestRunner, RemoteWorkerPool,
+    load_authkey, parse_address, run_agent_worker)
+from ..plugins.parallel_runner import ParallelTestRunner
+from ..resource_usage import ResourceMonitor
+from ..result import CAPTURE_FD, TestCompletionStatus
+from ..testing import unittest
+from . import _test_cases, _test_case_data
+from .test_worker_pool import _redirect_worker_output, _run_pool
+
+AUTHKEY = b'secret'
+
+
+def _start_agents(address, count):
+    agents = [
+        multiprocessing.Process(
+            target=run_agent_worker, args=(address, AUTHKEY, 10))
+        for _ in range(count)
+    ]
+    for agent in agents:
+        agent.start()
+    return agents
+
+
+class TestParseAddress(unittest.TestCase):
+
+    def test_parse_address(self):
+        self.assertEqual(parse_address('example.com:1234'),
+                         ('example.com', 1234))
+        self.assertEqual(parse_address('0.0.0.0'), ('0.0.0.0', 7461))
+        with self.assertRaises(ValueError):
+            parse_address('example.com:port')
+
+
+class TestLoadAuthkey(unittest.TestCase):
+
+    def setUp(self):
+        self.tempdir = tempfile.mkdtemp(prefix='haas-tests-')
+
+    def tearDown(self):
+        shutil.rmtree(self.tempdir)
+
+    def test_load_authkey_from_file(self):
+        # Given
+        path = os.path.join(self.tempdir, 'authkey')
+        with open(path, 'wb') as fh:
+            fh.write(b'from file\n')
+
+        # When
+        authkey = load_authkey(path)
+
+        # Then
+        self.assertEqual(authkey, b'from file')
+
+    def test_load_authkey_from_environment(self):
+        # When
+        with patch.dict(os.environ, {'HAAS_AUTHKEY': 'from env'}):
+            authkey = load_authkey()
+
+        # Then
+        self.assertEqual(authkey, b'from env')
+
+    def test_authkey_required(self):
+        # When/Then
+        with patch.dict(os.environ, {'HAAS_AUTHKEY': ''}):
+            with self.assertRaises(PluginError):
+                load_authkey()
+
+
+class TestRemoteWorkerPool(unittest.TestCase):
+
+    def setUp(self):
+        self.agents = []
+
+    def tearDown(self):
+        for agent in self.agents:
+            agent.join(10)
+            if agent.is_alive():
+                agent.terminate()
+
+    def _start_pool(self, pool, agent_count):
+        pool.start()
+        self.agents = _start_agents(pool.listening_address, agent_count)
+        # _run_pool starts the pool again
+        pool.start = lambda: None
+
+    def test_runs_tests_on_agents(self):
+        # Given
+        pool = RemoteWorkerPool(('127.0.0.1', 0), AUTHKEY, 2)
+        pool.submit([_test_cases.TestCase('test_method'),
+                     _test_case_data.TestWithTwoErrors(
+                         'test_with_two_errors')])
+        pool.submit([_test_case_data.TestCaseSubclass('test_method')])
+        self._start_pool(pool, 2)
+
+        # When
+        results = _run_pool(pool)
+
+        # Then
+        self.assertEqual(
+            sorted((result.test_class.__name__, result.status.name)
+                   for result in results),
+            [('TestCase', 'success'),
+             ('TestCaseSubclass', 'success'),
+             ('TestWithTwoErrors', 'error'),
+             ('TestWithTwoErrors', 'error')])
+
+    def test_lost_agent_requeues_test(self):
+        # Given
+        pool = RemoteWorkerPool(('127.0.0.1', 0), AUTHKEY, 3)
+        pool.submit([_test_case_data.TestWithCrash('test_exit'),
+                     _test_case_data.TestWithCrash('test_fast')])
+        self._start_pool(pool, 3)
+
+        # When
+        with patch('haas.plugins.worker_pool.logger'), \
+                patch('haas.plugins.distributed_runner.logger'):
+            results = _run_pool(pool)
+
+        # Then
+        by_name = dict(
+            (result.test_method_name, result) for result in results)
+        self.assertEqual(len(results), 2)
+        self.assertEqual(
+            by_name['test_exit'].status, TestCompletionStatus.error)
+        self.assertIn('lost its connection to the agent',
+                      by_name['test_exit'].exception)
+        self.assertEqual(
+            by_name['test_fast'].status, TestCompletionStatus.success)
+        self.assertEqual(pool._next_worker_id, 3)
+
+    def test_sends_settings_to_agents(self):
+        # Given
+        pool = RemoteWorkerPool(
+            ('127.0.0.1', 0), AUTHKEY, 1, capture=CAPTURE_FD,
+            resource_monitor=ResourceMonitor())
+        pool.submit([_test_case_data.TestWithFdOutput('test_fd_output')])
+
+        # When
+        with _redirect_worker_output():
+            self._start_pool(pool, 1)
+            result, = _run_pool(pool)
+
+        # Then
+        self.assertEqual(result.status, TestCompletionStatus.failure)
+        self.assertIn('Fd output', result.exception)
+        self.assertIsNotNone(result.resources)
+
+    def test_no_agent_connects(self):
+        # Given
+        pool = RemoteWorkerPool(
+            ('127.0.0.1', 0), AUTHKEY, 1, agent_timeout=0.2)
+        pool.submit([_test_cases.TestCase('test_method'),
+                     _test_case_data.TestCaseSubclass('test_method')])
+
+        # When
+        with patch('haas.plugins.distributed_runner.logger'):
+            results = _run_pool(pool, timeout=5)
+
+        # Then
+        self.assertEqual(len(results), 2)
+        for result in results:
+            self.assertEqual(result.status, TestCompletionStatus.error)
+            self.assertIn('No agent connected within 0.2 seconds',
+                          result.exception)
+
+    def test_agent_initializer_fails(self):
+        # Given
+        pool = RemoteWorkerPool(
+            ('127.0.0.1', 0), AUTHKEY, 1,
+            initializer=_test_case_data.failing_initializer,
+            agent_timeout=2)
+        pool.submit([_test_cases.TestCase('test_method')])
+        self._start_pool(pool, 1)
+
+        # When
+        with patch('haas.plugins.distributed_runner.logger') as logger:
+            result, = _run_pool(pool)
+
+        # Then
+        self.assertEqual(result.status, TestCompletionStatus.error)
+        self.assertIn('No agent connected', result.exception)
+        (message, worker_id, failure), _ = logger.warning.call_args_list[0]
+        self.assertIn('initializer failed', message)
+        self.assertIn('Initializer failed', failure)
+
+    def test_rejects_agent_with_wrong_key(self):
+        # Given
+        pool = RemoteWorkerPool(('127.0.0.1', 0), AUTHKEY, 1)
+        pool.start()
+
+        # When/Then
+        try:
+            with patch('haas.plugins.distributed_runner.logger'):
+                with self.assertRaises(AuthenticationError):
+                    run_agent_worker(pool.listening_address, b'wrong', 10)
+                pool.poll(0.1)
+            self.assertEqual(pool._workers, {})
+        finally:
+            pool.shutdown()
+
+
+class TestDistributedTestRunner(unittest.TestCase):
+
+    def test_from_args(self):
+        # Given
+        parser = ArgumentParser()
+        ParallelTestRunner.add_parser_arguments(
+            parser, '--runner-', 'runner_')
+        DistributedTestRunner.add_parser_arguments(
+            parser, '--runner-', 'runner_')
+        args = parser.parse_args(
+            ['--bind-address', '0.0.0.0:1234', '--processes', '8',
+             '--test-timeout', '30', '--agent-timeout', '60',
+             '--process-init',
+             'haas.tests._test_cases.subprocess_initializer'])
+
+        # When
+        with patch.dict(os.environ, {'HAAS_AUTHKEY': 'key'}):
+            runner = DistributedTestRunner.from_args(args, 'runner_')
+        pool = runner._create_pool(
+            8, capture_limit=100, resource_monitor=None, capture=CAPTURE_FD)
+
+        # Then
+        self.assertEqual(runner.bind_address, ('0.0.0.0', 1234))
+        self.assertEqual(runner.authkey, b'key')
+        self.assertEqual(runner.process_count, 8)
+        self.assertEqual(runner.agent_timeout, 60.0)
+        self.assertEqual(pool.address, ('0.0.0.0', 1234))
+        self.assertEqual(pool.agent_timeout, 60.0)
+        self.assertEqual(pool.capture_limit, 100)
+        self.assertEqual(pool.capture, CAPTURE_FD)
+        self.assertIs(pool.initializer, _test_cases.subprocess_initializer)
+        self.assertEqual(
+            pool.test_timeout(_test_cases.TestCase('test_method')), 30.0)
+
+    def test_from_args_rejects_local_process_options(self):
+        # Given
+        parser = ArgumentParser()
+        ParallelTestRunner.add_parser_arguments(
+            parser, '--runner-', 'runner_')
+        DistributedTestRunner.add_parser_arguments(
+            parser, '--runner-', 'runner_')
+        options = [
+            ['--process-max-tasks', '1'],
+            ['--process-max-rss', '1G'],
+            ['--pin-workers'],
+            ['--result-transport', 'shared-memory'],
+        ]
+
+        for option in options:
+            args = parser.parse_args(option)
+
+            # When/Then
+            with patch.dict(os.environ, {'HAAS_AUTHKEY': 'key'}):
+                with self.assertRaises(PluginError) as exc_context:
+                    DistributedTestRunner.from_args(args, 'runner_')
+            self.assertIn(option[0], str(exc_context.exception))
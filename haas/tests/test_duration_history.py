@@ -0,0 +1,165 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2013-2014 Simon Jagoe
+# All rights reserved.
+#
+# This software may be modified and distributed under the terms
+# of the 3-clause BSD license.  See the LICENSE.txt file for details.
+from __future__ import absolute_import, unicode_literals
+
+import json
+import os
+import shutil
+import sqlite3
+import tempfile
+
+from ..duration_history import DurationHistory
+from ..timing_history import TimingHistory
+from ..testing import unittest
+
+
+class TestDurationHistory(unittest.TestCase):
+
+    def setUp(self):
+        self.tempdir = tempfile.mkdtemp(prefix='haas-tests-')
+        self.path = os.path.join(self.tempdir, 'durations.json')
+
+    def tearDown(self):
+        shutil.rmtree(self.tempdir)
+
+    def test_record_and_estimate(self):
+        # Given
+        history = DurationHistory()
+
+        # When
+        history.record('a.B.test_c', 1.0)
+        history.record('a.B.test_c', 3.0)
+
+        # Then
+        self.assertEqual(len(history), 1)
+        self.assertIn('a.B.test_c', history)
+        self.assertEqual(history.samples('a.B.test_c'), [1.0, 3.0])
+        self.assertEqual(history.estimate('a.B.test_c'), 2.0)
+        self.assertIsNone(history.estimate('a.B.test_d'))
+
+    def test_max_samples(self):
+        # Given
+        history = DurationHistory(max_samples=2)
+
+        # When
+        for duration in (1.0, 2.0, 3.0):
+            history.record('a.B.test_c', duration)
+
+        # Then
+        self.assertEqual(history.samples('a.B.test_c'), [2.0, 3.0])
+
+    def test_save_and_load(self):
+        # Given
+        history = DurationHistory(self.path)
+        history.record('a.B.test_c', 1.5)
+
+        # When
+        history.save()
+        loaded = DurationHistory.load(self.path)
+
+        # Then
+        self.assertEqual(loaded.path, self.path)
+        self.assertEqual(loaded.samples('a.B.test_c'), [1.5])
+        self.assertEqual(os.listdir(self.tempdir), ['durations.json'])
+
+    def test_save_without_path(self):
+        # Given
+        history = DurationHistory()
+
+        # When/Then
+        with self.assertRaises(ValueError):
+            history.save()
+
+    def test_load_missing_file(self):
+        # When
+        history = DurationHistory.load(self.path)
+
+        # Then
+        self.assertEqual(len(history), 0)
+        self.assertEqual(history.path, self.path)
+
+    def test_load_corrupt_file(self):
+        # Given
+        with open(self.path, 'w') as fh:
+            fh.write('{not json')
+
+        # When
+        history = DurationHistory.load(self.path)
+
+        # Then
+        self.assertEqual(len(history), 0)
+
+    def test_load_unknown_version(self):
+        # Given
+        with open(self.path, 'w') as fh:
+            json.dump({'version': 0, 'durations': {'a.B.test_c': [1]}}, fh)
+
+        # When
+        history = DurationHistory.load(self.path)
+
+        # Then
+        self.assertEqual(len(history), 0)
+
+    def test_load_timing_history(self):
+        # Given
+        path = os.path.join(self.tempdir, 'timings.sqlite')
+        with TimingHistory(path) as timing_history:
+            for duration in (1.0, 2.0, 3.0, 4.0):
+                timing_history.start_run()
+                timing_history.record('a.B.test_c', 'success', duration)
+                timing_history.record('a.B.test_d', 'failure', duration)
+                timing_history.finish_run()
+
+        # When
+        history = DurationHistory.load(path, max_samples=3)
+
+        # Then
+        self.assertIsNone(history.path)
+        self.assertEqual(len(history), 1)
+        self.assertEqual(history.samples('a.B.test_c'), [2.0, 3.0, 4.0])
+        self.assertEqual(history.estimate('a.B.test_c'), 3.0)
+
+    def test_load_timing_history_read_only(self):
+        # Given
+        path = os.path.join(self.tempdir, 'timings.sqlite')
+        with TimingHistory(path) as timing_history:
+            timing_history.start_run()
+            timing_history.record('a.B.test_c', 'success', 1.0)
+            timing_history.finish_run()
+        # A version 1 database would be upgraded if opened for writing
+        connection = sqlite3.connect(path)
+        connection.execute('PRAGMA user_version = 1')
+        connection.close()
+        with open(path, 'rb') as fh:
+            contents = fh.read()
+
+        # When
+        history = DurationHistory.load(path)
+
+        # Then
+        self.assertEqual(history.samples('a.B.test_c'), [1.0])
+        with open(path, 'rb') as fh:
+            self.assertEqual(fh.read(), contents)
+        connection = sqlite3.connect(path)
+        try:
+            version, = connection.execute('PRAGMA user_version').fetchone()
+        finally:
+            connection.close()
+        self.assertEqual(version, 1)
+
+    def test_percentile(self):
+        # Given
+        history = DurationHistory()
+        for index in range(100):
+            history.record('test_{0}'.format(index), float(index))
+
+        # Then
+        self.assertEqual(history.percentile(0), 0.0)
+        self.assertEqual(history.percentile(50), 50.0)
+        self.assertEqual(history.percentile(99), 98.0)
+        self.assertEqual(history.percentile(100), 99.0)
+        self.assertIsNone(DurationHistory().percentile(99))
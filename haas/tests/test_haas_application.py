@@ -25,6 +25,7 @@ from ..haas_application import HaasApplication
 from ..loader import Loader
 from ..plugin_manager import PluginManager
 from ..plugins.discoverer import Discoverer
+from ..resource_usage import ResourceMonitor
 from ..suite import TestSuite
 from ..testing import unittest
 from ..utils import cd
@@ -227,6 +228,23 @@ class TestHaasApplication(unittest.TestCase):
         run.assert_called_once_with(result, suite)
         result.wasSuccessful.assert_called_once_with()
 
+    @with_patched_test_runner
+    def test_main_maxfail(self, runner_class, result_class, plugin_manager):
+        # When
+        with self._basic_test_fixture():
+            self._run_with_arguments(
+                runner_class, result_class, '--maxfail', '3',
+                plugin_manager=plugin_manager)
+
+        # Then
+        args = runner_class.from_args.call_args
+        args, kwargs = args
+        ns, dest = args
+        self.assertEqual(ns.maxfail, 3)
+        self.assertFalse(ns.failfast)
+        args, kwargs = result_class.call_args
+        self.assertEqual(kwargs['maxfail'], 3)
+
     @with_patched_test_runner
     def test_main_buffer(self, runner_class, result_class, plugin_manager):
         # When
@@ -248,6 +266,70 @@ class TestHaasApplication(unittest.TestCase):
         run.assert_called_once_with(result, suite)
         result.wasSuccessful.assert_called_once_with()
 
+    @with_patched_test_runner
+    def test_main_capture_fd(self, runner_class, result_class,
+                             plugin_manager):
+        # When
+        with self._basic_test_fixture():
+            self._run_with_arguments(
+                runner_class, result_class, '-b', '--capture', 'fd',
+                plugin_manager=plugin_manager)
+
+        # Then
+        args, kwargs = result_class.call_args
+        self.assertTrue(kwargs['buffer'])
+        self.assertEqual(kwargs['capture'], 'fd')
+
+    @with_patched_test_runner
+    def test_main_group_failures(self, runner_class, result_class,
+                                 plugin_manager):
+        # When
+        with self._basic_test_fixture():
+            self._run_with_arguments(
+                runner_class, result_class, '--group-failures',
+                plugin_manager=plugin_manager)
+
+        # Then
+        args, kwargs = runner_class.from_args.call_args
+        ns, dest = args
+        self.assertTrue(ns.group_failures)
+
+    @with_patched_test_runner
+    def test_main_streaming(self, runner_class, result_class,
+                            plugin_manager):
+        # When
+        with self._basic_test_fixture():
+            self._run_with_arguments(
+                runner_class, result_class, '--streaming',
+                plugin_manager=plugin_manager)
+
+        # Then
+        args, kwargs = result_class.call_args
+        self.assertTrue(kwargs['streaming'])
+
+    @with_patched_test_runner
+    def test_main_measure_resources(self, runner_class, result_class,
+                                    plugin_manager):
+        # When
+        with self._basic_test_fixture():
+            self._run_with_arguments(
+                runner_class, result_class, plugin_manager=plugin_manager)
+
+        # Then
+        args, kwargs = result_class.call_args
+        self.assertIsNone(kwargs['resource_monitor'])
+
+        # When
+        with self._basic_test_fixture():
+            self._run_with_arguments(
+                runner_class, result_class, '--trace-allocations',
+                plugin_manager=plugin_manager)
+
+        # Then
+        args, kwargs = result_class.call_args
+        self.assertIsInstance(kwargs['resource_monitor'], ResourceMonitor)
+        self.assertTrue(kwargs['resource_monitor'].trace_allocations)
+
     @patch('logging.getLogger')
     @with_patched_test_runner
     def test_with_logging(self, get_logger, runner_class, result_class,
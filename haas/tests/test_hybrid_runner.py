@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2013-2014 Simon Jagoe
+# All rights reserved.
+#
+# This software may be modified and distributed under the terms
+# of the 3-clause BSD license.  See the LICENSE.txt file for details.
+from __future__ import absolute_import, unicode_literals
+
+from argparse import ArgumentParser
+
+from mock import patch
+
+from ..duration_history import DurationHistory
+from ..plugins.hybrid_runner import HybridTestRunner
+from ..plugins.parallel_runner import ParallelTestRunner
+from ..plugins.worker_pool import ChildResultHandler
+from ..result import ResultCollector, TestCompletionStatus
+from ..suite import TestSuite
+from ..testing import unittest
+from . import _test_cases, _test_case_data
+from .test_parallel_runner import create_pool
+
+
+class TestHybridTestRunner(unittest.TestCase):
+
+    def setUp(self):
+        self.fast = _test_cases.TestCase('test_method')
+        self.slow = _test_cases.PythonTestCase('test_method')
+        self.unknown = _test_case_data.TestCaseSubclass('test_method')
+        self.uses_resource = _test_case_data.DatabaseTests('test_read')
+        self.history = DurationHistory()
+        self.history.record(self.fast.id(), 0.001)
+        self.history.record(self.slow.id(), 2.0)
+        self.history.record(self.uses_resource.id(), 0.001)
+
+    def test_from_args(self):
+        # Given
+        parser = ArgumentParser()
+        ParallelTestRunner.add_parser_arguments(
+            parser, '--runner-', 'runner_')
+        HybridTestRunner.add_parser_arguments(
+            parser, '--runner-', 'runner_')
+        args = parser.parse_args(
+            ['--fast-threshold', '0.5', '--processes', '3'])
+
+        # When
+        runner = HybridTestRunner.from_args(args, 'runner_')
+
+        # Then
+        self.assertEqual(runner.fast_threshold, 0.5)
+        self.assertEqual(runner.process_count, 3)
+
+    def test_classifies_tests_by_recorded_duration(self):
+        # Given
+        runner = HybridTestRunner(duration_history=self.history)
+
+        # When/Then
+        self.assertTrue(runner._runs_in_process(self.fast))
+        self.assertFalse(runner._runs_in_process(self.slow))
+        self.assertFalse(runner._runs_in_process(self.unknown))
+        self.assertFalse(runner._runs_in_process(self.uses_resource))
+
+    def test_no_duration_history(self):
+        # Given
+        runner = HybridTestRunner()
+
+        # When/Then
+        self.assertFalse(runner._runs_in_process(self.fast))
+
+    @patch('haas.plugins.parallel_runner.WorkerPool')
+    def test_fast_tests_run_in_process(self, pool_class):
+        # Given
+        pool = create_pool(pool_class)
+        test_suite = TestSuite([self.slow, self.fast, self.unknown])
+        result_handler = ChildResultHandler()
+        result_collector = ResultCollector()
+        result_collector.add_result_handler(result_handler)
+        runner = HybridTestRunner(
+            process_count=2, duration_history=self.history)
+
+        # When
+        runner.run(result_collector, test_suite)
+
+        # Then
+        self.assertEqual(pool.submitted, [[self.unknown], [self.slow]])
+        self.assertEqual(
+            sorted(result.test_class.__name__
+                   for result in result_handler.results),
+            ['PythonTestCase', 'TestCase', 'TestCaseSubclass'])
+        self.assertTrue(all(
+            result.status == TestCompletionStatus.success
+            for result in result_handler.results))
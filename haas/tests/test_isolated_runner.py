@@ -0,0 +1,124 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2013-2014 Simon Jagoe
+# All rights reserved.
+#
+# This software may be modified and distributed under the terms
+# of the 3-clause BSD license.  See the LICENSE.txt file for details.
+from __future__ import absolute_import, unicode_literals
+
+from argparse import ArgumentParser
+import os
+
+from ..plugins.isolated_runner import (
+    ISOLATE_CLASS, ISOLATE_TEST, IsolatedTestRunner, _group_tests)
+from ..plugins.worker_pool import ChildResultHandler
+from ..result import ResultCollector, TestCompletionStatus
+from ..suite import TestSuite
+from ..testing import unittest
+from . import _test_cases, _test_case_data
+
+
+def _run(runner, tests, **kwargs):
+    result_handler = ChildResultHandler()
+    result_collector = ResultCollector(**kwargs)
+    result_collector.add_result_handler(result_handler)
+    runner.run(result_collector, TestSuite(tests))
+    return result_collector, [
+        (result.test_method_name, result.status)
+        for result in result_handler.results]
+
+
+class TestGroupTests(unittest.TestCase):
+
+    def test_group_by_test_or_class(self):
+        # Given
+        first = _test_case_data.GlobalStateTests('test_first')
+        other = _test_cases.TestCase('test_method')
+        second = _test_case_data.GlobalStateTests('test_second')
+        tests = [first, other, second]
+
+        # When/Then
+        self.assertEqual(_group_tests(tests, ISOLATE_TEST),
+                         [[first], [other], [second]])
+        self.assertEqual(_group_tests(tests, ISOLATE_CLASS),
+                         [[first, second], [other]])
+
+
+@unittest.skipUnless(hasattr(os, 'fork'), 'os.fork is not available')
+class TestIsolatedTestRunner(unittest.TestCase):
+
+    def test_from_args(self):
+        # Given
+        parser = ArgumentParser()
+        IsolatedTestRunner.add_parser_arguments(
+            parser, '--runner-', 'runner_')
+        args = parser.parse_args(['--forks', '3', '--isolate', 'class'])
+
+        # When
+        runner = IsolatedTestRunner.from_args(args, 'runner_')
+
+        # Then
+        self.assertEqual(runner.fork_count, 3)
+        self.assertEqual(runner.isolation, ISOLATE_CLASS)
+
+    def test_tests_do_not_share_global_state(self):
+        # Given
+        tests = [_test_case_data.GlobalStateTests('test_first'),
+                 _test_case_data.GlobalStateTests('test_second')]
+
+        # When
+        result_collector, results = _run(IsolatedTestRunner(fork_count=2),
+                                         tests)
+
+        # Then
+        self.assertEqual(sorted(results), [
+            ('test_first', TestCompletionStatus.success),
+            ('test_second', TestCompletionStatus.success),
+        ])
+        self.assertTrue(result_collector.wasSuccessful())
+        self.assertEqual(_test_case_data._GLOBAL_STATE, [])
+
+    def test_tests_of_a_class_share_a_process(self):
+        # Given
+        tests = [_test_case_data.GlobalStateTests('test_first'),
+                 _test_case_data.GlobalStateTests('test_second')]
+        runner = IsolatedTestRunner(isolation=ISOLATE_CLASS)
+
+        # When
+        result_collector, results = _run(runner, tests)
+
+        # Then
+        self.assertEqual(results, [
+            ('test_first', TestCompletionStatus.success),
+            ('test_second', TestCompletionStatus.failure),
+        ])
+
+    def test_crashed_process(self):
+        # Given
+        tests = [_test_case_data.TestWithCrash('test_exit'),
+                 _test_case_data.TestWithCrash('test_fast')]
+        runner = IsolatedTestRunner(isolation=ISOLATE_CLASS)
+
+        # When
+        result_collector, results = _run(runner, tests)
+
+        # Then
+        self.assertEqual(results, [
+            ('test_exit', TestCompletionStatus.error),
+            ('test_fast', TestCompletionStatus.success),
+        ])
+
+    def test_stops_on_failfast(self):
+        # Given
+        tests = [_test_case_data.TestWithTwoErrors('test_with_two_errors'),
+                 _test_cases.TestCase('test_method'),
+                 _test_cases.TestCase('test_method')]
+        runner = IsolatedTestRunner(fork_count=1)
+
+        # When
+        result_collector, results = _run(runner, tests, failfast=True)
+
+        # Then
+        self.assertTrue(result_collector.shouldStop)
+        self.assertNotIn(('test_method', TestCompletionStatus.success),
+                         results)
@@ -0,0 +1,41 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2013-2014 Simon Jagoe
+# All rights reserved.
+#
+# This software may be modified and distributed under the terms
+# of the 3-clause BSD license.  See the LICENSE.txt file for details.
+from __future__ import absolute_import, unicode_literals
+
+from ..markers import cpu_slots, get_cpu_slots, get_resources
+from ..testing import unittest
+from . import _test_cases, _test_case_data
+
+
+class TestResourceMarkers(unittest.TestCase):
+
+    def test_resources(self):
+        # Given
+        read = _test_case_data.DatabaseTests('test_read')
+        write = _test_case_data.DatabaseTests('test_write')
+
+        # Then
+        self.assertEqual(get_resources(read), frozenset(['database']))
+        self.assertEqual(
+            get_resources(write), frozenset(['database', 'ports']))
+        self.assertEqual(
+            get_resources(_test_cases.TestCase('test_method')), frozenset())
+
+    def test_cpu_slots(self):
+        # Given
+        heavy = _test_case_data.HeavyTests('test_method')
+        heavier = _test_case_data.HeavyTests('test_heavier')
+
+        # Then
+        self.assertEqual(get_cpu_slots(heavy), 2)
+        self.assertEqual(get_cpu_slots(heavier), 4)
+        self.assertEqual(
+            get_cpu_slots(_test_cases.TestCase('test_method')), 1)
+
+    def test_invalid_cpu_slots(self):
+        with self.assertRaises(ValueError):
+            cpu_slots(0)
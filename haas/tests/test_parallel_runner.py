@@ -1,38 +1,106 @@
 from argparse import ArgumentParser
 from datetime import datetime, timedelta
+import os
+import shutil
+import tempfile
 import time
 
 from mock import Mock, patch
 from six.moves import StringIO
 
+from ..duration_history import DurationHistory
 from ..plugins.discoverer import _create_import_error_test
-from ..plugins.parallel_runner import ChildResultHandler, ParallelTestRunner
+from ..plugins.parallel_runner import (
+    ChildResultHandler, ParallelTestRunner, _run_test_in_process,
+    _schedule_tasks, default_process_count)
 from ..result import (
-    ResultCollector, TestCompletionStatus, TestResult, TestDuration)
+    CAPTURE_FD, ResultCollector, TestCompletionStatus, TestResult,
+    TestDuration)
+from ..plugins.worker_pool import WorkerMemoryUsage
 from ..suite import TestSuite
 from ..testing import unittest
-from . import _test_cases
-from .fixtures import MockDateTime
+from . import _test_cases, _test_case_data
+from .fixtures import MockClock
 
 
-class AsyncResult(object):
+class FakeWorkerPool(object):
+    """A stand-in for :class:`~haas.plugins.worker_pool.WorkerPool` that
+    runs each submitted task in this process when polled.
 
-    def ready(self):
-        return True
+    """
 
-    def wait(self, timeout):
-        pass
+    def __init__(self):
+        self.submitted = []
+        self.tasks = []
+        self.started = False
+        self.shut_down = False
+        self.cancelled = False
+        self.terminated = None
+        self.memory_usage = {}
 
+    def submit(self, test_cases):
+        self.submitted.append(list(test_cases))
+        self.tasks.append(list(test_cases))
 
-def apply_async(func, args=None, kwargs=None, callback=None):
-    if args is None:
-        args = ()
-    if kwargs is None:
-        kwargs = {}
-    result = func(*args, **kwargs)
-    if callback is not None:
-        callback(result)
-    return AsyncResult()
+    def start(self):
+        self.started = True
+
+    @property
+    def has_work(self):
+        return len(self.tasks) > 0
+
+    def poll(self, timeout):
+        results = []
+        for test_case in self.tasks.pop(0):
+            results.extend(_run_test_in_process(test_case))
+        return results
+
+    def terminate(self, reason):
+        self.terminated = reason
+        del self.tasks[:]
+        return []
+
+    def cancel(self):
+        self.cancelled = True
+        del self.tasks[:]
+
+    def shutdown(self):
+        self.shut_down = True
+
+
+def _error_result(test_case, message):
+    now = datetime.utcnow()
+    return TestResult(
+        type(test_case), test_case._testMethodName,
+        TestCompletionStatus.error, TestDuration(now, now),
+        exception=message)
+
+
+class FailingWorkerPool(FakeWorkerPool):
+    """A :class:`~.FakeWorkerPool` whose workers are lost, reporting
+    each test as an error.
+
+    """
+
+    def poll(self, timeout):
+        return [
+            _error_result(test_case, 'The worker process exited')
+            for test_case in self.tasks.pop(0)]
+
+    def terminate(self, reason):
+        message = '{0}; the test was not run.\n'.format(reason)
+        results = [
+            _error_result(test_case, message)
+            for task in self.tasks for test_case in task]
+        super(FailingWorkerPool, self).terminate(reason)
+        return results
+
+
+def create_pool(pool_class, pool=None):
+    if pool is None:
+        pool = FakeWorkerPool()
+    pool_class.return_value = pool
+    return pool
 
 
 class TestChildResultHandler(unittest.TestCase):
@@ -82,15 +150,29 @@ class TestChildResultHandler(unittest.TestCase):
         self.assertEqual(stdout.getvalue(), '')
         self.assertEqual(stderr.getvalue(), '')
 
+    def test_stream_results_to_queue(self):
+        # Given
+        result_queue = Mock()
+        handler = ChildResultHandler(result_queue, task_id=3)
+        test_result = object()
+
+        # When
+        handler.start_test_run()
+        handler(test_result)
+        handler.stop_test_run()
+
+        # Then
+        result_queue.put.assert_called_once_with(
+            ('result', 3, test_result))
+        self.assertEqual(handler.results, [])
+
 
 class TestParallelTestRunner(unittest.TestCase):
 
-    @patch('haas.plugins.parallel_runner.Pool')
+    @patch('haas.plugins.parallel_runner.WorkerPool')
     def test_parallel_test_runner_mock_subprocess(self, pool_class):
         # Given
-        pool = Mock()
-        pool_class.return_value = pool
-        pool.apply_async.side_effect = apply_async
+        pool = create_pool(pool_class)
 
         test_case = _test_cases.TestCase('test_method')
         test_suite = TestSuite([test_case])
@@ -111,24 +193,25 @@ class TestParallelTestRunner(unittest.TestCase):
         runner = ParallelTestRunner(processes)
 
         # When
-        with patch('haas.result.datetime', new=MockDateTime(
-                [start_time, end_time])):
+        with MockClock([start_time, end_time]):
             runner.run(result_collector, test_suite)
 
         # Then
         self.assertEqual(result_handler.results, [expected_result])
         pool_class.assert_called_once_with(
-            processes=processes, initializer=None,
-            maxtasksperchild=None)
-        pool.close.assert_called_once_with()
-        pool.join.assert_called_once_with()
-
-    @patch('haas.plugins.parallel_runner.Pool')
+            processes, initializer=None, maxtasksperchild=None,
+            test_timeout=None, result_codec='struct',
+            pin_workers=False, max_rss=None,
+            result_transport='pipe',
+            capture_limit=result_collector.capture_limit,
+            resource_monitor=result_collector.resource_monitor,
+            capture=result_collector.capture)
+        self.assertTrue(pool.shut_down)
+
+    @patch('haas.plugins.parallel_runner.WorkerPool')
     def test_parallel_runner_single_start_stop_test_run(self, pool_class):
         # Given
-        pool = Mock()
-        pool_class.return_value = pool
-        pool.apply_async.side_effect = apply_async
+        pool = create_pool(pool_class)
 
         test_case = _test_cases.TestCase('test_method')
         test_suite = TestSuite([test_case])
@@ -141,20 +224,22 @@ class TestParallelTestRunner(unittest.TestCase):
 
         # Then
         pool_class.assert_called_once_with(
-            processes=None, initializer=None,
-            maxtasksperchild=None)
-        pool.close.assert_called_once_with()
-        pool.join.assert_called_once_with()
+            default_process_count(), initializer=None, maxtasksperchild=None,
+            test_timeout=None, result_codec='struct',
+            pin_workers=False, max_rss=None,
+            result_transport='pipe',
+            capture_limit=result_collector.capture_limit,
+            resource_monitor=result_collector.resource_monitor,
+            capture=result_collector.capture)
+        self.assertTrue(pool.shut_down)
         result_collector.startTestRun.assert_called_once_with()
         result_collector.stopTestRun.assert_called_once_with()
 
-    @patch('haas.plugins.parallel_runner.Pool')
+    @patch('haas.plugins.parallel_runner.WorkerPool')
     def test_parallel_runner_initializer(self, pool_class):
         # Given
         initializer = Mock()
-        pool = Mock()
-        pool_class.return_value = pool
-        pool.apply_async.side_effect = apply_async
+        pool = create_pool(pool_class)
 
         test_case = _test_cases.TestCase('test_method')
         test_suite = TestSuite([test_case])
@@ -175,24 +260,25 @@ class TestParallelTestRunner(unittest.TestCase):
         runner = ParallelTestRunner(processes, initializer=initializer)
 
         # When
-        with patch('haas.result.datetime', new=MockDateTime(
-                [start_time, end_time])):
+        with MockClock([start_time, end_time]):
             runner.run(result_collector, test_suite)
 
         # Then
         self.assertEqual(result_handler.results, [expected_result])
         pool_class.assert_called_once_with(
-            processes=processes, initializer=initializer,
-            maxtasksperchild=None)
-        pool.close.assert_called_once_with()
-        pool.join.assert_called_once_with()
-
-    @patch('haas.plugins.parallel_runner.Pool')
+            processes, initializer=initializer, maxtasksperchild=None,
+            test_timeout=None, result_codec='struct',
+            pin_workers=False, max_rss=None,
+            result_transport='pipe',
+            capture_limit=result_collector.capture_limit,
+            resource_monitor=result_collector.resource_monitor,
+            capture=result_collector.capture)
+        self.assertTrue(pool.shut_down)
+
+    @patch('haas.plugins.parallel_runner.WorkerPool')
     def test_parallel_runner_constructor_processes(self, pool_class):
         # Given
-        pool = Mock()
-        pool_class.return_value = pool
-        pool.apply_async.side_effect = apply_async
+        pool = create_pool(pool_class)
 
         test_case = _test_cases.TestCase('test_method')
         test_suite = TestSuite([test_case])
@@ -219,23 +305,25 @@ class TestParallelTestRunner(unittest.TestCase):
         runner = ParallelTestRunner.from_args(args, dest_prefix)
 
         # When
-        with patch('haas.result.datetime', new=MockDateTime(
-                [start_time, end_time])):
+        with MockClock([start_time, end_time]):
             runner.run(result_collector, test_suite)
 
         # Then
         self.assertEqual(result_handler.results, [expected_result])
         pool_class.assert_called_once_with(
-            processes=4, initializer=None, maxtasksperchild=1)
-        pool.close.assert_called_once_with()
-        pool.join.assert_called_once_with()
-
-    @patch('haas.plugins.parallel_runner.Pool')
+            4, initializer=None, maxtasksperchild=1,
+            test_timeout=None, result_codec='struct',
+            pin_workers=False, max_rss=None,
+            result_transport='pipe',
+            capture_limit=result_collector.capture_limit,
+            resource_monitor=result_collector.resource_monitor,
+            capture=result_collector.capture)
+        self.assertTrue(pool.shut_down)
+
+    @patch('haas.plugins.parallel_runner.WorkerPool')
     def test_parallel_runner_constructor_initializer(self, pool_class):
         # Given
-        pool = Mock()
-        pool_class.return_value = pool
-        pool.apply_async.side_effect = apply_async
+        pool = create_pool(pool_class)
 
         test_case = _test_cases.TestCase('test_method')
         test_suite = TestSuite([test_case])
@@ -263,8 +351,7 @@ class TestParallelTestRunner(unittest.TestCase):
         runner = ParallelTestRunner.from_args(args, dest_prefix)
 
         # When
-        with patch('haas.result.datetime', new=MockDateTime(
-                [start_time, end_time])):
+        with MockClock([start_time, end_time]):
             runner.run(result_collector, test_suite)
 
         # Then
@@ -272,19 +359,71 @@ class TestParallelTestRunner(unittest.TestCase):
 
         self.assertEqual(result_handler.results, [expected_result])
         pool_class.assert_called_once_with(
-            processes=None, initializer=subprocess_initializer,
-            maxtasksperchild=None)
-        pool.close.assert_called_once_with()
-        pool.join.assert_called_once_with()
+            default_process_count(), initializer=subprocess_initializer,
+            maxtasksperchild=None, test_timeout=None, result_codec='struct',
+            pin_workers=False, max_rss=None,
+            result_transport='pipe',
+            capture_limit=result_collector.capture_limit,
+            resource_monitor=result_collector.resource_monitor,
+            capture=result_collector.capture)
+        self.assertTrue(pool.shut_down)
+
+    def test_parallel_runner_streams_results(self):
+        # Given
+        test_cases = [_test_cases.TestCase('test_method'),
+                      _test_cases.PythonTestCase('test_method')]
+        test_suite = TestSuite(test_cases)
+
+        result_handler = ChildResultHandler()
+        result_collector = ResultCollector()
+        result_collector.add_result_handler(result_handler)
+        runner = ParallelTestRunner(2)
+
+        # When
+        runner.run(result_collector, test_suite)
+
+        # Then
+        self.assertEqual(result_collector.testsRun, 2)
+        self.assertTrue(result_collector.wasSuccessful())
+        self.assertEqual(
+            sorted(result.test_class.__name__
+                   for result in result_handler.results),
+            ['PythonTestCase', 'TestCase'])
+
+    @patch('haas.plugins.parallel_runner.WorkerPool')
+    def test_parallel_runner_failed_task(self, pool_class):
+        # Given
+        pool = create_pool(pool_class, FailingWorkerPool())
+        test_suite = TestSuite([_test_cases.TestCase('test_method'),
+                                _test_cases.PythonTestCase('test_method')])
+        result_handler = ChildResultHandler()
+        result_collector = ResultCollector()
+        result_collector.add_result_handler(result_handler)
+        runner = ParallelTestRunner(process_count=1, run_timeout=0)
+
+        # When
+        runner.run(result_collector, test_suite)
+
+        # Then
+        self.assertEqual(result_collector.testsRun, 2)
+        self.assertFalse(result_collector.wasSuccessful())
+        self.assertEqual(
+            sorted((result.test_class.__name__, result.status.name,
+                    result.exception)
+                   for result in result_handler.results),
+            [('PythonTestCase', 'error', 'Test run timed out after 0 '
+              'seconds; the test was not run.\n'),
+             ('TestCase', 'error', 'The worker process exited')])
+        self.assertEqual(pool.terminated, 'Test run timed out after 0 seconds')
+        self.assertTrue(pool.shut_down)
 
 
 class TestParallelRunnerImportError(unittest.TestCase):
 
-    @patch('haas.plugins.parallel_runner.Pool')
+    @patch('haas.plugins.parallel_runner.WorkerPool')
     def test_parallel_distribute_module_import_error(self, pool_class):
         # Given
-        pool = Mock()
-        pool_class.return_value = pool
+        pool = create_pool(pool_class)
 
         try:
             import haas.i_dont_exist  # noqa
@@ -311,4 +450,401 @@ class TestParallelRunnerImportError(unittest.TestCase):
 
         self.assertEqual(result_collector.testsRun, 1)
         self.assertFalse(result_collector.wasSuccessful())
-        self.assertFalse(pool.apply_async.called)
+        self.assertEqual(pool.submitted, [])
+
+
+class _NamedTest(object):
+
+    def __init__(self, test_id):
+        self.test_id = test_id
+
+    def id(self):
+        return self.test_id
+
+    def __repr__(self):
+        return '<_NamedTest {0}>'.format(self.test_id)
+
+
+class TestScheduleTasks(unittest.TestCase):
+
+    def test_no_history_keeps_discovery_order(self):
+        # Given
+        tests = [_NamedTest(name) for name in 'abc']
+
+        # When
+        tasks = _schedule_tasks(tests, None, 2)
+
+        # Then
+        self.assertEqual(tasks, [[test] for test in tests])
+
+    def test_empty_history_keeps_discovery_order(self):
+        # Given
+        tests = [_NamedTest(name) for name in 'abc']
+
+        # When
+        tasks = _schedule_tasks(tests, DurationHistory(), 2)
+
+        # Then
+        self.assertEqual(tasks, [[test] for test in tests])
+
+    def test_longest_first(self):
+        # Given
+        a, b, c = tests = [_NamedTest(name) for name in 'abc']
+        history = DurationHistory()
+        history.record('a', 1.0)
+        history.record('b', 10.0)
+        history.record('c', 5.0)
+
+        # When
+        tasks = _schedule_tasks(tests, history, 2)
+
+        # Then
+        self.assertEqual(tasks, [[b], [c], [a]])
+
+    def test_unknown_tests_first(self):
+        # Given
+        a, b, c = tests = [_NamedTest(name) for name in 'abc']
+        history = DurationHistory()
+        history.record('a', 1.0)
+        history.record('c', 5.0)
+
+        # When
+        tasks = _schedule_tasks(tests, history, 2)
+
+        # Then
+        self.assertEqual(tasks, [[b], [c], [a]])
+
+    def test_short_tests_batched_with_small_tail(self):
+        # Given
+        slow = _NamedTest('slow')
+        fast = [_NamedTest('fast{0:02d}'.format(i)) for i in range(40)]
+        history = DurationHistory()
+        history.record('slow', 40.0)
+        for test in fast:
+            history.record(test.id(), 1.0)
+
+        # When
+        tasks = _schedule_tasks(fast + [slow], history, 2)
+
+        # Then
+        self.assertEqual(tasks[0], [slow])
+        scheduled = [test for task in tasks for test in task]
+        self.assertEqual(scheduled, [slow] + fast)
+        sizes = [len(task) for task in tasks[1:]]
+        self.assertGreater(sizes[0], 1)
+        self.assertEqual(sizes, sorted(sizes, reverse=True))
+        self.assertEqual(sizes[-1], 1)
+
+    def test_constrained_tests_not_batched(self):
+        # Given
+        database = _test_case_data.DatabaseTests('test_read')
+        heavy = _test_case_data.HeavyTests('test_method')
+        fast = [_NamedTest('fast{0:02d}'.format(i)) for i in range(10)]
+        history = DurationHistory()
+        history.record(database.id(), 5.0)
+        history.record(heavy.id(), 4.0)
+        for test in fast:
+            history.record(test.id(), 1.0)
+
+        # When
+        tasks = _schedule_tasks(fast + [database, heavy], history, 2)
+
+        # Then
+        self.assertEqual(tasks[:2], [[database], [heavy]])
+        self.assertEqual(
+            [test for task in tasks[2:] for test in task], fast)
+        self.assertGreater(len(tasks[2]), 1)
+
+
+class TestParallelRunnerDurationHistory(unittest.TestCase):
+
+    @patch('haas.plugins.parallel_runner.WorkerPool')
+    def test_records_durations_and_runs_longest_first(self, pool_class):
+        # Given
+        pool = create_pool(pool_class)
+
+        fast = _test_cases.TestCase('test_method')
+        slow = _test_cases.PythonTestCase('test_method')
+        test_suite = TestSuite([fast, slow])
+
+        history = DurationHistory()
+        history.record(fast.id(), 1.0)
+        history.record(slow.id(), 20.0)
+
+        result_collector = ResultCollector()
+        runner = ParallelTestRunner(2, duration_history=history)
+
+        # When
+        runner.run(result_collector, test_suite)
+
+        # Then
+        self.assertEqual(pool.submitted, [[slow], [fast]])
+        self.assertEqual(len(history.samples(fast.id())), 2)
+        self.assertEqual(len(history.samples(slow.id())), 2)
+
+    @patch('haas.plugins.parallel_runner.WorkerPool')
+    def test_history_saved_from_args(self, pool_class):
+        # Given
+        create_pool(pool_class)
+
+        test_case = _test_cases.TestCase('test_method')
+        test_suite = TestSuite([test_case])
+
+        tempdir = tempfile.mkdtemp(prefix='haas-tests-')
+        self.addCleanup(shutil.rmtree, tempdir)
+        path = os.path.join(tempdir, 'durations.json')
+
+        parser = ArgumentParser()
+        ParallelTestRunner.add_parser_arguments(
+            parser, '--parallel-', 'parallel_')
+        args = parser.parse_args(['--duration-history', path])
+        runner = ParallelTestRunner.from_args(args, 'parallel_')
+
+        # When
+        runner.run(ResultCollector(), test_suite)
+
+        # Then
+        history = DurationHistory.load(path)
+        self.assertEqual(len(history.samples(test_case.id())), 1)
+
+
+class TestParallelRunnerTimeouts(unittest.TestCase):
+
+    def test_no_test_timeout(self):
+        # Given
+        runner = ParallelTestRunner()
+
+        # Then
+        self.assertIsNone(runner._get_test_timeout())
+
+    def test_fixed_test_timeout(self):
+        # Given
+        parser = ArgumentParser()
+        ParallelTestRunner.add_parser_arguments(
+            parser, '--parallel-', 'parallel_')
+        args = parser.parse_args(['--test-timeout', '2.5',
+                                  '--run-timeout', '60'])
+        runner = ParallelTestRunner.from_args(args, 'parallel_')
+
+        # When
+        test_timeout = runner._get_test_timeout()
+
+        # Then
+        self.assertEqual(runner.run_timeout, 60.0)
+        self.assertEqual(
+            test_timeout(_test_cases.TestCase('test_method')), 2.5)
+
+    def test_adaptive_test_timeout(self):
+        # Given
+        known = _test_cases.TestCase('test_method')
+        unknown = _test_cases.PythonTestCase('test_method')
+        history = DurationHistory()
+        history.record(known.id(), 30.0)
+        for index in range(99):
+            history.record('other.test_{0}'.format(index), 0.5)
+        parser = ArgumentParser()
+        ParallelTestRunner.add_parser_arguments(
+            parser, '--parallel-', 'parallel_')
+        args = parser.parse_args(['--test-timeout', 'auto'])
+        runner = ParallelTestRunner.from_args(args, 'parallel_')
+        runner.duration_history = history
+
+        # When
+        test_timeout = runner._get_test_timeout()
+
+        # Then
+        self.assertEqual(test_timeout(known), 300.0)
+        self.assertEqual(test_timeout(unknown), 60.0)
+
+    def test_adaptive_test_timeout_without_history(self):
+        # Given
+        runner = ParallelTestRunner(test_timeout='auto')
+
+        # Then
+        self.assertIsNone(runner._get_test_timeout())
+
+    @patch('haas.plugins.parallel_runner.WorkerPool')
+    def test_run_timeout_stops_run(self, pool_class):
+        # Given
+        pool = create_pool(pool_class)
+        test_cases = [_test_cases.TestCase('test_method'),
+                      _test_cases.PythonTestCase('test_method')]
+        result_collector = ResultCollector()
+        runner = ParallelTestRunner(run_timeout=0)
+
+        # When
+        runner.run(result_collector, TestSuite(test_cases))
+
+        # Then
+        self.assertTrue(result_collector.shouldStop)
+        self.assertEqual(result_collector.testsRun, 1)
+        self.assertFalse(pool.has_work)
+
+
+class TestParallelRunnerResultCodec(unittest.TestCase):
+
+    def test_result_codec_from_args(self):
+        # Given
+        parser = ArgumentParser()
+        ParallelTestRunner.add_parser_arguments(
+            parser, '--parallel-', 'parallel_')
+        args = parser.parse_args(['--result-codec', 'marshal'])
+
+        # When
+        runner = ParallelTestRunner.from_args(args, 'parallel_')
+        pool = runner._create_pool(2)
+
+        # Then
+        self.assertEqual(runner.result_codec, 'marshal')
+        self.assertEqual(pool.result_codec, 'marshal')
+
+    def test_unknown_result_codec(self):
+        # Given
+        parser = ArgumentParser()
+        ParallelTestRunner.add_parser_arguments(
+            parser, '--parallel-', 'parallel_')
+
+        # When/Then
+        with patch('sys.stderr', new=StringIO()):
+            with self.assertRaises(SystemExit):
+                parser.parse_args(['--result-codec', 'json'])
+
+
+class TestParallelRunnerPinWorkers(unittest.TestCase):
+
+    def test_pin_workers_from_args(self):
+        # Given
+        parser = ArgumentParser()
+        ParallelTestRunner.add_parser_arguments(
+            parser, '--parallel-', 'parallel_')
+        args = parser.parse_args(['--pin-workers'])
+
+        # When
+        runner = ParallelTestRunner.from_args(args, 'parallel_')
+
+        # Then
+        self.assertTrue(runner.pin_workers)
+
+    @patch('haas.plugins.parallel_runner.WorkerPool')
+    @patch('haas.plugins.parallel_runner.default_process_count')
+    def test_default_process_count(self, process_count, pool_class):
+        # Given
+        process_count.return_value = 3
+        create_pool(pool_class)
+        test_suite = TestSuite([_test_cases.TestCase('test_method')])
+        runner = ParallelTestRunner(pin_workers=True)
+
+        # When
+        runner.run(ResultCollector(), test_suite)
+
+        # Then
+        pool_class.assert_called_once_with(
+            3, initializer=None, maxtasksperchild=None,
+            test_timeout=None, result_codec='struct', pin_workers=True,
+            max_rss=None, result_transport='pipe', capture_limit=None,
+            resource_monitor=None, capture='sys')
+
+    @patch('haas.plugins.parallel_runner.WorkerPool')
+    def test_capture_options_from_result_collector(self, pool_class):
+        # Given
+        create_pool(pool_class)
+        test_suite = TestSuite([_test_cases.TestCase('test_method')])
+        runner = ParallelTestRunner(process_count=2)
+
+        # When
+        runner.run(
+            ResultCollector(capture=CAPTURE_FD, capture_limit=4096),
+            test_suite)
+
+        # Then
+        _, kwargs = pool_class.call_args
+        self.assertEqual(kwargs['capture_limit'], 4096)
+        self.assertEqual(kwargs['capture'], CAPTURE_FD)
+
+
+class TestParallelRunnerMaxRss(unittest.TestCase):
+
+    def test_process_max_rss_from_args(self):
+        # Given
+        parser = ArgumentParser()
+        ParallelTestRunner.add_parser_arguments(
+            parser, '--parallel-', 'parallel_')
+        args = parser.parse_args(['--process-max-rss', '512M'])
+
+        # When
+        runner = ParallelTestRunner.from_args(args, 'parallel_')
+        pool = runner._create_pool(2)
+
+        # Then
+        self.assertEqual(runner.process_max_rss, 512 * 1024 ** 2)
+        self.assertEqual(pool.max_rss, 512 * 1024 ** 2)
+
+    @patch('haas.plugins.parallel_runner.WorkerPool')
+    def test_memory_summary(self, pool_class):
+        # Given
+        pool = create_pool(pool_class)
+        recycled = WorkerMemoryUsage(0, 100)
+        recycled.record(600 * 1024 ** 2, 'max-rss')
+        kept = WorkerMemoryUsage(1, 101)
+        kept.record(100 * 1024 ** 2, None)
+        kept.record(200 * 1024 ** 2, None)
+        pool.memory_usage = {0: recycled, 1: kept}
+        test_suite = TestSuite([_test_cases.TestCase('test_method')])
+        runner = ParallelTestRunner(
+            process_count=2, process_max_rss=512 * 1024 ** 2)
+
+        result_collector = Mock()
+
+        # When
+        runner.run(result_collector, test_suite)
+
+        # Then
+        result_collector.add_run_report.assert_called_once_with(
+            'Worker memory (limit 512.0 MiB):', [
+                '  worker 0 (pid 100): peak RSS 600.0 MiB over 1 task, '
+                'recycled',
+                '  worker 1 (pid 101): peak RSS 200.0 MiB over 2 tasks',
+                '1 worker recycled for exceeding the limit',
+            ])
+
+
+class TestParallelRunnerFailfast(unittest.TestCase):
+
+    @patch('haas.plugins.parallel_runner.WorkerPool')
+    def test_failfast_cancels_queued_tasks(self, pool_class):
+        # Given
+        pool = create_pool(pool_class)
+        test_suite = TestSuite([
+            _test_case_data.TestWithTwoErrors('test_with_two_errors'),
+            _test_cases.TestCase('test_method'),
+            _test_cases.TestCase('test_method'),
+        ])
+        result_collector = ResultCollector(failfast=True)
+        runner = ParallelTestRunner(process_count=3)
+
+        # When
+        runner.run(result_collector, test_suite)
+
+        # Then
+        self.assertTrue(pool.cancelled)
+        self.assertEqual(result_collector.testsRun, 2)
+        self.assertEqual(len(result_collector.errors), 0)
+        self.assertFalse(result_collector.wasSuccessful())
+
+    def test_maxfail_kills_running_tests(self):
+        # Given
+        test_suite = TestSuite([
+            _test_case_data.TestWithHang('test_hang'),
+            _test_case_data.TestWithTwoErrors('test_with_two_errors'),
+        ])
+        result_collector = ResultCollector(maxfail=1)
+        runner = ParallelTestRunner(process_count=2)
+
+        # When
+        start = time.time()
+        runner.run(result_collector, test_suite)
+
+        # Then
+        self.assertLess(time.time() - start, 30)
+        self.assertTrue(result_collector.shouldStop)
+        self.assertGreaterEqual(result_collector.failure_count, 1)
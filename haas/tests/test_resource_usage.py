@@ -0,0 +1,118 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2013-2014 Simon Jagoe
+# All rights reserved.
+#
+# This software may be modified and distributed under the terms
+# of the 3-clause BSD license.  See the LICENSE.txt file for details.
+from __future__ import absolute_import, unicode_literals
+
+import pickle
+
+from ..resource_usage import (
+    ResourceMonitor, TestResources, format_bytes, resource, tracemalloc)
+from ..testing import unittest
+
+
+def _spin(iterations=200000):
+    total = 0
+    for index in range(iterations):
+        total += index * index
+    return total
+
+
+class TestTestResources(unittest.TestCase):
+
+    def test_format(self):
+        # Given
+        resources = TestResources(1.25, 0.5, 3 * 1024 * 1024, 2048)
+
+        # When
+        text = resources.format()
+
+        # Then
+        self.assertEqual(
+            text, 'cpu 1.250s user 0.500s sys, rss +3.0 MiB, alloc 2.0 KiB')
+        self.assertEqual(resources.cpu_time, 1.75)
+
+    def test_format_without_memory(self):
+        # Given
+        resources = TestResources(1.25)
+
+        # When
+        text = resources.format()
+
+        # Then
+        self.assertEqual(text, 'cpu 1.250s')
+        self.assertEqual(resources.cpu_time, 1.25)
+
+    def test_to_dict(self):
+        # Given
+        resources = TestResources(1.25, 0.5, 4096, None)
+
+        # When
+        data = resources.to_dict()
+
+        # Then
+        self.assertEqual(data, {
+            'user_time': 1.25,
+            'system_time': 0.5,
+            'max_rss_delta': 4096,
+            'tracemalloc_peak': None,
+        })
+
+    def test_pickle(self):
+        # Given
+        resources = TestResources(1.25, 0.5, 4096, 1024)
+
+        # When
+        unpickled = pickle.loads(
+            pickle.dumps(resources, pickle.HIGHEST_PROTOCOL))
+
+        # Then
+        self.assertEqual(unpickled, resources)
+        self.assertNotEqual(unpickled, TestResources(1.25, 0.5, 4096, None))
+
+    def test_format_bytes(self):
+        self.assertEqual(format_bytes(0), '0 B')
+        self.assertEqual(format_bytes(1023), '1023 B')
+        self.assertEqual(format_bytes(1536), '1.5 KiB')
+        self.assertEqual(format_bytes(5 * 1024 ** 3), '5.0 GiB')
+
+
+class TestResourceMonitor(unittest.TestCase):
+
+    @unittest.skipIf(resource is None, 'Requires the resource module')
+    def test_measure_cpu_time(self):
+        # Given
+        monitor = ResourceMonitor()
+
+        # When
+        state = monitor.start()
+        _spin()
+        resources = monitor.stop(state)
+
+        # Then
+        self.assertGreater(resources.cpu_time, 0)
+        self.assertGreaterEqual(resources.system_time, 0)
+        self.assertGreaterEqual(resources.max_rss_delta, 0)
+        self.assertIsNone(resources.tracemalloc_peak)
+
+    @unittest.skipIf(tracemalloc is None or
+                     not hasattr(tracemalloc, 'reset_peak'),
+                     'Requires tracemalloc.reset_peak')
+    def test_trace_allocations(self):
+        # Given
+        was_tracing = tracemalloc.is_tracing()
+        if not was_tracing:
+            self.addCleanup(tracemalloc.stop)
+        monitor = ResourceMonitor(trace_allocations=True)
+
+        # When
+        state = monitor.start()
+        data = bytearray(4 * 1024 * 1024)
+        del data
+        resources = monitor.stop(state)
+
+        # Then
+        self.assertTrue(tracemalloc.is_tracing())
+        self.assertGreaterEqual(resources.tracemalloc_peak, 4 * 1024 * 1024)
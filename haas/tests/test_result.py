@@ -8,7 +8,11 @@ from __future__ import absolute_import, unicode_literals
 
 from datetime import datetime, timedelta
 from time import ctime
+import os
+import pickle
+import subprocess
 import sys
+import threading
 
 from mock import Mock, patch
 from six.moves import StringIO
@@ -18,14 +22,17 @@ import six
 from ..plugins.i_result_handler_plugin import IResultHandlerPlugin
 from ..plugins.result_handler import (
     QuietTestResultHandler, StandardTestResultHandler,
-    VerboseTestResultHandler)
+    VerboseTestResultHandler, _WritelnDecorator, failure_signature,
+    group_by_signature)
+from ..resource_usage import ResourceMonitor, TestResources
 from ..result import (
-    ResultCollector, TestResult, TestCompletionStatus, TestDuration,
-    ResultCollecter,
+    CAPTURE_FD, ResultCollector, TestResult, TestCompletionStatus,
+    TestDuration, ResultCollecter, _ExceptionSummary, _FdCapture,
+    _format_exception, thread_local_output,
 )
 from ..testing import unittest
 from . import _test_cases, _test_case_data
-from .fixtures import ExcInfoFixture, MockDateTime
+from .fixtures import ExcInfoFixture, MockClock
 
 
 class TestTextTestResult(ExcInfoFixture, unittest.TestCase):
@@ -93,7 +100,7 @@ class TestTextTestResult(ExcInfoFixture, unittest.TestCase):
         case = _test_cases.TestCase('test_method')
 
         # When
-        with patch('haas.result.datetime', new=MockDateTime(start_time)):
+        with MockClock(start_time):
             collector.startTest(case)
 
         # Then
@@ -107,7 +114,7 @@ class TestTextTestResult(ExcInfoFixture, unittest.TestCase):
                 case, TestCompletionStatus.error, expected_duration,
                 exception=exc_info)
             # When
-            with patch('haas.result.datetime', new=MockDateTime(end_time)):
+            with MockClock(end_time):
                 collector.addError(case, exc_info)
 
         # Then
@@ -130,7 +137,7 @@ class TestTextTestResult(ExcInfoFixture, unittest.TestCase):
         case = _test_cases.TestCase('test_method')
 
         # When
-        with patch('haas.result.datetime', new=MockDateTime(start_time)):
+        with MockClock(start_time):
             collector.startTest(case)
 
         # Then
@@ -145,7 +152,7 @@ class TestTextTestResult(ExcInfoFixture, unittest.TestCase):
                 exception=exc_info)
 
             # When
-            with patch('haas.result.datetime', new=MockDateTime(end_time)):
+            with MockClock(end_time):
                 collector.addError(case, exc_info)
 
         # Then
@@ -168,7 +175,7 @@ class TestTextTestResult(ExcInfoFixture, unittest.TestCase):
         case = _test_cases.TestCase('test_method')
 
         # When
-        with patch('haas.result.datetime', new=MockDateTime(start_time)):
+        with MockClock(start_time):
             collector.startTest(case)
 
         # Then
@@ -182,7 +189,7 @@ class TestTextTestResult(ExcInfoFixture, unittest.TestCase):
                 exception=exc_info)
 
             # When
-            with patch('haas.result.datetime', new=MockDateTime(end_time)):
+            with MockClock(end_time):
                 collector.addFailure(case, exc_info)
 
         # Then
@@ -205,7 +212,7 @@ class TestTextTestResult(ExcInfoFixture, unittest.TestCase):
         case = _test_cases.TestCase('test_method')
 
         # When
-        with patch('haas.result.datetime', new=MockDateTime(start_time)):
+        with MockClock(start_time):
             collector.startTest(case)
 
         # Then
@@ -217,7 +224,7 @@ class TestTextTestResult(ExcInfoFixture, unittest.TestCase):
             case, TestCompletionStatus.success, expected_duration)
 
         # When
-        with patch('haas.result.datetime', new=MockDateTime(end_time)):
+        with MockClock(end_time):
             collector.addSuccess(case)
 
         # Then
@@ -240,7 +247,7 @@ class TestTextTestResult(ExcInfoFixture, unittest.TestCase):
         case = _test_cases.TestCase('test_method')
 
         # When
-        with patch('haas.result.datetime', new=MockDateTime(start_time)):
+        with MockClock(start_time):
             collector.startTest(case)
 
         # Then
@@ -253,7 +260,7 @@ class TestTextTestResult(ExcInfoFixture, unittest.TestCase):
             message='reason')
 
         # When
-        with patch('haas.result.datetime', new=MockDateTime(end_time)):
+        with MockClock(end_time):
             collector.addSkip(case, 'reason')
 
         # Then
@@ -276,7 +283,7 @@ class TestTextTestResult(ExcInfoFixture, unittest.TestCase):
         case = _test_cases.TestCase('test_method')
 
         # When
-        with patch('haas.result.datetime', new=MockDateTime(start_time)):
+        with MockClock(start_time):
             collector.startTest(case)
 
         # Then
@@ -290,7 +297,7 @@ class TestTextTestResult(ExcInfoFixture, unittest.TestCase):
                 exception=exc_info)
 
             # When
-            with patch('haas.result.datetime', new=MockDateTime(end_time)):
+            with MockClock(end_time):
                 collector.addExpectedFailure(case, exc_info)
 
         # Then
@@ -313,7 +320,7 @@ class TestTextTestResult(ExcInfoFixture, unittest.TestCase):
         case = _test_cases.TestCase('test_method')
 
         # When
-        with patch('haas.result.datetime', new=MockDateTime(start_time)):
+        with MockClock(start_time):
             collector.startTest(case)
 
         # Then
@@ -325,7 +332,7 @@ class TestTextTestResult(ExcInfoFixture, unittest.TestCase):
             case, TestCompletionStatus.unexpected_success, expected_duration)
 
         # When
-        with patch('haas.result.datetime', new=MockDateTime(end_time)):
+        with MockClock(end_time):
             collector.addUnexpectedSuccess(case)
 
         # Then
@@ -359,9 +366,8 @@ class TestTextTestResult(ExcInfoFixture, unittest.TestCase):
         tear_down_end_time = datetime(2016, 4, 12, 8, 17, 39)
 
         # When
-        with patch('haas.result.datetime',
-                   new=MockDateTime([start_time, test_end_time,
-                                     tear_down_end_time])):
+        with MockClock(
+                [start_time, test_end_time, tear_down_end_time]):
             case.run(collector)
 
         # Then
@@ -458,6 +464,233 @@ class TestFailfast(ExcInfoFixture, unittest.TestCase):
         # Then
         self.assertFalse(collector.shouldStop)
 
+    def test_failfast_on_added_result(self):
+        # Given
+        collector = ResultCollector(failfast=True)
+        case = _test_cases.TestCase('test_method')
+        start_time = datetime(2015, 12, 23, 8, 14, 12)
+        duration = TestDuration(start_time, start_time + timedelta(seconds=1))
+
+        # When
+        collector.add_result(TestResult.from_test_case(
+            case, TestCompletionStatus.success, duration))
+
+        # Then
+        self.assertFalse(collector.shouldStop)
+
+        # When
+        collector.add_result(TestResult.from_test_case(
+            case, TestCompletionStatus.failure, duration))
+
+        # Then
+        self.assertTrue(collector.shouldStop)
+
+
+class TestStreaming(ExcInfoFixture, unittest.TestCase):
+
+    def test_streaming_collector_keeps_no_results(self):
+        # Given
+        handler = Mock(spec=IResultHandlerPlugin)
+        collector = ResultCollector(streaming=True)
+        collector.add_result_handler(handler)
+        case = _test_cases.TestCase('test_method')
+
+        # When
+        collector.startTest(case)
+        with self.exc_info(RuntimeError) as exc_info:
+            collector.addError(case, exc_info)
+        collector.stopTest(case)
+        collector.startTest(case)
+        collector.addSkip(case, 'reason')
+        collector.stopTest(case)
+
+        # Then
+        self.assertEqual(handler.call_count, 2)
+        self.assertEqual(collector.errors, [])
+        self.assertEqual(collector.skipped, [])
+        self.assertEqual(collector.failure_count, 1)
+        self.assertFalse(collector.wasSuccessful())
+
+    def test_test_timing_evicted_on_stop_test(self):
+        # Given
+        collector = ResultCollector()
+        case = _test_cases.TestCase('test_method')
+
+        # When
+        collector.startTest(case)
+        collector.addSuccess(case)
+        collector.stopTest(case)
+
+        # Then
+        self.assertEqual(collector._test_timing, {})
+
+    def _error_results(self):
+        results = []
+        for test_case_class in (_test_cases.TestCase,
+                                _test_cases.PythonTestCase):
+            with self.exc_info(RuntimeError) as exc_info:
+                results.append(TestResult.from_test_case(
+                    test_case_class('test_method'),
+                    TestCompletionStatus.error,
+                    TestDuration(timedelta(seconds=1)), exception=exc_info))
+        with self.failure_exc_info('Expected') as exc_info:
+            results.append(TestResult.from_test_case(
+                _test_cases.TestCase('test_method'),
+                TestCompletionStatus.failure,
+                TestDuration(timedelta(seconds=1)), exception=exc_info))
+        return results
+
+    def _handler_output(self, handler, results):
+        with patch('sys.stderr', new_callable=StringIO) as stderr:
+            handler.stream = _WritelnDecorator(sys.stderr)
+            for result in results:
+                handler(result)
+            handler.print_errors()
+            handler.stop_time = handler.start_time = 0
+            handler.print_summary()
+        return stderr.getvalue()
+
+    def test_streaming_handler_output(self):
+        # Given
+        results = self._error_results()
+        handler = QuietTestResultHandler(test_count=3)
+        streaming_handler = QuietTestResultHandler(
+            test_count=3, streaming=True)
+
+        # When
+        output = self._handler_output(handler, results)
+        streaming_output = self._handler_output(streaming_handler, results)
+
+        # Then
+        self.assertEqual(streaming_output, output)
+        self.assertEqual(streaming_handler.errors, [])
+        self.assertIn('FAILED (failures=1, errors=2)', streaming_output)
+
+    def test_streaming_handler_grouped_output(self):
+        # Given
+        results = self._error_results()
+        handler = QuietTestResultHandler(
+            test_count=3, group_failures=True, streaming=True)
+
+        # When
+        output = self._handler_output(handler, results)
+
+        # Then
+        self.assertEqual(output.count('RuntimeError'), 1)
+        self.assertIn('and 1 more tests with the same ERROR\n', output)
+        self.assertIn('FAIL: test_method', output)
+
+
+class TestLazyException(ExcInfoFixture, unittest.TestCase):
+
+    def setUp(self):
+        self.case = _test_cases.TestCase('test_method')
+        start_time = datetime(2015, 12, 23, 8, 14, 12)
+        self.duration = TestDuration(start_time, start_time)
+
+    def test_exception_formatted_when_read(self):
+        # Given
+        with self.exc_info(RuntimeError) as exc_info:
+            expected = _format_exception(exc_info, False)
+
+            # When
+            with patch.object(_ExceptionSummary, 'format',
+                              return_value=expected) as format_:
+                result = TestResult.from_test_case(
+                    self.case, TestCompletionStatus.expected_failure,
+                    self.duration, exception=exc_info)
+
+                # Then
+                self.assertFalse(format_.called)
+
+                # When
+                first = result.exception
+                second = result.exception
+
+        # Then
+        format_.assert_called_once_with()
+        self.assertEqual(first, expected)
+        self.assertIs(second, first)
+
+    def test_formatted_failure(self):
+        # Given
+        with self.failure_exc_info('Expected') as exc_info:
+            result = TestResult.from_test_case(
+                self.case, TestCompletionStatus.failure, self.duration,
+                exception=exc_info, stdout='Output')
+
+        # When
+        exception = result.exception
+
+        # Then
+        self.assertTrue(exception.startswith('Traceback'))
+        self.assertIn('in failure_exc_info\n    self.fail(msg)\n',
+                      exception)
+        self.assertNotIn('case.py', exception)
+        self.assertIn('AssertionError: Expected\n', exception)
+        self.assertTrue(exception.endswith('\nStdout:\nOutput\n'))
+
+    def test_pickled_with_formatted_exception(self):
+        # Given
+        with self.exc_info(RuntimeError) as exc_info:
+            result = TestResult.from_test_case(
+                self.case, TestCompletionStatus.error, self.duration,
+                exception=exc_info)
+
+        # When
+        unpickled = pickle.loads(pickle.dumps(result))
+
+        # Then
+        self.assertEqual(unpickled, result)
+        self.assertIn('RuntimeError', unpickled.exception)
+
+
+class TestMaxfail(ExcInfoFixture, unittest.TestCase):
+
+    def test_stops_after_maxfail_unsuccessful_results(self):
+        # Given
+        collector = ResultCollector(maxfail=2)
+        case = _test_cases.TestCase('test_method')
+
+        # When
+        collector.startTest(case)
+        with self.failure_exc_info() as exc_info:
+            collector.addFailure(case, exc_info)
+        collector.stopTest(case)
+        collector.startTest(case)
+        collector.addSkip(case, 'reason')
+        collector.stopTest(case)
+
+        # Then
+        self.assertEqual(collector.failure_count, 1)
+        self.assertFalse(collector.shouldStop)
+
+        # When
+        collector.startTest(case)
+        with self.exc_info(RuntimeError) as exc_info:
+            collector.addError(case, exc_info)
+        collector.stopTest(case)
+
+        # Then
+        self.assertEqual(collector.failure_count, 2)
+        self.assertTrue(collector.shouldStop)
+
+    def test_no_maxfail(self):
+        # Given
+        collector = ResultCollector()
+        case = _test_cases.TestCase('test_method')
+
+        # When
+        for _ in range(5):
+            collector.startTest(case)
+            with self.failure_exc_info() as exc_info:
+                collector.addFailure(case, exc_info)
+            collector.stopTest(case)
+
+        # Then
+        self.assertEqual(collector.failure_count, 5)
+        self.assertFalse(collector.shouldStop)
+
 
 class TestBuffering(ExcInfoFixture, unittest.TestCase):
 
@@ -475,7 +708,7 @@ class TestBuffering(ExcInfoFixture, unittest.TestCase):
         case = _test_cases.TestCase('test_method')
 
         # When
-        with patch('haas.result.datetime', new=MockDateTime(start_time)):
+        with MockClock(start_time):
             collector.startTest(case)
 
         # Then
@@ -494,7 +727,7 @@ class TestBuffering(ExcInfoFixture, unittest.TestCase):
                 case, TestCompletionStatus.error, expected_duration,
                 exception=exc_info, stderr=test_stderr)
             # When
-            with patch('haas.result.datetime', new=MockDateTime(end_time)):
+            with MockClock(end_time):
                 collector.addError(case, exc_info)
         collector.stopTest(case)
 
@@ -516,7 +749,7 @@ class TestBuffering(ExcInfoFixture, unittest.TestCase):
         case = _test_cases.TestCase('test_method')
 
         # When
-        with patch('haas.result.datetime', new=MockDateTime(start_time)):
+        with MockClock(start_time):
             collector.startTest(case)
 
         # Then
@@ -536,7 +769,7 @@ class TestBuffering(ExcInfoFixture, unittest.TestCase):
                 exception=exc_info, stdout=test_stdout)
 
             # When
-            with patch('haas.result.datetime', new=MockDateTime(end_time)):
+            with MockClock(end_time):
                 collector.addError(case, exc_info)
         collector.stopTest(case)
 
@@ -544,6 +777,161 @@ class TestBuffering(ExcInfoFixture, unittest.TestCase):
         self.assertIn(test_stdout, expected_result.exception)
         handler.assert_called_once_with(expected_result)
 
+    @patch('sys.stdout', new_callable=StringIO)
+    def test_capture_limit(self, stdout):
+        # Given
+        handler = Mock(spec=IResultHandlerPlugin)
+        collector = ResultCollector(buffer=True, capture_limit=10)
+        collector.add_result_handler(handler)
+        case = _test_cases.TestCase('test_method')
+
+        # When
+        collector.startTest(case)
+        sys.stdout.write('head-' + 'x' * 1000 + '-tail')
+        with self.exc_info(RuntimeError) as exc_info:
+            collector.addError(case, exc_info)
+        collector.stopTest(case)
+
+        # Then
+        (result,), _ = handler.call_args
+        expected = (
+            'head-\n[... 1000 characters of output truncated ...]\n-tail')
+        self.assertIn(expected, result.exception)
+        self.assertNotIn('x', stdout.getvalue())
+
+    @patch('sys.stdout', new_callable=StringIO)
+    def test_thread_local_buffering(self, stdout):
+        # Given
+        collector = ResultCollector(buffer=True)
+        case = _test_cases.TestCase('test_method')
+        other_thread_output = []
+
+        def write_in_thread():
+            sys.stdout.write('Other thread')
+            other_thread_output.append(sys.stdout.getvalue())
+
+        # When
+        with thread_local_output():
+            collector.startTest(case)
+            sys.stdout.write('Test thread')
+            thread = threading.Thread(target=write_in_thread)
+            thread.start()
+            thread.join()
+            captured = collector._stdout_buffer.getvalue()
+            collector.stopTest(case)
+            sys.stdout.write(' after test')
+
+        # Then
+        self.assertIs(sys.stdout, stdout)
+        self.assertEqual(captured, 'Test thread')
+        self.assertEqual(stdout.getvalue(), 'Other thread after test')
+        self.assertEqual(other_thread_output, ['Other thread'])
+
+
+@unittest.skipIf(sys.platform.startswith('win'),
+                 'File descriptor capture is tested on POSIX only')
+class TestFdCapture(ExcInfoFixture, unittest.TestCase):
+
+    def setUp(self):
+        # Writes go to the file descriptors, not to sys.stdout or
+        # sys.stderr, which may be replaced by the test runner.
+        self._stdout = patch('sys.stdout', new_callable=StringIO)
+        self._stderr = patch('sys.stderr', new_callable=StringIO)
+        self.stdout = self._stdout.start()
+        self.stderr = self._stderr.start()
+        self.addCleanup(self._stdout.stop)
+        self.addCleanup(self._stderr.stop)
+
+    def test_captures_file_descriptors(self):
+        # Given
+        handler = Mock(spec=IResultHandlerPlugin)
+        collector = ResultCollector(buffer=True, capture=CAPTURE_FD)
+        collector.add_result_handler(handler)
+        case = _test_cases.TestCase('test_method')
+
+        # When
+        collector.startTest(case)
+        os.write(1, b'Fd output\n')
+        subprocess.check_call(
+            [sys.executable, '-c',
+             'import sys; sys.stderr.write("Subprocess error")'])
+        with self.exc_info(RuntimeError) as exc_info:
+            collector.addError(case, exc_info)
+        collector.stopTest(case)
+
+        # Then
+        (result,), _ = handler.call_args
+        self.assertIn('Fd output', result.exception)
+        self.assertIn('Subprocess error', result.exception)
+        self.assertEqual(self.stdout.getvalue(), '\nStdout:\nFd output\n')
+        self.assertEqual(
+            self.stderr.getvalue(), '\nStderr:\nSubprocess error\n')
+
+    def test_capture_is_reset_between_tests(self):
+        # Given
+        handler = Mock(spec=IResultHandlerPlugin)
+        collector = ResultCollector(buffer=True, capture=CAPTURE_FD)
+        collector.add_result_handler(handler)
+        case = _test_cases.TestCase('test_method')
+
+        # When
+        collector.startTest(case)
+        os.write(1, b'First test')
+        collector.addSuccess(case)
+        collector.stopTest(case)
+        collector.startTest(case)
+        os.write(1, b'Second test')
+        with self.exc_info(RuntimeError) as exc_info:
+            collector.addError(case, exc_info)
+        collector.stopTest(case)
+
+        # Then
+        (result,), _ = handler.call_args
+        self.assertIn('Second test', result.exception)
+        self.assertNotIn('First test', result.exception)
+        self.assertEqual(self.stdout.getvalue(), '\nStdout:\nSecond test\n')
+
+    def test_capture_limit(self):
+        # Given
+        handler = Mock(spec=IResultHandlerPlugin)
+        collector = ResultCollector(
+            buffer=True, capture=CAPTURE_FD, capture_limit=10)
+        collector.add_result_handler(handler)
+        case = _test_cases.TestCase('test_method')
+
+        # When
+        collector.startTest(case)
+        os.write(1, b'head-' + b'x' * 1000 + b'-tail')
+        with self.exc_info(RuntimeError) as exc_info:
+            collector.addError(case, exc_info)
+        collector.stopTest(case)
+
+        # Then
+        (result,), _ = handler.call_args
+        expected = 'head-\n[... 1000 bytes of output truncated ...]\n-tail'
+        self.assertIn(expected, result.exception)
+        self.assertNotIn('x', self.stdout.getvalue())
+
+    def test_successful_test_output_is_not_read(self):
+        # Given
+        handler = Mock(spec=IResultHandlerPlugin)
+        collector = ResultCollector(buffer=True, capture=CAPTURE_FD)
+        collector.add_result_handler(handler)
+        case = _test_cases.TestCase('test_method')
+
+        # When
+        with patch.object(_FdCapture, 'getvalue') as getvalue:
+            collector.startTest(case)
+            os.write(1, b'Output')
+            collector.addSuccess(case)
+            collector.stopTest(case)
+
+        # Then
+        self.assertFalse(getvalue.called)
+        (result,), _ = handler.call_args
+        self.assertEqual(result.status, TestCompletionStatus.success)
+        self.assertEqual(self.stdout.getvalue(), '')
+
 
 class TestQuietResultHandler(ExcInfoFixture, unittest.TestCase):
 
@@ -575,6 +963,23 @@ class TestQuietResultHandler(ExcInfoFixture, unittest.TestCase):
         self.assertRegexpMatches(
             output.replace('\n', ''), r'--+.*?Ran 0 tests.*?OK')
 
+    @patch('sys.stderr', new_callable=StringIO)
+    def test_output_run_report(self, stderr):
+        # Given
+        handler = QuietTestResultHandler(test_count=1)
+        handler.start_test_run()
+        collector = ResultCollector()
+        collector.add_result_handler(handler)
+
+        # When
+        collector.add_run_report('Report:', ['  first'])
+        handler.stop_test_run()
+
+        # Then
+        output = stderr.getvalue()
+        self.assertTrue(output.startswith(
+            '\nReport:\n  first\n' + handler.separator2))
+
     @patch('sys.stderr', new_callable=StringIO)
     def test_no_output_start_test(self, stderr):
         # Given
@@ -787,6 +1192,101 @@ class TestQuietResultHandler(ExcInfoFixture, unittest.TestCase):
         self.assertNotIn('raise', output)
 
 
+def _traceback(test_name, value, output=''):
+    return (
+        'Traceback (most recent call last):\n'
+        '  File "tests.py", line 12, in {0}\n'
+        '    client.connect()\n'
+        '  File "client.py", line 40, in connect\n'
+        '    raise ConnectionError(port)\n'
+        'ConnectionError: [Errno 111] refused on port {1}\n'
+        '{2}'.format(test_name, value, output))
+
+
+class TestFailureGrouping(unittest.TestCase):
+
+    def _result(self, test_case_class, exception):
+        return TestResult(
+            test_case_class, 'test_method', TestCompletionStatus.error,
+            TestDuration(timedelta(seconds=1)), exception=exception)
+
+    def test_failure_signature(self):
+        # Given
+        first = _traceback('test_first', 8080)
+        second = _traceback('test_second', 8081, '\nStdout:\nConnecting\n')
+        other = first.replace('ConnectionError:', 'TimeoutError:')
+
+        # When
+        signature = failure_signature(first)
+
+        # Then
+        self.assertEqual(signature, (
+            'ConnectionError: [Errno <?>] refused on port <?>',
+            (('tests.py', '12', 'test_first'),
+             ('client.py', '40', 'connect'))))
+        self.assertNotEqual(failure_signature(second), signature)
+        self.assertEqual(failure_signature(second, frames=1),
+                         failure_signature(first, frames=1))
+        self.assertNotEqual(failure_signature(other, frames=1),
+                            failure_signature(first, frames=1))
+        self.assertIsNone(failure_signature(None))
+
+    def test_group_by_signature(self):
+        # Given
+        first = self._result(_test_cases.TestCase, 'Exception: 1')
+        second = self._result(_test_cases.PythonTestCase, 'ValueError: 2')
+        third = self._result(_test_cases.PythonTestCase, 'Exception: 3')
+
+        # When
+        groups = group_by_signature([first, second, third])
+
+        # Then
+        self.assertEqual(groups, [[first, third], [second]])
+
+    @patch('sys.stderr', new_callable=StringIO)
+    def test_grouped_errors_printed_once(self, stderr):
+        # Given
+        handler = QuietTestResultHandler(test_count=3, group_failures=True)
+        exception = 'Traceback\nConnectionError: refused on port 1\n'
+        results = [
+            self._result(_test_cases.TestCase, exception),
+            self._result(_test_cases.PythonTestCase, exception),
+            self._result(_test_case_data.TestCaseSubclass, exception),
+        ]
+        for result in results:
+            handler(result)
+
+        # When
+        handler.print_errors()
+
+        # Then
+        output = stderr.getvalue()
+        self.assertEqual(output.count(exception), 1)
+        self.assertEqual(output.count('ERROR: '), 1)
+        self.assertIn('and 2 more tests with the same ERROR:\n', output)
+        self.assertIn(
+            '  test_method (haas.tests._test_cases.PythonTestCase', output)
+        self.assertIn(
+            '  test_method (haas.tests._test_case_data.TestCaseSubclass',
+            output)
+
+    @patch('sys.stderr', new_callable=StringIO)
+    def test_errors_not_grouped_by_default(self, stderr):
+        # Given
+        handler = QuietTestResultHandler(test_count=2)
+        exception = 'Traceback\nConnectionError: refused on port 1\n'
+        handler(self._result(_test_cases.TestCase, exception))
+        handler(self._result(_test_cases.PythonTestCase, exception))
+
+        # When
+        handler.print_errors()
+
+        # Then
+        output = stderr.getvalue()
+        self.assertEqual(output.count(exception), 2)
+        self.assertNotIn('more tests with the same', output)
+
+
 class TestStandardResultHandler(ExcInfoFixture, unittest.TestCase):
 
     @patch('sys.stderr', new_callable=StringIO)
@@ -817,6 +1317,23 @@ class TestStandardResultHandler(ExcInfoFixture, unittest.TestCase):
         self.assertRegexpMatches(
             output.replace('\n', ''), r'--+.*?Ran 0 tests.*?OK')
 
+    @patch('sys.stderr', new_callable=StringIO)
+    def test_output_run_report(self, stderr):
+        # Given
+        handler = StandardTestResultHandler(test_count=1)
+        handler.start_test_run()
+        collector = ResultCollector()
+        collector.add_result_handler(handler)
+
+        # When
+        collector.add_run_report('Report:', ['  first', 'second'])
+        handler.stop_test_run()
+
+        # Then
+        output = stderr.getvalue()
+        self.assertTrue(output.startswith(
+            '\nReport:\n  first\nsecond\n' + handler.separator2))
+
     @patch('sys.stderr', new_callable=StringIO)
     def test_no_output_start_test(self, stderr):
         # Given
@@ -1414,6 +1931,153 @@ class TestTestDurationOrdering(unittest.TestCase):
             self.assertLess(duration1, duration2)
 
 
+class TestTestDurationNanoseconds(unittest.TestCase):
+
+    def test_from_ns(self):
+        # Given
+        start_time = datetime(2015, 12, 23, 8, 14, 12, 500)
+
+        # When
+        duration = TestDuration.from_ns(
+            1500000123, TestDuration(start_time, start_time).start_ns)
+
+        # Then
+        self.assertEqual(duration.duration_ns, 1500000123)
+        self.assertEqual(duration.total_seconds, 1.500000123)
+        self.assertEqual(duration.duration, timedelta(seconds=1.5))
+        self.assertEqual(duration.start_time, start_time)
+        self.assertEqual(
+            duration.stop_time, start_time + timedelta(seconds=1.5))
+        self.assertFalse(hasattr(duration, '__dict__'))
+
+    def test_datetimes_and_seconds(self):
+        # Given
+        start_time = datetime(2015, 12, 23, 8, 14, 12)
+        end_time = start_time + timedelta(seconds=10, microseconds=7)
+
+        # When
+        from_datetimes = TestDuration(start_time, end_time)
+        from_seconds = TestDuration(10.000007)
+
+        # Then
+        self.assertEqual(from_datetimes.duration_ns, 10000007000)
+        self.assertEqual(from_datetimes.stop_time, end_time)
+        self.assertEqual(from_seconds, from_datetimes)
+        self.assertIsNone(from_seconds.start_time)
+        self.assertIsNone(from_seconds.stop_time)
+
+    def test_pickle(self):
+        # Given
+        duration = TestDuration.from_ns(123456789, 1450858452000000000)
+
+        # When
+        unpickled = pickle.loads(pickle.dumps(duration))
+
+        # Then
+        self.assertEqual(unpickled.duration_ns, 123456789)
+        self.assertEqual(unpickled.start_ns, 1450858452000000000)
+
+    def test_collector_times_with_monotonic_clock(self):
+        # Given
+        handler = Mock(spec=IResultHandlerPlugin)
+        collector = ResultCollector()
+        collector.add_result_handler(handler)
+        case = _test_cases.TestCase('test_method')
+        counter = iter([1000, 2501000])
+        # The wall clock is set back while the test runs
+        wall_clock = iter([1450858452000000000, 1450858400000000000])
+
+        # When
+        with patch('haas.result._counter_ns', new=lambda: next(counter)), \
+                patch('haas.result._wall_clock_ns',
+                      new=lambda: next(wall_clock)):
+            collector.startTest(case)
+            collector.addSuccess(case)
+            collector.stopTest(case)
+
+        # Then
+        (result,), _ = handler.call_args
+        self.assertEqual(result.duration.duration_ns, 2500000)
+        self.assertEqual(result.duration.start_ns, 1450858452000000000)
+
+
+class TestResourceMonitoring(unittest.TestCase):
+
+    def _run(self, collector, start_time=None):
+        handler = Mock(spec=IResultHandlerPlugin)
+        collector.add_result_handler(handler)
+        case = _test_cases.TestCase('test_method')
+        collector.startTest(case, start_time)
+        collector.addSuccess(case)
+        collector.stopTest(case)
+        (result,), _ = handler.call_args
+        return result
+
+    def test_resources_attached_to_result(self):
+        # Given
+        resources = TestResources(1.25, 0.5, 4096, None)
+        monitor = Mock()
+        monitor.start.return_value = 'state'
+        monitor.stop.return_value = resources
+        collector = ResultCollector(resource_monitor=monitor)
+
+        # When
+        result = self._run(collector)
+
+        # Then
+        monitor.start.assert_called_once_with()
+        monitor.stop.assert_called_once_with('state')
+        self.assertIs(result.resources, resources)
+
+    def test_results_from_other_processes_not_measured(self):
+        # Given
+        monitor = Mock()
+        collector = ResultCollector(resource_monitor=monitor)
+
+        # When
+        result = self._run(collector, datetime(2015, 12, 23, 8, 14, 12))
+
+        # Then
+        self.assertFalse(monitor.start.called)
+        self.assertFalse(monitor.stop.called)
+        self.assertIsNone(result.resources)
+
+    def test_no_resource_monitor(self):
+        # When
+        result = self._run(ResultCollector())
+
+        # Then
+        self.assertIsNone(result.resources)
+
+    def test_measured_with_resource_monitor(self):
+        # When
+        result = self._run(ResultCollector(resource_monitor=ResourceMonitor()))
+
+        # Then
+        self.assertIsInstance(result.resources, TestResources)
+        self.assertGreaterEqual(result.resources.cpu_time, 0)
+
+    def test_to_dict_round_trip(self):
+        # Given
+        start_time = datetime(2015, 12, 23, 8, 14, 12)
+        duration = TestDuration(start_time, start_time + timedelta(seconds=1))
+        for resources in (TestResources(1.25, 0.5, 4096, None), None):
+            result = TestResult.from_test_case(
+                _test_cases.TestCase('test_method'),
+                TestCompletionStatus.success, duration, resources=resources)
+
+            # When
+            data = result.to_dict()
+
+            # Then
+            self.assertEqual(data['duration'], duration)
+            if resources is None:
+                self.assertIsNone(data['resources'])
+            else:
+                self.assertEqual(data['resources'], resources.to_dict())
+            self.assertEqual(TestResult.from_dict(data), result)
+
+
 class TestResultCollecterDepricated(unittest.TestCase):
 
     def test_deprecation_warning(self):
@@ -0,0 +1,160 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2013-2014 Simon Jagoe
+# All rights reserved.
+#
+# This software may be modified and distributed under the terms
+# of the 3-clause BSD license.  See the LICENSE.txt file for details.
+from __future__ import absolute_import, unicode_literals
+
+from datetime import datetime, timedelta
+
+from ..resource_usage import TestResources
+from ..result import TestCompletionStatus, TestDuration, TestResult
+from ..result_codec import (
+    COMPRESSION_THRESHOLD, MarshalResultCodec, PickleResultCodec,
+    RESULT_CODECS, StructResultCodec, ZlibResultCodec)
+from ..testing import unittest
+from . import _test_cases
+
+
+class ResultCodecTestMixin(object):
+
+    codec_class = None
+
+    def setUp(self):
+        self.codec = self.codec_class()
+        self.test_cases = [
+            _test_cases.TestCase('test_method'),
+            _test_cases.PythonTestCase('test_method'),
+        ]
+
+    def _round_trip(self, index, result):
+        data = self.codec.encode(index, result)
+        self.assertIsInstance(data, bytes)
+        return self.codec.decode(data, self.test_cases)
+
+    def test_round_trip_success(self):
+        # Given
+        start_time = datetime(2015, 12, 23, 8, 14, 12, 123456)
+        duration = TestDuration(
+            start_time, start_time + timedelta(seconds=10, microseconds=7))
+        result = TestResult.from_test_case(
+            self.test_cases[1], TestCompletionStatus.success, duration)
+
+        # When
+        decoded = self._round_trip(1, result)
+
+        # Then
+        self.assertEqual(decoded, result)
+        self.assertEqual(decoded.test_class, _test_cases.PythonTestCase)
+        self.assertEqual(decoded.duration.start_time, start_time)
+        self.assertEqual(decoded.duration.stop_time, duration.stop_time)
+
+    def test_round_trip_error_and_message(self):
+        # Given
+        start_time = datetime(2015, 12, 23, 8, 14, 12)
+        duration = TestDuration(start_time, start_time)
+        result = TestResult(
+            _test_cases.TestCase, 'test_method', TestCompletionStatus.error,
+            duration, exception='Traceback\n  ☃ error', message='')
+
+        # When
+        decoded = self._round_trip(0, result)
+
+        # Then
+        self.assertEqual(decoded, result)
+        self.assertEqual(decoded.exception, 'Traceback\n  ☃ error')
+        self.assertEqual(decoded.message, '')
+
+    def test_round_trip_resources(self):
+        for resources in (TestResources(1.25, 0.5, 4096, 1024),
+                          TestResources(1.25)):
+            # Given
+            result = TestResult(
+                _test_cases.TestCase, 'test_method',
+                TestCompletionStatus.failure,
+                TestDuration.from_ns(1234567891, 1450858452123456789),
+                exception='Traceback', resources=resources)
+
+            # When
+            decoded = self._round_trip(0, result)
+
+            # Then
+            self.assertEqual(decoded, result)
+            self.assertEqual(decoded.resources, resources)
+            self.assertEqual(decoded.exception, 'Traceback')
+
+    def test_round_trip_nanoseconds(self):
+        # Given
+        result = TestResult(
+            _test_cases.TestCase, 'test_method',
+            TestCompletionStatus.success,
+            TestDuration.from_ns(1234567891, 1450858452123456789))
+
+        # When
+        decoded = self._round_trip(0, result)
+
+        # Then
+        self.assertEqual(decoded.duration.duration_ns, 1234567891)
+        self.assertEqual(decoded.duration.start_ns, 1450858452123456789)
+
+    def test_round_trip_duration_without_start_time(self):
+        # Given
+        result = TestResult(
+            _test_cases.TestCase, 'test_method',
+            TestCompletionStatus.skipped, TestDuration(timedelta(seconds=2)),
+            message='skipped')
+
+        # When
+        decoded = self._round_trip(0, result)
+
+        # Then
+        self.assertEqual(decoded, result)
+        self.assertIsNone(decoded.duration.start_time)
+        self.assertIsNone(decoded.exception)
+
+
+class TestStructResultCodec(ResultCodecTestMixin, unittest.TestCase):
+
+    codec_class = StructResultCodec
+
+
+class TestMarshalResultCodec(ResultCodecTestMixin, unittest.TestCase):
+
+    codec_class = MarshalResultCodec
+
+
+class TestPickleResultCodec(ResultCodecTestMixin, unittest.TestCase):
+
+    codec_class = PickleResultCodec
+
+
+class TestZlibResultCodec(ResultCodecTestMixin, unittest.TestCase):
+
+    codec_class = ZlibResultCodec
+
+    def test_compresses_long_output(self):
+        # Given
+        start_time = datetime(2015, 12, 23, 8, 14, 12)
+        exception = 'Traceback\nStdout:\n' + 'output line\n' * 1000
+        result = TestResult(
+            _test_cases.TestCase, 'test_method', TestCompletionStatus.error,
+            TestDuration(start_time, start_time), exception=exception)
+
+        # When
+        data = self.codec.encode(0, result)
+        decoded = self.codec.decode(data, self.test_cases)
+
+        # Then
+        self.assertLess(len(data), COMPRESSION_THRESHOLD)
+        self.assertEqual(decoded, result)
+        self.assertEqual(decoded.exception, exception)
+
+
+class TestResultCodecs(unittest.TestCase):
+
+    def test_codec_names(self):
+        self.assertEqual(
+            sorted(RESULT_CODECS), ['marshal', 'pickle', 'struct', 'zlib'])
+        for name, codec_class in RESULT_CODECS.items():
+            self.assertEqual(codec_class.name, name)
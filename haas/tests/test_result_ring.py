@@ -0,0 +1,128 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2013-2014 Simon Jagoe
+# All rights reserved.
+#
+# This software may be modified and distributed under the terms
+# of the 3-clause BSD license.  See the LICENSE.txt file for details.
+from __future__ import absolute_import, unicode_literals
+
+from datetime import datetime
+import threading
+import time
+
+from ..result_ring import (
+    RESULT_RECORD, START_RECORD, ResultRing, decode_start, encode_start,
+    shared_memory)
+from ..testing import unittest
+
+
+class TestStartRecord(unittest.TestCase):
+
+    def test_round_trip(self):
+        # Given
+        start_time = datetime(2015, 12, 23, 8, 14, 12, 345678)
+
+        # When
+        index, decoded = decode_start(encode_start(7, start_time))
+
+        # Then
+        self.assertEqual(index, 7)
+        self.assertEqual(decoded, start_time)
+
+
+@unittest.skipIf(shared_memory is None, 'shared memory is not available')
+class TestResultRing(unittest.TestCase):
+
+    def setUp(self):
+        self.ring = ResultRing.create(size=64)
+        self.addCleanup(self.ring.unlink)
+        self.writer = ResultRing.attach(self.ring.name)
+        self.addCleanup(self.writer.close)
+
+    def test_read_empty(self):
+        # When/Then
+        self.assertEqual(self.ring.read(), [])
+
+    def test_records_in_order(self):
+        # When
+        self.writer.write(START_RECORD, b'first')
+        self.writer.write(RESULT_RECORD, b'second')
+
+        # Then
+        self.assertEqual(self.ring.read(), [
+            (START_RECORD, b'first'), (RESULT_RECORD, b'second')])
+        self.assertEqual(self.ring.read(), [])
+
+    def test_records_wrap_around(self):
+        for index in range(20):
+            # Given
+            payload = 'record {0}'.format(index).encode('ascii')
+
+            # When
+            self.writer.write(RESULT_RECORD, payload)
+
+            # Then
+            self.assertEqual(self.ring.read(), [(RESULT_RECORD, payload)])
+
+    def test_large_record_is_split(self):
+        # Given
+        payload = bytes(bytearray(range(256))) * 4
+        records = []
+
+        def read():
+            while not records:
+                records.extend(self.ring.read())
+        reader = threading.Thread(target=read)
+        reader.start()
+
+        # When
+        self.writer.write(RESULT_RECORD, payload)
+        reader.join()
+
+        # Then
+        self.assertEqual(records, [(RESULT_RECORD, payload)])
+
+    def test_unpublished_record_is_not_read(self):
+        # Given
+        self.writer.write(RESULT_RECORD, b'abc')
+        buffer = self.ring._memory.buf
+        offset = bytes(buffer).index(b'abc')
+        # The reader sees the new write position before the payload
+        buffer[offset:offset + 3] = b'xyz'
+
+        # When
+        records = self.ring.read()
+
+        # Then
+        self.assertEqual(records, [])
+
+        # When
+        buffer[offset:offset + 3] = b'abc'
+        records = self.ring.read()
+
+        # Then
+        self.assertEqual(records, [(RESULT_RECORD, b'abc')])
+
+    def test_concurrent_reader_and_writer(self):
+        # Given
+        payloads = [
+            'record {0}'.format(index).encode('ascii') * (index % 7 + 1)
+            for index in range(200)]
+        records = []
+
+        def write():
+            for payload in payloads:
+                self.writer.write(RESULT_RECORD, payload)
+        writer = threading.Thread(target=write)
+
+        # When
+        writer.start()
+        while writer.is_alive():
+            records.extend(self.ring.read())
+            time.sleep(0)
+        writer.join()
+        records.extend(self.ring.read())
+
+        # Then
+        self.assertEqual(records, [
+            (RESULT_RECORD, payload) for payload in payloads])
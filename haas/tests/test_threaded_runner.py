@@ -0,0 +1,164 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2013-2014 Simon Jagoe
+# All rights reserved.
+#
+# This software may be modified and distributed under the terms
+# of the 3-clause BSD license.  See the LICENSE.txt file for details.
+from __future__ import absolute_import, unicode_literals
+
+from argparse import ArgumentParser
+
+from mock import patch
+from six.moves import StringIO
+
+from ..markers import is_thread_safe, thread_safe
+from ..plugins.threaded_runner import ThreadedTestRunner
+from ..plugins.worker_pool import ChildResultHandler
+from ..resource_usage import ResourceMonitor, TestResources
+from ..result import ResultCollector, TestCompletionStatus
+from ..suite import TestSuite
+from ..testing import unittest
+from . import _test_cases, _test_case_data
+
+
+class TestThreadSafeMarker(unittest.TestCase):
+
+    def test_marked_class(self):
+        # Given
+        @thread_safe
+        class Marked(_test_cases.TestCase):
+            pass
+
+        class Subclass(Marked):
+            pass
+
+        # Then
+        self.assertTrue(is_thread_safe(Marked('test_method')))
+        self.assertTrue(is_thread_safe(Subclass('test_method')))
+        self.assertFalse(is_thread_safe(_test_cases.TestCase('test_method')))
+
+
+class TestThreadedTestRunner(unittest.TestCase):
+
+    def setUp(self):
+        _test_case_data.ThreadSafeTests.reset()
+
+    def _run(self, runner, test_suite, **kwargs):
+        result_handler = ChildResultHandler()
+        result_collector = ResultCollector(**kwargs)
+        result_collector.add_result_handler(result_handler)
+        with patch('sys.stdout', new=StringIO()):
+            runner.run(result_collector, test_suite)
+        return result_handler.results
+
+    def test_runs_thread_safe_tests_concurrently(self):
+        # Given
+        test_suite = TestSuite([
+            _test_case_data.NotThreadSafeTest('test_method'),
+            _test_case_data.ThreadSafeTests('test_first'),
+            _test_case_data.ThreadSafeTests('test_second'),
+        ])
+        runner = ThreadedTestRunner(thread_count=2)
+
+        # When
+        results = self._run(runner, test_suite)
+
+        # Then
+        self.assertEqual(
+            sorted(result.test_method_name for result in results[:2]),
+            ['test_first', 'test_second'])
+        self.assertEqual(
+            [result.test_class for result in results[2:]],
+            [_test_case_data.NotThreadSafeTest])
+        by_name = dict(
+            (result.test_method_name, result) for result in results)
+        self.assertEqual(
+            by_name['test_first'].status, TestCompletionStatus.failure)
+        self.assertIn('first failed', by_name['test_first'].exception)
+        self.assertEqual(
+            by_name['test_method'].status, TestCompletionStatus.success)
+
+    def test_captures_output_per_thread(self):
+        # Given
+        test_suite = TestSuite([
+            _test_case_data.ThreadSafeTests('test_first'),
+            _test_case_data.ThreadSafeTests('test_second'),
+        ])
+        runner = ThreadedTestRunner(thread_count=2)
+
+        # When
+        results = self._run(runner, test_suite)
+
+        # Then
+        by_name = dict(
+            (result.test_method_name, result) for result in results)
+        first = by_name['test_first'].exception
+        second = by_name['test_second'].exception
+        self.assertIn('first\n', first)
+        self.assertNotIn('second\n', first)
+        self.assertIn('second\n', second)
+        self.assertNotIn('first\n', second)
+
+    def test_capture_limit(self):
+        # Given
+        test_suite = TestSuite([
+            _test_case_data.ThreadSafeTests('test_first'),
+            _test_case_data.ThreadSafeTests('test_second'),
+        ])
+        runner = ThreadedTestRunner(thread_count=2)
+
+        # When
+        results = self._run(runner, test_suite, capture_limit=4)
+
+        # Then
+        for result in results:
+            self.assertIn('of output truncated', result.exception)
+            self.assertNotIn('Stdout:\nfirst\n', result.exception)
+
+    def test_measure_resources(self):
+        # Given
+        test_suite = TestSuite([
+            _test_case_data.NotThreadSafeTest('test_method'),
+            _test_case_data.ThreadSafeTests('test_first'),
+            _test_case_data.ThreadSafeTests('test_second'),
+        ])
+        runner = ThreadedTestRunner(thread_count=2)
+
+        # When
+        results = self._run(
+            runner, test_suite, resource_monitor=ResourceMonitor())
+
+        # Then
+        self.assertEqual(len(results), 3)
+        for result in results:
+            self.assertIsInstance(result.resources, TestResources)
+            self.assertGreaterEqual(result.resources.cpu_time, 0)
+
+    def test_stops_on_failfast(self):
+        # Given
+        test_suite = TestSuite([
+            _test_cases.TestCase('test_method'),
+            _test_cases.TestCase('test_method'),
+        ])
+        runner = ThreadedTestRunner()
+        result_collector = ResultCollector()
+        result_collector.stop()
+
+        # When
+        runner.run(result_collector, test_suite)
+
+        # Then
+        self.assertEqual(result_collector.testsRun, 0)
+
+    def test_from_args(self):
+        # Given
+        parser = ArgumentParser()
+        ThreadedTestRunner.add_parser_arguments(
+            parser, '--runner-', 'runner_')
+        args = parser.parse_args(['--threads', '3'])
+
+        # When
+        runner = ThreadedTestRunner.from_args(args, 'runner_')
+
+        # Then
+        self.assertEqual(runner.thread_count, 3)
@@ -0,0 +1,386 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2013-2014 Simon Jagoe
+# All rights reserved.
+#
+# This software may be modified and distributed under the terms
+# of the 3-clause BSD license.  See the LICENSE.txt file for details.
+from __future__ import absolute_import, unicode_literals
+
+from datetime import datetime, timedelta
+import os
+import shutil
+import sqlite3
+import subprocess
+import tempfile
+
+from mock import patch
+from six.moves import StringIO
+
+from ..haas_application import HaasApplication, create_argument_parser
+from ..plugins.result_handler import _WritelnDecorator
+from ..plugins.timing_history import TimingHistoryResultHandler
+from ..resource_usage import TestResources
+from ..result import TestCompletionStatus, TestDuration, TestResult
+from ..testing import unittest
+from ..timing_history import TimingHistory, git_revision, print_history
+from . import _test_cases
+
+
+class TimingHistoryFixture(object):
+
+    def setUp(self):
+        self.tempdir = tempfile.mkdtemp(prefix='haas-tests-')
+        self.path = os.path.join(self.tempdir, 'timings.sqlite')
+
+    def tearDown(self):
+        shutil.rmtree(self.tempdir)
+
+    def _record_runs(self, runs):
+        # ``runs`` is a list of {test_id: duration} for each run.
+        with TimingHistory(self.path) as history:
+            for durations in runs:
+                history.start_run('abc123')
+                for test_id, duration in sorted(durations.items()):
+                    history.record(test_id, 'success', duration)
+                history.finish_run()
+
+
+class TestTimingHistory(TimingHistoryFixture, unittest.TestCase):
+
+    def test_record_run(self):
+        # Given
+        history = TimingHistory(self.path)
+
+        # When
+        run_id = history.start_run('abc123', started=1000.0)
+        history.record('a.B.test_c', 'success', 1.5)
+        history.record('a.B.test_d', 'failure', 0.5,
+                       TestResources(0.25, 0.125, 4096, None))
+        history.finish_run()
+        history.close()
+
+        # Then
+        connection = sqlite3.connect(self.path)
+        self.addCleanup(connection.close)
+        journal_mode, = connection.execute(
+            'PRAGMA journal_mode').fetchone()
+        self.assertEqual(journal_mode, 'wal')
+        self.assertEqual(
+            connection.execute('SELECT * FROM runs').fetchall(),
+            [(run_id, 1000.0, 'abc123')])
+        self.assertEqual(
+            connection.execute(
+                'SELECT * FROM durations ORDER BY test_id').fetchall(),
+            [(run_id, 'a.B.test_c', 'success', 1.5, None, None, None, None),
+             (run_id, 'a.B.test_d', 'failure', 0.5, 0.25, 0.125, 4096,
+              None)])
+
+    def test_upgrade_version_1(self):
+        # Given
+        connection = sqlite3.connect(self.path)
+        with connection:
+            connection.execute(
+                'CREATE TABLE runs (id INTEGER PRIMARY KEY, '
+                'started REAL NOT NULL, revision TEXT)')
+            connection.execute(
+                'CREATE TABLE durations (run_id INTEGER NOT NULL, '
+                'test_id TEXT NOT NULL, status TEXT NOT NULL, '
+                'duration REAL NOT NULL)')
+            connection.execute("INSERT INTO runs VALUES (1, 1000.0, NULL)")
+            connection.execute(
+                "INSERT INTO durations VALUES (1, 'a.B.test_c', 'success', "
+                "1.5)")
+            connection.execute('PRAGMA user_version = 1')
+        connection.close()
+
+        # When
+        with TimingHistory(self.path) as history:
+            history.start_run()
+            history.record('a.B.test_c', 'success', 2.5,
+                           TestResources(0.25, 0.125, 4096, 1024))
+            history.finish_run()
+            timings = history.test_timings()
+
+        # Then
+        self.assertEqual(timings[0].count, 2)
+        self.assertAlmostEqual(timings[0].mean, 2.0)
+
+    def test_record_without_run(self):
+        # Given
+        with TimingHistory(self.path) as history:
+            # When/Then
+            with self.assertRaises(ValueError):
+                history.record('a.B.test_c', 'success', 1.5)
+
+    def test_record_in_batches(self):
+        # Given
+        history = TimingHistory(self.path)
+        history.BATCH_SIZE = 2
+        history.start_run()
+
+        # When
+        for index in range(3):
+            history.record('a.B.test_{0}'.format(index), 'success', 1.0)
+
+        # Then
+        self.assertEqual(len(history._pending), 1)
+        history.close()
+        with TimingHistory(self.path) as history:
+            self.assertEqual(len(history.test_timings()), 3)
+
+    def test_test_timings(self):
+        # Given
+        self._record_runs([
+            {'a.B.test_slow': 3.0, 'a.B.test_fast': 0.1},
+            {'a.B.test_slow': 5.0, 'a.B.test_fast': 0.1},
+            {'a.B.test_slow': 7.0, 'a.B.test_fast': 0.1},
+        ])
+
+        # When
+        with TimingHistory(self.path) as history:
+            timings = history.test_timings()
+            recent = history.test_timings(runs=2)
+
+        # Then
+        fast, slow = timings
+        self.assertEqual(fast.test_id, 'a.B.test_fast')
+        self.assertAlmostEqual(fast.stdev, 0.0)
+        self.assertAlmostEqual(fast.growth, 0.0)
+        self.assertEqual(slow.test_id, 'a.B.test_slow')
+        self.assertEqual(slow.count, 3)
+        self.assertAlmostEqual(slow.mean, 5.0)
+        self.assertAlmostEqual(slow.stdev, 2.0)
+        self.assertAlmostEqual(slow.growth, 2.0)
+        self.assertEqual(recent[1].count, 2)
+        self.assertAlmostEqual(recent[1].mean, 6.0)
+        self.assertIsNone(recent[1].growth)
+
+    def test_slowest_variable_and_growing(self):
+        # Given
+        self._record_runs([
+            {'slow': 10.0, 'variable': 0.1, 'growing': 1.0},
+            {'slow': 10.0, 'variable': 2.0, 'growing': 2.0},
+            {'slow': 10.0, 'variable': 0.1, 'growing': 3.0},
+        ])
+
+        # When
+        with TimingHistory(self.path) as history:
+            slowest = history.slowest(limit=2)
+            variable = history.most_variable(limit=1)
+            growing = history.fastest_growing()
+
+        # Then
+        self.assertEqual([t.test_id for t in slowest], ['slow', 'growing'])
+        self.assertEqual([t.test_id for t in variable], ['variable'])
+        self.assertEqual([t.test_id for t in growing], ['growing'])
+
+    def test_regressions(self):
+        # Given
+        baseline = [
+            {'steady': 1.0 + 0.01 * (index % 3), 'regressed': 1.0,
+             'noisy': 0.5 + index % 2}
+            for index in range(10)]
+        self._record_runs(
+            baseline + [{'steady': 1.02, 'regressed': 2.0, 'noisy': 1.5}])
+
+        # When
+        with TimingHistory(self.path) as history:
+            regressions = history.regressions()
+            earlier = history.regressions(run_id=history.run_ids()[-2])
+
+        # Then
+        self.assertEqual(len(regressions), 1)
+        regression, = regressions
+        self.assertEqual(regression.test_id, 'regressed')
+        self.assertEqual(regression.duration, 2.0)
+        self.assertAlmostEqual(regression.mean, 1.0)
+        self.assertEqual(regression.count, 10)
+        self.assertEqual(earlier, [])
+
+    def test_regressions_need_baseline(self):
+        # Given
+        self._record_runs([{'test': 1.0}, {'test': 1.0}, {'test': 5.0}])
+
+        # When
+        with TimingHistory(self.path) as history:
+            regressions = history.regressions()
+
+        # Then
+        self.assertEqual(regressions, [])
+
+    def test_regressions_empty_history(self):
+        # When
+        with TimingHistory(self.path) as history:
+            regressions = history.regressions()
+
+        # Then
+        self.assertEqual(regressions, [])
+
+    def test_print_history(self):
+        # Given
+        self._record_runs([{'a.B.test_c': 1.0 + index} for index in range(3)])
+        stream = StringIO()
+
+        # When
+        with TimingHistory(self.path) as history:
+            print_history(history, stream)
+
+        # Then
+        output = stream.getvalue()
+        self.assertIn(
+            'Timing history of 1 tests over the last 20 runs', output)
+        self.assertEqual(output.count('a.B.test_c'), 3)
+        self.assertIn('+1.000s     3  a.B.test_c\n', output)
+
+    def test_git_revision(self):
+        # When
+        with patch('subprocess.check_output', return_value=b'abc123\n'):
+            revision = git_revision()
+
+        # Then
+        self.assertEqual(revision, 'abc123')
+
+        # When
+        with patch('subprocess.check_output', side_effect=OSError):
+            revision = git_revision()
+
+        # Then
+        self.assertIsNone(revision)
+
+        # When
+        error = subprocess.CalledProcessError(128, ['git'])
+        with patch('subprocess.check_output', side_effect=error):
+            revision = git_revision()
+
+        # Then
+        self.assertIsNone(revision)
+
+
+class TestTimingHistoryResultHandler(TimingHistoryFixture, unittest.TestCase):
+
+    def _result(self, seconds, status=TestCompletionStatus.success):
+        start_time = datetime(2015, 12, 23, 8, 14, 12)
+        duration = timedelta(seconds=seconds)
+        return TestResult.from_test_case(
+            _test_cases.TestCase('test_method'), status,
+            TestDuration(start_time, start_time + duration))
+
+    def _run(self, handler, results):
+        stream = StringIO()
+        handler.stream = _WritelnDecorator(stream)
+        handler.start_test_run()
+        for result in results:
+            handler(result)
+        handler.stop_test_run()
+        return stream.getvalue()
+
+    def test_records_results(self):
+        # Given
+        handler = TimingHistoryResultHandler(self.path, revision='abc123')
+
+        # When
+        output = self._run(handler, [
+            self._result(1.5),
+            self._result(0.5, TestCompletionStatus.failure),
+        ])
+
+        # Then
+        self.assertEqual(output, '')
+        self.assertIsNone(handler.history)
+        connection = sqlite3.connect(self.path)
+        self.addCleanup(connection.close)
+        self.assertEqual(
+            connection.execute('SELECT revision FROM runs').fetchall(),
+            [('abc123',)])
+        test_id = 'haas.tests._test_cases.TestCase.test_method'
+        self.assertEqual(
+            connection.execute(
+                'SELECT test_id, status, duration FROM durations').fetchall(),
+            [(test_id, 'success', 1.5), (test_id, 'failure', 0.5)])
+
+    def test_report_regressions(self):
+        # Given
+        for index in range(5):
+            self._run(TimingHistoryResultHandler(self.path),
+                      [self._result(1.0)])
+        handler = TimingHistoryResultHandler(
+            self.path, report_regressions=True)
+
+        # When
+        output = self._run(handler, [self._result(3.0)])
+
+        # Then
+        self.assertIn('Timing regressions against the last 20 runs', output)
+        self.assertIn(
+            '  00:03.000 (mean 00:01.000, std dev 00:00.000) '
+            'haas.tests._test_cases.TestCase.test_method\n', output)
+
+    @patch('haas.plugins.timing_history.git_revision')
+    def test_from_args(self, git_revision):
+        # Given
+        git_revision.return_value = 'abc123'
+        args = type(str('Args'), (object,), dict(
+            timing_history=None, timing_history_revision=None,
+            timing_regressions=False))
+
+        # When
+        handler = TimingHistoryResultHandler.from_args(
+            args, 'timing_history', 'timing_history', 1)
+
+        # Then
+        self.assertIsNone(handler)
+
+        # Given
+        args.timing_history = self.path
+
+        # When
+        handler = TimingHistoryResultHandler.from_args(
+            args, 'timing_history', 'timing_history', 1)
+
+        # Then
+        self.assertEqual(handler.path, self.path)
+        self.assertEqual(handler.revision, 'abc123')
+        self.assertFalse(handler.report_regressions)
+
+
+class TestShowHistory(TimingHistoryFixture, unittest.TestCase):
+
+    def test_show_history(self):
+        # Given
+        self._record_runs([{'a.B.test_c': 1.0}, {'a.B.test_c': 2.0}])
+        application = HaasApplication(['haas', '--show-history', self.path])
+        stream = StringIO()
+
+        # When
+        with patch('sys.stdout', stream):
+            exit_code = application.run()
+
+        # Then
+        self.assertEqual(exit_code, 0)
+        output = stream.getvalue()
+        self.assertIn('Slowest tests', output)
+        self.assertIn('Most variable tests', output)
+        self.assertIn('Fastest growing tests', output)
+        self.assertIn('a.B.test_c', output)
+
+    def test_history_is_a_start_directory(self):
+        # When
+        args = create_argument_parser().parse_args(['history'])
+
+        # Then
+        self.assertEqual(args.start, ['history'])
+        self.assertIsNone(args.show_history)
+
+    def test_show_history_missing_database(self):
+        # Given
+        application = HaasApplication(['haas', '--show-history', self.path])
+        args = application.parser.parse_args(['--show-history', self.path])
+        stream = StringIO()
+
+        # When
+        exit_code = application.show_history(args, stream=stream)
+
+        # Then
+        self.assertEqual(exit_code, 1)
+        self.assertIn('No timing history in', stream.getvalue())
+        self.assertFalse(os.path.exists(self.path))
@@ -10,7 +10,7 @@ from mock import patch
 
 import haas
 from ..testing import unittest
-from ..utils import configure_logging
+from ..utils import configure_logging, parse_size
 
 
 class TestConfigureLogging(unittest.TestCase):
@@ -19,3 +19,15 @@ class TestConfigureLogging(unittest.TestCase):
     def test_configure_logging(self, get_logger):
         configure_logging('debug')
         get_logger.assert_called_once_with(haas.__name__)
+
+
+class TestParseSize(unittest.TestCase):
+
+    def test_parse_size(self):
+        # When/Then
+        self.assertEqual(parse_size('1000'), 1000)
+        self.assertEqual(parse_size('2k'), 2048)
+        self.assertEqual(parse_size('1.5M'), 1572864)
+        self.assertEqual(parse_size('2G'), 2 * 1024 ** 3)
+        with self.assertRaises(ValueError):
+            parse_size('lots')
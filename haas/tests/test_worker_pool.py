@@ -0,0 +1,570 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2013-2014 Simon Jagoe
+# All rights reserved.
+#
+# This software may be modified and distributed under the terms
+# of the 3-clause BSD license.  See the LICENSE.txt file for details.
+from __future__ import absolute_import, unicode_literals
+
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+import os
+import shutil
+import sys
+import tempfile
+
+from mock import Mock, patch
+
+from ..plugins.worker_pool import (
+    SHARED_MEMORY_TRANSPORT, WorkerPool, _WorkerProcess, _cgroup_cpu_limit,
+    available_cpus, default_process_count)
+from ..result import (
+    CAPTURE_FD, TestCompletionStatus, TestDuration, TestResult)
+from ..result_codec import RESULT_CODECS
+from ..result_ring import (
+    RESULT_RECORD, START_RECORD, encode_start, shared_memory)
+from ..testing import unittest
+from . import _test_cases, _test_case_data
+
+
+def _run_pool(pool, timeout=30):
+    results = []
+    pool.start()
+    try:
+        for _ in range(int(timeout / 0.1)):
+            if not pool.has_work:
+                break
+            results.extend(pool.poll(0.1))
+        else:
+            raise AssertionError('Pool did not finish')
+    finally:
+        pool.shutdown()
+    return results
+
+
+@contextmanager
+def _redirect_worker_output():
+    """Point stdout and stderr at a temporary file while worker
+    processes are started, so that the output they mirror for failed
+    tests does not appear in the output of the test run.
+
+    """
+    sys.stdout.flush()
+    sys.stderr.flush()
+    saved = [os.dup(1), os.dup(2)]
+    with tempfile.TemporaryFile() as output:
+        os.dup2(output.fileno(), 1)
+        os.dup2(output.fileno(), 2)
+        try:
+            yield
+        finally:
+            os.dup2(saved[0], 1)
+            os.dup2(saved[1], 2)
+            for fd in saved:
+                os.close(fd)
+
+
+def _add_idle_worker(pool):
+    worker_id = pool._next_worker_id
+    pool._next_worker_id += 1
+    worker = _WorkerProcess(worker_id, Mock(), Mock(), None)
+    worker.ready = True
+    pool._workers[worker_id] = worker
+    return worker
+
+
+def _finish_task(pool, worker):
+    pool._handle_message(worker, ('done', worker.task[0], (None, None)))
+
+
+class TestWorkerPool(unittest.TestCase):
+
+    def test_runs_submitted_tasks(self):
+        # Given
+        pool = WorkerPool(2)
+        pool.submit([_test_cases.TestCase('test_method'),
+                     _test_cases.PythonTestCase('test_method')])
+        pool.submit([_test_case_data.TestCaseSubclass('test_method')])
+
+        # When
+        results = _run_pool(pool)
+
+        # Then
+        self.assertEqual(
+            sorted(result.test_class.__name__ for result in results),
+            ['PythonTestCase', 'TestCase', 'TestCaseSubclass'])
+        self.assertTrue(all(result.status == TestCompletionStatus.success
+                            for result in results))
+        self.assertFalse(pool.has_work)
+
+    def test_result_codecs(self):
+        for result_codec in sorted(RESULT_CODECS):
+            # Given
+            pool = WorkerPool(1, result_codec=result_codec)
+            pool.submit([_test_case_data.TestCaseSubclass('test_method'),
+                         _test_case_data.TestWithTwoErrors(
+                             'test_with_two_errors')])
+
+            # When
+            results = _run_pool(pool)
+
+            # Then
+            self.assertEqual(
+                [(result.test_class, result.status) for result in results],
+                [(_test_case_data.TestCaseSubclass,
+                  TestCompletionStatus.success),
+                 (_test_case_data.TestWithTwoErrors,
+                  TestCompletionStatus.error),
+                 (_test_case_data.TestWithTwoErrors,
+                  TestCompletionStatus.error)])
+            self.assertIn('An error in a test case', results[1].exception)
+            self.assertIn('An error in tearDown', results[2].exception)
+            self.assertIsNotNone(results[0].duration.start_time)
+
+    @unittest.skipIf(shared_memory is None, 'shared memory is not available')
+    def test_shared_memory_transport(self):
+        # Given
+        pool = WorkerPool(2, result_transport=SHARED_MEMORY_TRANSPORT)
+        pool.submit([_test_case_data.TestCaseSubclass('test_method'),
+                     _test_case_data.TestWithTwoErrors(
+                         'test_with_two_errors')])
+        pool.submit([_test_cases.TestCase('test_method')])
+
+        # When
+        results = _run_pool(pool)
+
+        # Then
+        self.assertEqual(
+            sorted((result.test_class.__name__, result.status.name)
+                   for result in results),
+            [('TestCase', 'success'),
+             ('TestCaseSubclass', 'success'),
+             ('TestWithTwoErrors', 'error'),
+             ('TestWithTwoErrors', 'error')])
+        self.assertEqual(pool._workers, {})
+
+    @unittest.skipIf(shared_memory is None, 'shared memory is not available')
+    def test_shared_memory_transport_worker_crash(self):
+        # Given
+        pool = WorkerPool(1, result_transport=SHARED_MEMORY_TRANSPORT)
+        pool.submit([_test_case_data.TestWithCrash('test_fast'),
+                     _test_case_data.TestWithCrash('test_exit'),
+                     _test_case_data.TestWithCrash('test_fast')])
+
+        # When
+        results = _run_pool(pool)
+
+        # Then
+        self.assertEqual(
+            [(result.test_method_name, result.status.name)
+             for result in results],
+            [('test_fast', 'success'),
+             ('test_exit', 'error'),
+             ('test_fast', 'success')])
+
+    def test_max_tasks_replaces_workers(self):
+        # Given
+        pool = WorkerPool(1, maxtasksperchild=1)
+        for _ in range(3):
+            pool.submit([_test_cases.TestCase('test_method')])
+
+        # When
+        results = _run_pool(pool)
+
+        # Then
+        self.assertEqual(len(results), 3)
+        self.assertEqual(pool._next_worker_id, 3)
+
+    def test_cancel(self):
+        # Given
+        pool = WorkerPool(1)
+        pool.submit([_test_case_data.TestWithHang('test_hang')])
+        pool.submit([_test_case_data.TestWithHang('test_fast')])
+        pool.start()
+        for _ in range(100):
+            pool.poll(0.1)
+            worker, = pool._workers.values()
+            if worker.current_test is not None:
+                break
+
+        # When
+        pool.cancel()
+
+        # Then
+        self.assertFalse(pool.has_work)
+        self.assertEqual(pool._workers, {})
+        self.assertFalse(worker.process.is_alive())
+
+    def test_max_rss_replaces_workers(self):
+        # Given
+        pool = WorkerPool(1, max_rss=1)
+        for _ in range(3):
+            pool.submit([_test_cases.TestCase('test_method')])
+
+        # When
+        results = _run_pool(pool)
+
+        # Then
+        self.assertEqual(len(results), 3)
+        self.assertEqual(pool._next_worker_id, 3)
+        self.assertEqual(sorted(pool.memory_usage), [0, 1, 2])
+        for usage in pool.memory_usage.values():
+            self.assertTrue(usage.recycled)
+            self.assertEqual(usage.tasks_run, 1)
+            self.assertGreater(usage.peak_rss, 0)
+
+    def test_memory_usage_without_limit(self):
+        # Given
+        pool = WorkerPool(1)
+        for _ in range(3):
+            pool.submit([_test_cases.TestCase('test_method')])
+
+        # When
+        _run_pool(pool)
+
+        # Then
+        self.assertEqual(list(pool.memory_usage), [0])
+        usage = pool.memory_usage[0]
+        self.assertFalse(usage.recycled)
+        self.assertEqual(usage.tasks_run, 3)
+        self.assertIsNotNone(usage.pid)
+
+    def test_test_timeout_kills_worker_and_reschedules(self):
+        # Given
+        pool = WorkerPool(1, test_timeout=lambda test_case: 0.5)
+        pool.submit([_test_case_data.TestWithHang('test_hang'),
+                     _test_case_data.TestWithHang('test_fast')])
+
+        # When
+        results = _run_pool(pool)
+
+        # Then
+        by_method = dict(
+            (result.test_method_name, result) for result in results)
+        self.assertEqual(sorted(by_method), ['test_fast', 'test_hang'])
+        hung = by_method['test_hang']
+        self.assertEqual(hung.status, TestCompletionStatus.error)
+        self.assertIn('Test timed out', hung.exception)
+        self.assertIn('the worker process was killed', hung.exception)
+        self.assertEqual(
+            by_method['test_fast'].status, TestCompletionStatus.success)
+        self.assertEqual(pool._next_worker_id, 2)
+
+    def test_terminate(self):
+        # Given
+        pool = WorkerPool(1)
+        pool.submit([_test_case_data.TestWithHang('test_hang'),
+                     _test_case_data.TestWithHang('test_fast')])
+        pool.submit([_test_cases.TestCase('test_method'),
+                     _test_cases.PythonTestCase('test_method')])
+        pool.start()
+        results = []
+        try:
+            while not any(worker.current_test is not None
+                          for worker in pool._workers.values()):
+                results.extend(pool.poll(0.1))
+
+            # When
+            results.extend(pool.terminate('Stopped'))
+        finally:
+            pool.shutdown()
+
+        # Then
+        self.assertEqual(len(results), 4)
+        by_method = dict(
+            (result.test_method_name, result) for result in results)
+        self.assertIn('Stopped; the worker process was killed',
+                      by_method['test_hang'].exception)
+        self.assertIn('Stopped; the test was not run',
+                      by_method['test_fast'].exception)
+        self.assertTrue(all(result.status == TestCompletionStatus.error
+                            for result in results))
+        self.assertFalse(pool.has_work)
+
+    def test_kill_worker_drains_ring(self):
+        # Given
+        pool = WorkerPool(1)
+        worker = _add_idle_worker(pool)
+        finished = _test_cases.TestCase('test_method')
+        running = _test_cases.PythonTestCase('test_method')
+        start_time = datetime(2015, 12, 23, 8, 14, 12)
+        result = TestResult.from_test_case(
+            finished, TestCompletionStatus.success,
+            TestDuration(start_time, start_time + timedelta(seconds=1)))
+        worker.task = (1, [finished, running])
+        pool._handle_message(worker, ('start', 1, (0, start_time)))
+        worker.ring = Mock()
+        worker.ring.read.return_value = [
+            (RESULT_RECORD, pool._codec.encode(0, result)),
+            (START_RECORD, encode_start(1, start_time)),
+        ]
+
+        # When
+        with patch.object(pool, '_kill'):
+            results = pool._kill_worker(worker, 'Stopped')
+
+        # Then
+        self.assertEqual(len(results), 2)
+        self.assertEqual(results[0].test_class, type(finished))
+        self.assertEqual(results[0].status, TestCompletionStatus.success)
+        self.assertEqual(results[1].test_class, type(running))
+        self.assertEqual(results[1].status, TestCompletionStatus.error)
+        self.assertIn('Stopped; the worker process was killed',
+                      results[1].exception)
+        self.assertFalse(pool._workers)
+
+    def test_capture_fd_in_worker(self):
+        # Given
+        pool = WorkerPool(1, capture=CAPTURE_FD)
+        pool.submit([_test_case_data.TestWithFdOutput('test_fd_output')])
+
+        # When
+        with _redirect_worker_output():
+            result, = _run_pool(pool)
+
+        # Then
+        self.assertEqual(result.status, TestCompletionStatus.failure)
+        self.assertIn('Fd output', result.exception)
+
+
+class TestWorkerPoolCrashes(unittest.TestCase):
+
+    @unittest.skipIf(sys.platform.startswith('win'), 'Requires POSIX signals')
+    def test_worker_killed_by_signal(self):
+        # Given
+        pool = WorkerPool(1)
+        pool.submit([_test_case_data.TestWithCrash('test_killed'),
+                     _test_case_data.TestWithCrash('test_fast')])
+
+        # When
+        results = _run_pool(pool)
+
+        # Then
+        by_method = dict(
+            (result.test_method_name, result) for result in results)
+        self.assertEqual(sorted(by_method), ['test_fast', 'test_killed'])
+        killed = by_method['test_killed']
+        self.assertEqual(killed.status, TestCompletionStatus.error)
+        self.assertIn('was killed by signal SIGTERM', killed.exception)
+        self.assertEqual(
+            by_method['test_fast'].status, TestCompletionStatus.success)
+
+    def test_worker_exits(self):
+        # Given
+        pool = WorkerPool(2)
+        pool.submit([_test_case_data.TestWithCrash('test_exit')])
+        pool.submit([_test_case_data.TestWithCrash('test_fast')])
+
+        # When
+        results = _run_pool(pool)
+
+        # Then
+        by_method = dict(
+            (result.test_method_name, result) for result in results)
+        self.assertEqual(sorted(by_method), ['test_exit', 'test_fast'])
+        self.assertIn('exited with code 3', by_method['test_exit'].exception)
+
+    def test_unpicklable_test(self):
+        # Given
+        pool = WorkerPool(1)
+        pool.submit([_test_case_data.TestUnpicklable('test_method'),
+                     _test_cases.TestCase('test_method')])
+
+        # When
+        results = _run_pool(pool)
+
+        # Then
+        by_class = dict(
+            (result.test_class.__name__, result) for result in results)
+        self.assertEqual(sorted(by_class), ['TestCase', 'TestUnpicklable'])
+        unpicklable = by_class['TestUnpicklable']
+        self.assertEqual(unpicklable.status, TestCompletionStatus.error)
+        self.assertIn('could not be sent', unpicklable.exception)
+        self.assertEqual(
+            by_class['TestCase'].status, TestCompletionStatus.success)
+
+    def test_initializer_fails(self):
+        # Given
+        pool = WorkerPool(
+            2, initializer=_test_case_data.failing_initializer)
+        pool.submit([_test_cases.TestCase('test_method')])
+        pool.submit([_test_cases.PythonTestCase('test_method')])
+
+        # When
+        results = _run_pool(pool)
+
+        # Then
+        self.assertEqual(len(results), 2)
+        for result in results:
+            self.assertEqual(result.status, TestCompletionStatus.error)
+            self.assertIn('initializer failed', result.exception)
+            self.assertIn('Initializer failed', result.exception)
+
+
+class TestWorkerPoolRequirements(unittest.TestCase):
+
+    def _running(self, workers):
+        return [worker.task[1][0] for worker in workers
+                if worker.task is not None]
+
+    def test_tests_sharing_a_resource_do_not_run_together(self):
+        # Given
+        pool = WorkerPool(2)
+        workers = [_add_idle_worker(pool) for _ in range(2)]
+        read = _test_case_data.DatabaseTests('test_read')
+        write = _test_case_data.DatabaseTests('test_write')
+        other = _test_cases.TestCase('test_method')
+        for test_case in (read, write, other):
+            pool.submit([test_case])
+
+        # When
+        pool._dispatch()
+
+        # Then
+        self.assertEqual(self._running(workers), [read, other])
+
+        # When
+        _finish_task(pool, workers[0])
+        pool._dispatch()
+
+        # Then
+        self.assertEqual(self._running(workers), [write, other])
+        self.assertFalse(pool._pending)
+
+    def test_cpu_slots_are_not_oversubscribed(self):
+        # Given
+        pool = WorkerPool(4)
+        workers = [_add_idle_worker(pool) for _ in range(4)]
+        first = _test_cases.TestCase('test_method')
+        heavy = _test_case_data.HeavyTests('test_heavier')
+        last = _test_cases.PythonTestCase('test_method')
+        for test_case in (first, heavy, last):
+            pool.submit([test_case])
+
+        # When
+        pool._dispatch()
+
+        # Then
+        self.assertEqual(self._running(workers), [first])
+
+        # When
+        _finish_task(pool, workers[0])
+        pool._dispatch()
+
+        # Then
+        self.assertEqual(self._running(workers), [heavy])
+
+        # When
+        _finish_task(pool, workers[0])
+        pool._dispatch()
+
+        # Then
+        self.assertEqual(self._running(workers), [last])
+        self.assertEqual(pool._task_requirements, {})
+
+
+class TestCpuCount(unittest.TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root)
+        self.proc_cgroup = os.path.join(self.root, 'cgroup')
+        self.cgroup_root = os.path.join(self.root, 'sys')
+
+    def _write(self, path, contents):
+        directory = os.path.dirname(path)
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        with open(path, 'w') as fh:
+            fh.write(contents)
+
+    def _cgroup_cpu_limit(self):
+        return _cgroup_cpu_limit(self.cgroup_root, self.proc_cgroup)
+
+    def test_no_cgroup(self):
+        # When/Then
+        self.assertIsNone(self._cgroup_cpu_limit())
+
+    def test_cgroup_v1_only(self):
+        # Given
+        self._write(self.proc_cgroup, '4:cpu,cpuacct:/docker/abc\n')
+
+        # When/Then
+        self.assertIsNone(self._cgroup_cpu_limit())
+
+    def test_unlimited_cgroup(self):
+        # Given
+        self._write(self.proc_cgroup, '0::/ci/job\n')
+        self._write(os.path.join(self.cgroup_root, 'ci', 'job', 'cpu.max'),
+                    'max 100000\n')
+
+        # When/Then
+        self.assertIsNone(self._cgroup_cpu_limit())
+
+    def test_most_restrictive_quota(self):
+        # Given
+        self._write(self.proc_cgroup, '0::/ci/job\n')
+        self._write(os.path.join(self.cgroup_root, 'ci', 'cpu.max'),
+                    '150000 100000\n')
+        self._write(os.path.join(self.cgroup_root, 'ci', 'job', 'cpu.max'),
+                    '400000 100000\n')
+
+        # When/Then
+        self.assertEqual(self._cgroup_cpu_limit(), 1.5)
+
+    @patch('haas.plugins.worker_pool._cgroup_cpu_limit')
+    @patch('haas.plugins.worker_pool.available_cpus')
+    def test_default_process_count(self, cpus, cpu_limit):
+        # Given
+        cpus.return_value = [0, 1, 2, 3]
+        cpu_limit.return_value = None
+
+        # When/Then
+        self.assertEqual(default_process_count(), 4)
+
+        # Given
+        cpu_limit.return_value = 1.5
+
+        # When/Then
+        self.assertEqual(default_process_count(), 2)
+
+        # Given
+        cpu_limit.return_value = 0.1
+
+        # When/Then
+        self.assertEqual(default_process_count(), 1)
+
+
+@unittest.skipUnless(hasattr(os, 'sched_setaffinity'),
+                     'CPU affinity is not supported')
+class TestWorkerPoolPinning(unittest.TestCase):
+
+    def test_workers_share_cpus_evenly(self):
+        # Given
+        cpus = available_cpus()
+        pool = WorkerPool(len(cpus) + 1, pin_workers=True)
+
+        # When
+        pinned = []
+        for _ in range(len(cpus) + 1):
+            cpu = pool._choose_cpu()
+            _add_idle_worker(pool).cpu = cpu
+            pinned.append(cpu)
+
+        # Then
+        self.assertEqual(pinned, cpus + cpus[:1])
+
+    def test_worker_is_pinned(self):
+        # Given
+        cpu = available_cpus()[-1]
+        pool = WorkerPool(1, pin_workers=True)
+        pool._choose_cpu = lambda: cpu
+        pool.submit([_test_case_data.TestCpuAffinity('test_affinity')])
+
+        # When
+        results = _run_pool(pool)
+
+        # Then
+        self.assertEqual(len(results), 1)
+        self.assertIn('AssertionError: {0}\n'.format(cpu),
+                      results[0].exception)
@@ -0,0 +1,409 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2013-2014 Simon Jagoe
+# All rights reserved.
+#
+# This software may be modified and distributed under the terms
+# of the 3-clause BSD license.  See the LICENSE.txt file for details.
+from __future__ import absolute_import, unicode_literals
+
+from collections import namedtuple
+import logging
+import math
+import os
+import sqlite3
+import subprocess
+import time
+
+from six.moves.urllib.request import pathname2url
+
+from .result import TestDuration
+
+logger = logging.getLogger(__name__)
+
+#: The database used by ``--timing-history`` and ``--show-history`` when
+#: no path is given.
+DEFAULT_TIMING_HISTORY = '.haas-timing-history.sqlite'
+
+#: The number of earlier runs that make up the rolling baseline of the
+#: duration of a test.
+BASELINE_RUNS = 20
+
+#: The number of standard deviations above the baseline mean, allowing
+#: for the uncertainty of the mean, that a duration must exceed to be a
+#: regression.
+REGRESSION_THRESHOLD = 3.0
+
+#: The smallest ratio of a duration to its baseline mean that is a
+#: regression.
+REGRESSION_MIN_RATIO = 1.2
+
+#: The smallest increase over the baseline mean, in seconds, that is a
+#: regression.
+REGRESSION_MIN_INCREASE = 0.001
+
+#: The smallest number of baseline durations needed to detect a
+#: regression.
+REGRESSION_MIN_SAMPLES = 5
+
+_SCHEMA_VERSION = 2
+
+_SCHEMA = (
+    """CREATE TABLE IF NOT EXISTS runs (
+        id INTEGER PRIMARY KEY,
+        started REAL NOT NULL,
+        revision TEXT
+    )""",
+    """CREATE TABLE IF NOT EXISTS durations (
+        run_id INTEGER NOT NULL REFERENCES runs (id),
+        test_id TEXT NOT NULL,
+        status TEXT NOT NULL,
+        duration REAL NOT NULL,
+        user_time REAL,
+        system_time REAL,
+        max_rss_delta INTEGER,
+        tracemalloc_peak INTEGER
+    )""",
+    """CREATE INDEX IF NOT EXISTS durations_run_id
+        ON durations (run_id, test_id)""",
+)
+
+# Upgrades the durations table of version 1, which did not record
+# resources.
+_RESOURCE_COLUMNS = (
+    ('user_time', 'REAL'),
+    ('system_time', 'REAL'),
+    ('max_rss_delta', 'INTEGER'),
+    ('tracemalloc_peak', 'INTEGER'),
+)
+
+#: The durations of a test over the recent runs: the number of
+#: durations, their mean and standard deviation (``None`` for a single
+#: duration), and the least-squares growth of the duration in seconds
+#: per run (``None`` for fewer than three durations).
+TestTimings = namedtuple(
+    'TestTimings', ['test_id', 'count', 'mean', 'stdev', 'growth'])
+
+#: A test whose ``duration`` in a run regressed against the ``mean`` and
+#: ``stdev`` of ``count`` baseline durations.
+Regression = namedtuple(
+    'Regression', ['test_id', 'duration', 'mean', 'stdev', 'count'])
+
+
+def git_revision(directory=None):
+    """Return the abbreviated git revision checked out in ``directory``
+    (defaults to the current directory), or ``None`` if it is not in a
+    git repository.
+
+    """
+    try:
+        output = subprocess.check_output(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=directory,
+            stderr=subprocess.STDOUT)
+    except (OSError, subprocess.CalledProcessError) as exc:
+        logger.debug('Unable to find the git revision: %s', exc)
+        return None
+    return output.decode('ascii', 'replace').strip() or None
+
+
+def format_seconds(seconds):
+    """Format a duration in seconds as the timing reports do.
+
+    """
+    if seconds is None:
+        return '-'
+    return str(TestDuration(seconds)).strip()
+
+
+def _mean_and_stdev(durations):
+    count = len(durations)
+    mean = math.fsum(durations) / count
+    if count < 2:
+        return mean, None
+    variance = math.fsum(
+        (duration - mean) ** 2 for duration in durations) / (count - 1)
+    return mean, math.sqrt(variance)
+
+
+def _growth(durations):
+    # The slope of the least-squares line through the durations, taken
+    # one run apart.
+    count = len(durations)
+    if count < 3:
+        return None
+    mean_x = (count - 1) / 2.0
+    mean_y = math.fsum(durations) / count
+    covariance = math.fsum(
+        (index - mean_x) * (duration - mean_y)
+        for index, duration in enumerate(durations))
+    variance = math.fsum((index - mean_x) ** 2 for index in range(count))
+    return covariance / variance
+
+
+def _test_timings(test_id, durations):
+    mean, stdev = _mean_and_stdev(durations)
+    return TestTimings(test_id, len(durations), mean, stdev,
+                       _growth(durations))
+
+
+class TimingHistory(object):
+    """A local SQLite database of the durations of individual tests over
+    many test runs.
+
+    Each run is recorded with the time it started and the revision of
+    the code under test, and holds the status and duration, in seconds,
+    of each test keyed on the test id (``test.id()``), with the
+    resources used by the test if they were measured.  The database is
+    used in WAL mode so that it can be read by ``--show-history`` while a
+    run is being recorded.
+
+    If ``read_only`` is set, the database is opened read-only and is
+    never modified, so runs cannot be recorded.
+
+    """
+
+    #: The number of durations written to the database at a time.
+    BATCH_SIZE = 1000
+
+    def __init__(self, path=DEFAULT_TIMING_HISTORY, read_only=False):
+        self.path = path
+        self.run_id = None
+        self._pending = []
+        if read_only:
+            uri = 'file:{0}?mode=ro'.format(
+                pathname2url(os.path.abspath(path)))
+            self._connection = sqlite3.connect(uri, timeout=30, uri=True)
+            self._check_schema()
+        else:
+            self._connection = sqlite3.connect(path, timeout=30)
+            self._create_schema()
+
+    def _check_schema(self):
+        version, = self._connection.execute(
+            'PRAGMA user_version').fetchone()
+        if version not in (1, _SCHEMA_VERSION):
+            raise ValueError(
+                'Unsupported timing history version {0} in {1!r}'.format(
+                    version, self.path))
+
+    def _create_schema(self):
+        connection = self._connection
+        connection.execute('PRAGMA journal_mode=WAL')
+        version, = connection.execute('PRAGMA user_version').fetchone()
+        if version not in (0, 1, _SCHEMA_VERSION):
+            raise ValueError(
+                'Unsupported timing history version {0} in {1!r}'.format(
+                    version, self.path))
+        with connection:
+            for statement in _SCHEMA:
+                connection.execute(statement)
+            if version == 1:
+                for column, column_type in _RESOURCE_COLUMNS:
+                    connection.execute(
+                        'ALTER TABLE durations ADD COLUMN {0} {1}'.format(
+                            column, column_type))
+            connection.execute(
+                'PRAGMA user_version = {0:d}'.format(_SCHEMA_VERSION))
+
+    def close(self):
+        """Write any pending durations and close the database.
+
+        """
+        self._flush()
+        self._connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        self.close()
+
+    def start_run(self, revision=None, started=None):
+        """Start recording a new test run of the code at ``revision``.
+
+        Returns the id of the run.
+
+        """
+        if started is None:
+            started = time.time()
+        with self._connection:
+            cursor = self._connection.execute(
+                'INSERT INTO runs (started, revision) VALUES (?, ?)',
+                (started, revision))
+        self.run_id = cursor.lastrowid
+        return self.run_id
+
+    def record(self, test_id, status, duration, resources=None):
+        """Record the ``status`` name and ``duration``, in seconds, of the
+        test ``test_id`` in the current run, with the
+        :class:`~haas.resource_usage.TestResources` it used, if they were
+        measured.
+
+        """
+        if self.run_id is None:
+            raise ValueError('No test run has been started')
+        if resources is None:
+            resources = (None, None, None, None)
+        else:
+            resources = resources.to_tuple()
+        self._pending.append(
+            (self.run_id, test_id, status, float(duration)) + resources)
+        if len(self._pending) >= self.BATCH_SIZE:
+            self._flush()
+
+    def finish_run(self):
+        """Write the durations of the current run to the database.
+
+        """
+        self._flush()
+        self.run_id = None
+
+    def _flush(self):
+        if not self._pending:
+            return
+        with self._connection:
+            self._connection.executemany(
+                'INSERT INTO durations (run_id, test_id, status, duration, '
+                'user_time, system_time, max_rss_delta, tracemalloc_peak) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?, ?)', self._pending)
+        del self._pending[:]
+
+    def run_ids(self):
+        """Return the ids of the recorded runs, oldest first.
+
+        """
+        return [run_id for run_id, in self._connection.execute(
+            'SELECT id FROM runs ORDER BY id')]
+
+    def _successful_durations(self, runs, before=None):
+        # The durations of the successful tests in the last ``runs`` runs
+        # (before the run ``before``, if given), oldest first.
+        if before is None:
+            before = self._connection.execute(
+                'SELECT COALESCE(MAX(id), 0) + 1 FROM runs').fetchone()[0]
+        rows = self._connection.execute(
+            'SELECT test_id, duration FROM durations '
+            'WHERE status = ? AND run_id IN ('
+            '    SELECT id FROM runs WHERE id < ? ORDER BY id DESC LIMIT ?'
+            ') ORDER BY run_id', ('success', before, runs))
+        durations = {}
+        for test_id, duration in rows:
+            durations.setdefault(test_id, []).append(duration)
+        return durations
+
+    def recent_durations(self, runs=BASELINE_RUNS):
+        """Return the durations, oldest first, of each test that
+        succeeded in the last ``runs`` runs, keyed on the test id.
+
+        """
+        return self._successful_durations(runs)
+
+    def test_timings(self, runs=BASELINE_RUNS):
+        """Return the :class:`TestTimings` of each test that succeeded in
+        the last ``runs`` runs.
+
+        """
+        return [
+            _test_timings(test_id, durations)
+            for test_id, durations in sorted(
+                self._successful_durations(runs).items())]
+
+    def slowest(self, limit=10, runs=BASELINE_RUNS):
+        """Return the :class:`TestTimings` of the ``limit`` tests with the
+        longest mean duration in the last ``runs`` runs.
+
+        """
+        timings = sorted(
+            self.test_timings(runs), key=lambda t: t.mean, reverse=True)
+        return timings[:limit]
+
+    def most_variable(self, limit=10, runs=BASELINE_RUNS):
+        """Return the :class:`TestTimings` of the ``limit`` tests whose
+        durations in the last ``runs`` runs have the largest coefficient
+        of variation (standard deviation relative to the mean).
+
+        """
+        timings = [
+            timing for timing in self.test_timings(runs)
+            if timing.stdev is not None and timing.mean > 0]
+        timings.sort(key=lambda t: t.stdev / t.mean, reverse=True)
+        return timings[:limit]
+
+    def fastest_growing(self, limit=10, runs=BASELINE_RUNS):
+        """Return the :class:`TestTimings` of the ``limit`` tests whose
+        durations grew the most per run over the last ``runs`` runs.
+
+        """
+        timings = [
+            timing for timing in self.test_timings(runs)
+            if timing.growth is not None and timing.growth > 0]
+        timings.sort(key=lambda t: t.growth, reverse=True)
+        return timings[:limit]
+
+    def regressions(self, run_id=None, runs=BASELINE_RUNS,
+                    threshold=REGRESSION_THRESHOLD):
+        """Return the :class:`Regression` of each test whose duration in
+        the run ``run_id`` (defaults to the latest run) regressed against
+        its durations in the ``runs`` runs before it, largest increase
+        first.
+
+        A duration is a regression if it is above the upper bound of the
+        ``threshold`` standard deviation prediction interval of the
+        baseline durations, and is at least
+        :data:`REGRESSION_MIN_RATIO` times and
+        :data:`REGRESSION_MIN_INCREASE` seconds more than their mean.
+
+        """
+        if run_id is None:
+            run_id, = self._connection.execute(
+                'SELECT MAX(id) FROM runs').fetchone()
+            if run_id is None:
+                return []
+        self._flush()
+        baselines = self._successful_durations(runs, before=run_id)
+        rows = self._connection.execute(
+            'SELECT test_id, duration FROM durations '
+            'WHERE run_id = ? AND status = ?', (run_id, 'success'))
+        regressions = []
+        for test_id, duration in rows:
+            baseline = baselines.get(test_id, ())
+            count = len(baseline)
+            if count < REGRESSION_MIN_SAMPLES:
+                continue
+            mean, stdev = _mean_and_stdev(baseline)
+            limit = mean + threshold * stdev * math.sqrt(1 + 1.0 / count)
+            if duration > limit and \
+                    duration >= mean * REGRESSION_MIN_RATIO and \
+                    duration - mean >= REGRESSION_MIN_INCREASE:
+                regressions.append(
+                    Regression(test_id, duration, mean, stdev, count))
+        regressions.sort(key=lambda r: r.duration - r.mean, reverse=True)
+        return regressions
+
+
+def print_history(history, stream, limit=10, runs=BASELINE_RUNS):
+    """Write the slowest, most variable and fastest growing tests in the
+    last ``runs`` runs recorded in the :class:`TimingHistory` to
+    ``stream``.
+
+    """
+    timings = history.test_timings(runs)
+    template = '  {0: >9} {1: >9} {2: >9} {3: >5}  {4}'
+    header = template.format('Mean', 'Std Dev', 'Growth', 'Runs', 'Test')
+    sections = [
+        ('Slowest tests', history.slowest(limit, runs)),
+        ('Most variable tests', history.most_variable(limit, runs)),
+        ('Fastest growing tests', history.fastest_growing(limit, runs)),
+    ]
+    stream.write('Timing history of {0} tests over the last {1} runs\n'.format(
+        len(timings), runs))
+    for title, section in sections:
+        stream.write('\n{0}\n{1}\n{2}\n'.format(
+            title, '-' * 70, header))
+        for timing in section:
+            if timing.growth is None:
+                growth = '-'
+            else:
+                growth = '{0:+.3f}s'.format(timing.growth)
+            stream.write(template.format(
+                format_seconds(timing.mean), format_seconds(timing.stdev),
+                growth, timing.count, timing.test_id).rstrip() + '\n')
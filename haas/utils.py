@@ -64,6 +64,20 @@ def uncamelcase(string, sep='_'):
     return UNCAMELCASE_SECOND_PASS.sub(replace, temp).lower()
 
 
+_SIZE_SUFFIXES = {'K': 1024, 'M': 1024 ** 2, 'G': 1024 ** 3}
+
+
+def parse_size(value):
+    """Parse a size in bytes, optionally with a ``K``, ``M`` or ``G``
+    suffix.
+
+    """
+    multiplier = _SIZE_SUFFIXES.get(value[-1:].upper())
+    if multiplier is None:
+        return int(value)
+    return int(float(value[:-1]) * multiplier)
+
+
 class cd(object):
 
     def __init__(self, destdir):
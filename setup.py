@@ -163,6 +163,7 @@ if __name__ == "__main__":
         entry_points={
             'console_scripts': [
                 'haas = haas.main:main',
+                'haas-agent = haas.plugins.distributed_runner:agent_main',
             ],
             'haas.hooks.environment': [
                 'coverage = haas.plugins.coverage:Coverage',
@@ -171,14 +172,20 @@ if __name__ == "__main__":
                 'default = haas.plugins.discoverer:Discoverer',
             ],
             'haas.runner': [
+                'asyncio = haas.plugins.asyncio_runner:AsyncioTestRunner',  # noqa
                 'default = haas.plugins.runner:BaseTestRunner',
+                'distributed = haas.plugins.distributed_runner:DistributedTestRunner',  # noqa
+                'hybrid = haas.plugins.hybrid_runner:HybridTestRunner',  # noqa
+                'isolated = haas.plugins.isolated_runner:IsolatedTestRunner',  # noqa
                 'parallel = haas.plugins.parallel_runner:ParallelTestRunner',  # noqa
+                'threaded = haas.plugins.threaded_runner:ThreadedTestRunner',  # noqa
             ],
             'haas.result.handler': [
                 'default = haas.plugins.result_handler:StandardTestResultHandler',  # noqa
                 'quiet = haas.plugins.result_handler:QuietTestResultHandler',
                 'verbose = haas.plugins.result_handler:VerboseTestResultHandler',  # noqa
                 'timing = haas.plugins.result_handler:TimingResultHandler',
+                'timing_history = haas.plugins.timing_history:TimingHistoryResultHandler',  # noqa
             ]
         },
         extras_require={